@@ -1,4 +1,7 @@
+import sqlite3
 from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
@@ -14,6 +17,22 @@ csrf = CSRFProtect() # <-- NUEVA INSTANCIA
 
 login_manager.login_view = 'main.login' 
 
+# --- CONFIGURACIÓN DE SQLITE ---
+# El worker ejecuta sus tareas en varios hilos y la web escribe a la vez: con WAL los
+# lectores no bloquean al escritor, y busy_timeout hace esperar (en vez de fallar con
+# "database is locked") cuando dos escrituras coinciden.
+SQLITE_BUSY_TIMEOUT_MS = 10000
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
 def create_app(config_class=Config):
     """
     Fábrica de aplicaciones para crear y configurar la instancia de la app.
@@ -35,6 +54,19 @@ def create_app(config_class=Config):
     from app.routes import bp as api_bp
     app.register_blueprint(api_bp)
 
+    # Ingesta de sensores remotos: autenticación por token, sin sesión ni CSRF
+    from app.ingest_routes import ingest_bp
+    csrf.exempt(ingest_bp)
+    app.register_blueprint(ingest_bp)
+
+    # Latencia de las peticiones por ruta para /metrics
+    from app.metrics import init_request_metrics
+    init_request_metrics(app)
+
+    # Comandos de mantenimiento para la CLI de Flask (ej: `flask search rebuild`)
+    from app.commands import search_cli
+    app.cli.add_command(search_cli)
+
     return app
 
 from app import models
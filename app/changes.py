@@ -0,0 +1,116 @@
+# app/changes.py
+
+import json
+from datetime import datetime, timedelta, UTC
+
+from app import db
+from app.models import ChangeEvent, DataVersion, Device, DeviceTombstone
+
+# --- COLA DE CAMBIOS ---
+# El worker y la API corren en procesos distintos, así que la cola vive en la base de datos:
+# cada escritura publica un evento en la misma transacción y /api/stream los lee por id.
+CHANGE_RETENTION_MINUTES = 60
+CHANGES_BATCH_SIZE = 500
+
+
+def device_summary(device):
+    """Representación compacta de un dispositivo para los eventos de cambio."""
+    return {
+        'id': device.id,
+        'ip_address': device.ip_address,
+        'mac_address': device.mac_address,
+        'status': device.status,
+        'last_seen_by': device.last_seen_by,
+    }
+
+
+def publish_change(kind, payload):
+    """
+    Publica un evento en la cola de cambios.
+    Añade el evento a la sesión, pero NO hace commit (igual que log_event).
+    """
+    db.session.add(ChangeEvent(kind=kind, payload=json.dumps(payload, separators=(',', ':'))))
+
+
+def latest_change_id():
+    """Devuelve el id del último evento publicado (0 si la cola está vacía)."""
+    return db.session.query(db.func.max(ChangeEvent.id)).scalar() or 0
+
+
+def oldest_change_id():
+    """Devuelve el id del evento más antiguo que se conserva (None si la cola está vacía)."""
+    return db.session.query(db.func.min(ChangeEvent.id)).scalar()
+
+
+def changes_since(last_id, limit=CHANGES_BATCH_SIZE):
+    """Devuelve los eventos con id mayor que last_id, en orden de publicación."""
+    return (ChangeEvent.query
+            .filter(ChangeEvent.id > last_id)
+            .order_by(ChangeEvent.id)
+            .limit(limit)
+            .all())
+
+
+def prune_changes():
+    """Elimina los eventos más antiguos que CHANGE_RETENTION_MINUTES. Hace commit."""
+    threshold = datetime.now(UTC) - timedelta(minutes=CHANGE_RETENTION_MINUTES)
+    deleted = ChangeEvent.query.filter(ChangeEvent.created_at < threshold).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+# --- SINCRONIZACIÓN INCREMENTAL DE DISPOSITIVOS ---
+# Cada escritura en 'device' recibe un número de secuencia (change_seq) y cada borrado deja
+# un tombstone con el suyo. Un cliente guarda la última secuencia recibida y pide solo lo
+# que ha cambiado después.
+TOMBSTONE_RETENTION_DAYS = 30
+
+
+def devices_changed_since(since, limit):
+    """
+    Devuelve los cambios de dispositivos con secuencia mayor que 'since', en orden.
+    Devuelve una tupla: (devices, tombstones, next_since, has_more)
+    """
+    devices = (Device.query.filter(Device.change_seq > since)
+               .order_by(Device.change_seq).limit(limit + 1).all())
+    tombstones = (DeviceTombstone.query.filter(DeviceTombstone.change_seq > since)
+                  .order_by(DeviceTombstone.change_seq).limit(limit + 1).all())
+
+    # Se mezclan ambas listas por secuencia y se corta en 'limit' para que next_since
+    # no salte ningún cambio de la otra lista.
+    merged = sorted(devices + tombstones, key=lambda item: item.change_seq)
+    has_more = len(merged) > limit
+    merged = merged[:limit]
+    next_since = merged[-1].change_seq if merged else since
+
+    return (
+        [item for item in merged if isinstance(item, Device)],
+        [item for item in merged if isinstance(item, DeviceTombstone)],
+        next_since,
+        has_more
+    )
+
+
+def get_sequence(name):
+    """Devuelve el valor de una secuencia de data_version (None si no existe)."""
+    return db.session.query(DataVersion.version).filter_by(name=name).scalar()
+
+
+def prune_tombstones():
+    """
+    Elimina los tombstones más antiguos que TOMBSTONE_RETENTION_DAYS y guarda la mayor
+    secuencia purgada: un cliente con un 'since' anterior debe resincronizar desde cero.
+    Hace commit.
+    """
+    threshold = datetime.now(UTC) - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    expired = DeviceTombstone.query.filter(DeviceTombstone.deleted_at < threshold)
+    max_seq = expired.with_entities(db.func.max(DeviceTombstone.change_seq)).scalar()
+    if max_seq is None:
+        return 0
+
+    deleted = expired.delete(synchronize_session=False)
+    watermark = db.session.get(DataVersion, 'device_tombstones_pruned')
+    if watermark is not None:
+        watermark.version = max(watermark.version, max_seq)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,24 @@
+# app/commands.py
+
+import click
+from flask.cli import AppGroup
+
+from app.search import fts_enabled, rebuild_log_index, rebuild_device_index
+
+search_cli = AppGroup('search', help='Mantenimiento de los índices de búsqueda.')
+
+
+@search_cli.command('rebuild')
+def rebuild_search_indexes():
+    """Reconstruye los índices de búsqueda de logs y dispositivos (ej: `flask search rebuild`)."""
+    if not fts_enabled():
+        click.echo('[!] La base de datos no es SQLite: no hay índices FTS5 que reconstruir.')
+        return
+
+    click.echo('[*] Reconstruyendo el índice de búsqueda de logs...')
+    rebuild_log_index()
+    click.echo('[OK] Índice de logs reconstruido.')
+
+    click.echo('[*] Reconstruyendo el índice de búsqueda de dispositivos...')
+    rebuild_device_index()
+    click.echo('[OK] Índice de dispositivos reconstruido.')
@@ -0,0 +1,46 @@
+# app/compression.py
+
+import gzip
+from flask import request
+
+# brotli es opcional: si no está instalado las respuestas se comprimen con gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Las respuestas pequeñas no compensan el coste de comprimir
+COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/csv', 'application/x-ndjson')
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def compress_response(response):
+    """
+    Comprime la respuesta con brotli o gzip según el Accept-Encoding del cliente.
+    Las respuestas en streaming (SSE, exportaciones) se dejan intactas.
+    """
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    encoding = request.accept_encodings.best_match(encodings)
+    response.vary.add('Accept-Encoding')
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,64 @@
+# app/conditional.py
+
+import hashlib
+from functools import wraps
+from flask import request, make_response
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import DataVersion
+
+
+def get_data_versions(names):
+    """
+    Devuelve {nombre: versión} para los conjuntos de datos indicados, o None si alguno no
+    está versionado (motor sin triggers o esquema sin migrar).
+    """
+    try:
+        rows = db.session.query(DataVersion.name, DataVersion.version).filter(DataVersion.name.in_(names)).all()
+    except OperationalError:
+        db.session.rollback()
+        return None
+    versions = dict(rows)
+    if len(versions) != len(names):
+        return None
+    return versions
+
+
+def _build_etag(versions, extra):
+    """El ETag combina las versiones de datos, los parámetros de la petición y 'extra'."""
+    args = sorted(request.args.items(multi=True))
+    key = f"{request.path}|{sorted(versions.items())}|{args}|{extra}"
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def conditional_get(*names, extra=None):
+    """
+    Decorador para endpoints GET de sondeo: si el cliente envía un If-None-Match que
+    coincide con la versión actual de los datos, responde 304 sin ejecutar la vista.
+
+    - names: conjuntos de datos de los que depende la respuesta ('devices', 'logs', 'stats').
+    - extra: función opcional cuyo valor también invalida el ETag (ej: la hora actual para
+      respuestas cuya ventana de tiempo se desplaza aunque no cambien los datos).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = get_data_versions(names)
+            if versions is None:
+                return view(*args, **kwargs)
+
+            etag = _build_etag(versions, extra() if extra else None)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            # El navegador debe revalidar siempre: los datos cambian en cualquier momento
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
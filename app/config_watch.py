@@ -0,0 +1,42 @@
+# app/config_watch.py
+
+import sqlite3
+
+from app import db
+from app.models import DataVersion
+
+# --- DETECCIÓN DE CAMBIOS DE CONFIGURACIÓN ---
+# Un trigger incrementa la versión 'config' de data_version cada vez que se guarda la
+# configuración. Para no consultarla en cada comprobación, primero se mira PRAGMA
+# data_version en una conexión propia: SQLite lo cambia solo cuando otra conexión ha
+# hecho commit, y leerlo no toca ninguna página de la base de datos.
+_watch = {'connection': None, 'data_version': None, 'config_version': -1}
+
+
+def _database_changed():
+    """Indica si alguna otra conexión ha escrito en la base de datos desde la última llamada."""
+    if db.engine.dialect.name != 'sqlite' or not db.engine.url.database:
+        return True
+
+    if _watch['connection'] is None:
+        _watch['connection'] = sqlite3.connect(db.engine.url.database, check_same_thread=False)
+    value = _watch['connection'].execute('PRAGMA data_version').fetchone()[0]
+    changed = value != _watch['data_version']
+    _watch['data_version'] = value
+    return changed
+
+
+def get_config_version():
+    """Devuelve la versión actual de la configuración (None si no está versionada)."""
+    return db.session.query(DataVersion.version).filter_by(name='config').scalar()
+
+
+def config_changed():
+    """Devuelve True la primera vez y cada vez que la configuración guardada cambia de versión."""
+    if not _database_changed():
+        return False
+    version = get_config_version()
+    if version == _watch['config_version']:
+        return False
+    _watch['config_version'] = version
+    return True
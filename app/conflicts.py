@@ -0,0 +1,252 @@
+# app/conflicts.py
+
+import threading
+from collections import deque
+from datetime import datetime, timedelta, UTC
+
+from app import db
+from app.models import Device, IpConflict
+from app.changes import publish_change, devices_changed_since, get_sequence
+from app.scanner.core import log_event
+
+# --- ÍNDICE IP -> MAC Y CONFLICTOS ---
+# 'device.ip_address' no es única: cuando una IP pasa a otra MAC, la fila del dispositivo
+# anterior conserva la IP antigua, y liberarla con esos datos puede afectar al cliente
+# equivocado. El worker mantiene en memoria qué MAC usa cada IP y desde cuándo, alimentado
+# con cada avistamiento (la cola de change_seq de los dispositivos recoge Nmap, sniffer,
+# sensores remotos y la API). Cada avistamiento cuesta O(1) y detecta:
+#   - 'duplicate': dos MACs distintas usando la misma IP casi a la vez.
+#   - 'flapping': la IP cambia de MAC FLAP_CHANGES veces o más en FLAP_WINDOW_SECONDS.
+# Los conflictos se guardan en 'ip_conflict' y bloquean las liberaciones de esa IP.
+DUPLICATE_WINDOW_SECONDS = 120
+FLAP_WINDOW_SECONDS = 15 * 60
+FLAP_CHANGES = 4
+CONFLICT_QUIET_MINUTES = 30 # Sin nuevos indicios en este tiempo, el conflicto se da por resuelto
+INDEX_RETENTION_HOURS = 24 # Las IPs no vistas en este tiempo salen del índice
+CHANGES_BATCH_SIZE = 2000
+
+
+def _as_utc(moment):
+    return moment.replace(tzinfo=UTC) if moment.tzinfo is None else moment
+
+
+class IpMacIndex:
+    """Última MAC vista en cada IP, cambios recientes de MAC y conflictos abiertos."""
+
+    def __init__(self):
+        self.seeded = False
+        self._owners = {} # ip -> (mac, visto por última vez)
+        self._changes = {} # ip -> deque de (instante, mac) dentro de FLAP_WINDOW_SECONDS
+        self._open = {} # ip -> {tipos de conflicto abiertos}
+        self._last_seq = 0
+        self._lock = threading.Lock()
+
+    def owner(self, ip):
+        """(mac, visto por última vez) de la IP, o None si no está en el índice."""
+        return self._owners.get(ip)
+
+    def open_kinds(self, ip):
+        return self._open.get(ip, set())
+
+    def observe(self, ip, mac, seen_at):
+        """
+        Anota que 'mac' ha usado 'ip' en 'seen_at'.
+        Devuelve los conflictos detectados como lista de (tipo, [macs]).
+        """
+        seen_at = _as_utc(seen_at)
+        owner = self._owners.get(ip)
+        if owner is None or owner[0] == mac:
+            if owner is None or seen_at > owner[1]:
+                self._owners[ip] = (mac, seen_at)
+            return []
+
+        previous_mac, previous_seen = owner
+        if seen_at < previous_seen - timedelta(seconds=DUPLICATE_WINDOW_SECONDS):
+            # Dato antiguo: una fila que aún conserva una IP que ya usa otra MAC
+            return []
+
+        detected = []
+        if abs((seen_at - previous_seen).total_seconds()) <= DUPLICATE_WINDOW_SECONDS:
+            detected.append(('duplicate', sorted({previous_mac, mac})))
+
+        changes = self._changes.setdefault(ip, deque())
+        changes.append((seen_at, mac))
+        cutoff = seen_at - timedelta(seconds=FLAP_WINDOW_SECONDS)
+        while changes and changes[0][0] < cutoff:
+            changes.popleft()
+        if len(changes) >= FLAP_CHANGES:
+            detected.append(('flapping', sorted({m for _, m in changes} | {previous_mac})))
+
+        if seen_at >= previous_seen:
+            self._owners[ip] = (mac, seen_at)
+        return detected
+
+    def sync(self):
+        """
+        Pone el índice al día: la primera vez lo carga con los dispositivos vistos en las
+        últimas INDEX_RETENTION_HOURS; después aplica solo los cambios posteriores. La carga
+        inicial no abre conflictos (reabriría en cada arranque los ya resueltos): solo los
+        avistamientos nuevos lo hacen.
+        Devuelve el número de conflictos detectados. Añade a la sesión, pero NO hace commit.
+        """
+        with self._lock:
+            if not self.seeded:
+                return self._seed()
+            return self._apply_changes()
+
+    def _seed(self):
+        self._last_seq = get_sequence('device_changes') or 0
+        since = datetime.now(UTC) - timedelta(hours=INDEX_RETENTION_HOURS)
+        rows = db.session.query(Device.ip_address, Device.mac_address, Device.last_seen).filter(
+            Device.status != 'released', Device.last_seen >= since
+        ).order_by(Device.last_seen)
+        for ip, mac, seen_at in rows:
+            self.observe(ip, mac, seen_at)
+        self._load_open()
+        self.seeded = True
+        return 0
+
+    def _apply_changes(self):
+        found = 0
+        has_more = True
+        while has_more:
+            devices, _, next_seq, has_more = devices_changed_since(self._last_seq, CHANGES_BATCH_SIZE)
+            for device in devices:
+                if device.status == 'released':
+                    continue
+                found += self._record(device.ip_address, self.observe(device.ip_address, device.mac_address, device.last_seen),
+                                      device.last_seen)
+            self._last_seq = next_seq
+        return found
+
+    def _record(self, ip, detected, seen_at):
+        """Guarda los conflictos detectados: amplía el abierto de ese tipo o abre uno nuevo."""
+        for kind, macs in detected:
+            conflict = IpConflict.query.filter_by(ip_address=ip, kind=kind, resolved_at=None).first()
+            if conflict is None:
+                conflict = IpConflict(ip_address=ip, kind=kind, macs=','.join(macs),
+                                      first_detected=seen_at, last_detected=seen_at)
+                db.session.add(conflict)
+                db.session.flush()
+                description = 'IP duplicada' if kind == 'duplicate' else 'IP cambiando de MAC repetidamente'
+                log_event(f"Conflicto detectado en {ip}: {description} ({', '.join(macs)}). "
+                          f"Se bloquean las liberaciones de esta IP.", 'WARNING')
+                publish_change('conflict', conflict.to_dict())
+            else:
+                known = conflict.macs.split(',')
+                new_macs = [mac for mac in macs if mac not in known]
+                conflict.occurrences += 1
+                conflict.last_detected = max(_as_utc(conflict.last_detected), _as_utc(seen_at))
+                if new_macs:
+                    conflict.macs = ','.join(known + new_macs)
+                    publish_change('conflict', conflict.to_dict())
+            self._open.setdefault(ip, set()).add(kind)
+        return len(detected)
+
+    def _load_open(self):
+        self._open = {}
+        for ip, kind in db.session.query(IpConflict.ip_address, IpConflict.kind).filter(IpConflict.resolved_at.is_(None)):
+            self._open.setdefault(ip, set()).add(kind)
+
+    def refresh_open(self):
+        """Recarga los conflictos abiertos (pueden resolverse desde la API) y purga IPs antiguas."""
+        with self._lock:
+            self._load_open()
+            cutoff = datetime.now(UTC) - timedelta(hours=INDEX_RETENTION_HOURS)
+            for ip in [ip for ip, (_, seen_at) in self._owners.items() if seen_at < cutoff]:
+                del self._owners[ip]
+                self._changes.pop(ip, None)
+            flap_cutoff = datetime.now(UTC) - timedelta(seconds=FLAP_WINDOW_SECONDS)
+            for ip in [ip for ip, changes in self._changes.items() if not changes or changes[-1][0] < flap_cutoff]:
+                del self._changes[ip]
+
+
+_index = IpMacIndex()
+
+
+def watch_ip_conflicts():
+    """Tarea del worker: aplica los últimos avistamientos al índice IP -> MAC. Hace commit."""
+    try:
+        if _index.sync():
+            db.session.commit()
+        else:
+            db.session.rollback()
+    except Exception as e:
+        print(f"[!!!] ERROR al actualizar el índice IP -> MAC: {e}")
+        db.session.rollback()
+
+
+def resolve_quiet_conflicts():
+    """
+    Tarea del worker: da por resueltos los conflictos sin indicios nuevos en
+    CONFLICT_QUIET_MINUTES y recarga los abiertos en el índice. Hace commit.
+    """
+    now = datetime.now(UTC)
+    quiet = IpConflict.query.filter(
+        IpConflict.resolved_at.is_(None),
+        IpConflict.last_detected < now - timedelta(minutes=CONFLICT_QUIET_MINUTES)
+    ).all()
+    for conflict in quiet:
+        conflict.resolved_at = now
+        publish_change('conflict', conflict.to_dict())
+    if quiet:
+        log_event(f"{len(quiet)} conflicto(s) de IP resuelto(s) tras {CONFLICT_QUIET_MINUTES} minutos sin nuevos indicios: "
+                  f"{', '.join(conflict.ip_address for conflict in quiet)}.", 'INFO')
+    db.session.commit()
+    _index.refresh_open()
+    db.session.rollback()
+
+
+def release_conflict(device):
+    """
+    Motivo para no liberar la IP de un dispositivo, o None si se puede liberar: la IP tiene
+    un conflicto abierto o ya la usa otra MAC (la fila del dispositivo está desfasada).
+    En el worker se consulta el índice en memoria; en la web, la base de datos.
+    """
+    ip = device.ip_address
+    if _index.seeded:
+        owner = _index.owner(ip)
+        if owner and owner[0] != device.mac_address and owner[1] > _as_utc(device.last_seen):
+            return f"la IP la usa ahora {owner[0]}"
+        kinds = _index.open_kinds(ip)
+    else:
+        newer = db.session.query(Device.mac_address).filter(
+            Device.ip_int == device.ip_int,
+            Device.id != device.id,
+            Device.status != 'released',
+            Device.last_seen > device.last_seen
+        ).order_by(Device.last_seen.desc()).first()
+        if newer:
+            return f"la IP la usa ahora {newer.mac_address}"
+        kinds = {kind for (kind,) in db.session.query(IpConflict.kind).filter(
+            IpConflict.resolved_at.is_(None), IpConflict.ip_address == ip)}
+    if kinds:
+        return f"conflicto abierto en la IP ({', '.join(sorted(kinds))})"
+    return None
+
+
+def blocked_releases(devices):
+    """
+    Versión en bloque de release_conflict() para la web: {device_id: motivo} de los
+    dispositivos de la lista cuya IP no se puede liberar. Supone que la lista incluye todos
+    los dispositivos no liberados de esas IPs (ej: los de una subred).
+    """
+    newest = {}
+    for device in devices:
+        current = newest.get(device.ip_int)
+        if current is None or _as_utc(device.last_seen) > _as_utc(current.last_seen):
+            newest[device.ip_int] = device
+    ips = {device.ip_address for device in devices}
+    open_ips = set()
+    if ips:
+        open_ips = {ip for (ip,) in db.session.query(IpConflict.ip_address).filter(
+            IpConflict.resolved_at.is_(None), IpConflict.ip_address.in_(ips))}
+
+    blocked = {}
+    for device in devices:
+        owner = newest[device.ip_int]
+        if owner.id != device.id and owner.mac_address != device.mac_address:
+            blocked[device.id] = f"la IP la usa ahora {owner.mac_address}"
+        elif device.ip_address in open_ips:
+            blocked[device.id] = "conflicto abierto en la IP"
+    return blocked
@@ -0,0 +1,54 @@
+# app/counters.py
+
+from datetime import datetime, UTC
+
+from app import db
+from app.models import Device, DeviceCounter
+
+
+def _exact_counts():
+    """Recalcula los contadores con consultas COUNT sobre la tabla de dispositivos."""
+    return {
+        'total_devices': Device.query.count(),
+        'active_devices': Device.query.filter_by(status='active').count(),
+        'released_devices': Device.query.filter_by(status='released').count(),
+    }
+
+
+def get_device_counters():
+    """
+    Devuelve los contadores en vivo de dispositivos (lectura de una sola fila).
+    Si la fila no existe (motor sin triggers o esquema sin migrar) se calculan con COUNT.
+    """
+    counters = db.session.get(DeviceCounter, 1)
+    if counters is None:
+        return _exact_counts()
+    return {
+        'total_devices': counters.total_devices,
+        'active_devices': counters.active_devices,
+        'released_devices': counters.released_devices,
+    }
+
+
+def reconcile_device_counters():
+    """
+    Compara los contadores en vivo con los valores reales y corrige cualquier desviación.
+    Hace commit. Devuelve un diccionario {contador: (valor_anterior, valor_real)} con los
+    contadores que se han corregido.
+    """
+    counters = db.session.get(DeviceCounter, 1)
+    if counters is None:
+        # Sin fila no hay triggers que la mantengan: /api/stats ya usa COUNT directamente.
+        return {}
+
+    exact = _exact_counts()
+
+    drift = {}
+    for name, value in exact.items():
+        current = getattr(counters, name) or 0
+        if current != value:
+            drift[name] = (current, value)
+            setattr(counters, name, value)
+    counters.reconciled_at = datetime.now(UTC)
+    db.session.commit()
+    return drift
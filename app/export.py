@@ -0,0 +1,91 @@
+# app/export.py
+
+import csv
+import io
+import json
+import zlib
+from flask import Response, stream_with_context
+
+from app.serializers import tuple_query, convert_rows, DEVICE_COLUMNS, LOG_COLUMNS
+
+# --- EXPORTACIÓN EN STREAMING ---
+# Las filas se leen como tuplas (sin objetos ORM) en lotes de EXPORT_BATCH_SIZE y se
+# escriben en la respuesta a medida que llegan, así que la memoria no depende del tamaño
+# de la exportación.
+EXPORT_BATCH_SIZE = 1000
+
+DEVICE_EXPORT_COLUMNS = DEVICE_COLUMNS
+LOG_EXPORT_COLUMNS = LOG_COLUMNS
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def _iter_rows(query, columns):
+    """Recorre la consulta por lotes devolviendo listas con los valores ya formateados."""
+    query, converters = tuple_query(query, columns)
+    batch = []
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == EXPORT_BATCH_SIZE:
+            yield from convert_rows(batch, columns, converters)
+            batch = []
+    yield from convert_rows(batch, columns, converters)
+
+
+def _csv_chunks(names, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(['' if value is None else value for value in row])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(names, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(names, row)), ensure_ascii=False))
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _gzip_chunks(chunks):
+    """Comprime al vuelo un flujo de texto en formato gzip."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(query, columns, export_format, filename, compress=False):
+    """
+    Genera una respuesta en streaming con las filas de 'query' en CSV o NDJSON.
+    Con compress=True se descarga un fichero .gz comprimido al vuelo.
+    """
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    names = [column.key for column in columns]
+    rows = _iter_rows(query, columns)
+    chunks = _csv_chunks(names, rows) if export_format == 'csv' else _ndjson_chunks(names, rows)
+
+    filename = f"{filename}.{extension}"
+    if compress:
+        chunks = _gzip_chunks(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no'
+    })
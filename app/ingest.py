@@ -0,0 +1,427 @@
+# app/ingest.py
+
+import hmac
+import ipaddress
+import json
+import re
+import zlib
+from datetime import datetime, UTC
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import Device, DataVersion, ip_to_int
+from app.scanner.core import log_event
+from app.changes import publish_change
+from app.sightings import record_sighting, flush_sightings
+from app.stats import record_new_devices
+
+# msgpack es opcional: si está instalado, /api/ingest/sightings acepta también lotes msgpack
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# --- INGESTA DE AVISTAMIENTOS ---
+# Los sensores remotos (sensor.py) y cualquier otra fuente que conozca las concesiones
+# (hooks del servidor DHCP, lectores de tablas MAC de los switches, escáneres externos)
+# envían lotes a /api/ingest/sightings. Aquí se validan los registros, se deduplican por
+# MAC y se aplican con un único upsert por lote, sin hacer retroceder last_seen.
+
+INGEST_MAX_DECOMPRESSED_BYTES = 64 * 1024 * 1024 # Límite al descomprimir (evita bombas gzip)
+INGEST_CHUNK_SIZE = 500 # MACs por consulta al buscar los dispositivos existentes
+INGEST_LOGGED_NEW_DEVICES = 20 # Nuevos dispositivos que se registran uno a uno en el log
+INGEST_CHANGE_DEVICES = 500 # Dispositivos incluidos en el evento de cambio del lote
+# Valores admitidos para 'source' (se guarda en last_seen_by, máximo 10 caracteres)
+INGEST_SOURCES = ('nmap', 'sniffer', 'dhcp', 'switch', 'external')
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+# Código de resultado de cada registro del lote, en el mismo orden en que se recibió
+RESULT_CREATED = 'created'      # Dispositivo nuevo
+RESULT_UPDATED = 'updated'      # Dispositivo existente actualizado
+RESULT_STALE = 'stale'          # No es posterior al last_seen guardado: no se aplica
+RESULT_DUPLICATE = 'duplicate'  # Hay otro registro más reciente de la misma MAC en el lote
+RESULT_INVALID = 'invalid'      # No supera la validación (ver 'rejected')
+RESULT_CODES = (RESULT_CREATED, RESULT_UPDATED, RESULT_STALE, RESULT_DUPLICATE, RESULT_INVALID)
+
+_MAC_RE = re.compile(r'^[0-9A-F]{2}(:[0-9A-F]{2}){5}$')
+
+
+def parse_ingest_tokens(raw):
+    """
+    Interpreta INGEST_TOKENS ("sede-a=token1,sede-b=token2") como {token: nombre del sensor}.
+    Un token sin nombre ("token1") se identifica como 'sensor'.
+    """
+    tokens = {}
+    for item in (raw or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, token = item.rpartition('=')
+        tokens[token.strip()] = name.strip() or 'sensor'
+    return tokens
+
+
+def authenticate_sensor(authorization, tokens):
+    """Devuelve el nombre del sensor para la cabecera 'Authorization: Bearer <token>' (None si no es válida)."""
+    scheme, _, token = (authorization or '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    sensor = None
+    # Se comparan todos los tokens en tiempo constante para no dar pistas sobre cuál se acerca
+    for known, name in tokens.items():
+        if hmac.compare_digest(known.encode('utf-8'), token.strip().encode('utf-8')):
+            sensor = name
+    return sensor
+
+
+def decode_body(body, content_encoding):
+    """
+    Devuelve el cuerpo de la petición descomprimido. Acepta gzip o sin comprimir.
+    Lanza ValueError si la codificación no se admite o se supera el límite de tamaño.
+    """
+    encoding = (content_encoding or 'identity').strip().lower()
+    if encoding == 'identity':
+        data = body
+    elif encoding == 'gzip':
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            data = decompressor.decompress(body, INGEST_MAX_DECOMPRESSED_BYTES)
+        except zlib.error as e:
+            raise ValueError(f'Cuerpo gzip inválido: {e}')
+        if decompressor.unconsumed_tail:
+            raise ValueError('El lote descomprimido supera el tamaño máximo.')
+    else:
+        raise ValueError(f"Codificación no admitida: '{encoding}'.")
+
+    if len(data) > INGEST_MAX_DECOMPRESSED_BYTES:
+        raise ValueError('El lote supera el tamaño máximo.')
+    return data
+
+
+def parse_payload(data, mimetype=None):
+    """
+    Interpreta el cuerpo de un lote ({"records": [...]}) en JSON o, si el tipo es msgpack,
+    en msgpack. Devuelve la lista de registros. Lanza ValueError si el formato no es válido.
+    """
+    if mimetype in MSGPACK_MIMETYPES:
+        if msgpack is None:
+            raise ValueError('msgpack no está instalado en el servidor: envía el lote en JSON.')
+        try:
+            # timestamp=3: las fechas con la extensión Timestamp llegan como datetime en UTC
+            payload = msgpack.unpackb(data, raw=False, timestamp=3)
+        except Exception as e:
+            raise ValueError(f'msgpack inválido: {e}')
+    else:
+        try:
+            payload = json.loads(data)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f'JSON inválido: {e}')
+
+    records = payload.get('records') if isinstance(payload, dict) else None
+    if not isinstance(records, list):
+        raise ValueError("El lote debe ser un objeto con una lista 'records'.")
+    return records
+
+
+def parse_seen_at(value):
+    """
+    Convierte una fecha a datetime en UTC. Admite texto ISO 8601 (sin zona se asume UTC),
+    segundos desde epoch o un datetime (msgpack).
+    """
+    if isinstance(value, datetime):
+        seen_at = value
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        seen_at = datetime.fromtimestamp(value, UTC)
+    elif isinstance(value, str):
+        try:
+            seen_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"Fecha inválida: '{value}'.")
+    else:
+        raise ValueError("'seen_at' debe ser una fecha ISO 8601 o segundos desde epoch.")
+
+    if seen_at.tzinfo is None:
+        return seen_at.replace(tzinfo=UTC)
+    return seen_at.astimezone(UTC)
+
+
+def _parse_lease(record, seen_at):
+    """
+    Devuelve (inicio, duración en segundos) de la concesión del registro, o (None, None).
+    'lease' puede ser la duración en segundos o {"start": fecha, "duration": segundos};
+    'lease_seconds' (formato de sensor.py) equivale a 'lease' numérico.
+    """
+    lease = record.get('lease', record.get('lease_seconds'))
+    if lease is None:
+        return None, None
+
+    start = seen_at
+    if isinstance(lease, dict):
+        if lease.get('start') is not None:
+            start = parse_seen_at(lease['start'])
+        lease = lease.get('duration', lease.get('duration_seconds'))
+
+    if not isinstance(lease, int) or isinstance(lease, bool) or lease < 0:
+        raise ValueError("La duración de la concesión debe ser un entero positivo (segundos).")
+    return start, lease
+
+
+def normalize_record(record, now):
+    """
+    Valida un registro {mac, ip, seen_at, source, vendor, lease} y lo devuelve normalizado.
+    Las fechas futuras (relojes desajustados) se recortan a 'now'.
+    Lanza ValueError con el motivo si el registro no es válido.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('El registro debe ser un objeto.')
+
+    mac = str(record.get('mac') or '').strip().upper().replace('-', ':')
+    if not _MAC_RE.match(mac):
+        raise ValueError(f"MAC inválida: '{record.get('mac')}'.")
+
+    # Solo texto: IPv4Address también acepta enteros y 4 bytes, que no deben llegar a
+    # guardarse tal cual. La IP se vuelve a escribir a partir del entero (forma canónica).
+    ip = record.get('ip')
+    ip_int = ip_to_int(ip.strip()) if isinstance(ip, str) else None
+    if ip_int is None:
+        raise ValueError(f"IP inválida: '{ip}'.")
+    ip = str(ipaddress.IPv4Address(ip_int))
+
+    source = record.get('source', 'nmap')
+    if source not in INGEST_SOURCES:
+        raise ValueError(f"Origen no admitido: '{source}'.")
+
+    seen_at = min(parse_seen_at(record.get('seen_at')), now)
+    lease_start, lease_seconds = _parse_lease(record, seen_at)
+
+    vendor = record.get('vendor')
+    return {
+        'mac': mac,
+        'ip': ip,
+        'ip_int': ip_int,
+        'seen_at': seen_at,
+        'source': source,
+        'vendor': str(vendor)[:255] if vendor else None,
+        'lease_start': lease_start,
+        'lease_seconds': lease_seconds
+    }
+
+
+def _as_utc(moment):
+    # SQLite devuelve las fechas sin zona horaria; se guardan siempre en UTC
+    return moment.replace(tzinfo=UTC) if moment.tzinfo is None else moment
+
+
+# --- UPSERT POR LOTES ---
+
+_UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _upsert_statement(dialect_name, with_change_seq=False):
+    """
+    INSERT ... ON CONFLICT (mac_address) DO UPDATE ... WHERE last_seen < excluded.last_seen
+    para los motores que lo admiten (None en los demás). El WHERE hace que el avance de
+    last_seen sea monótono aunque otro proceso haya escrito entre la lectura y el upsert.
+    Con with_change_seq, las filas traen su change_seq ya reservado.
+    """
+    insert = _UPSERT_DIALECTS.get(dialect_name)
+    if insert is None:
+        return None
+    device = Device.__table__
+    statement = insert(device)
+    excluded = statement.excluded
+    set_ = {
+        'ip_address': excluded.ip_address,
+        'ip_int': excluded.ip_int,
+        'last_seen': excluded.last_seen,
+        'status': 'active',
+        'last_seen_by': excluded.last_seen_by,
+        'lease_start_time': func.coalesce(excluded.lease_start_time, device.c.lease_start_time),
+        'lease_duration_seconds': func.coalesce(excluded.lease_duration_seconds, device.c.lease_duration_seconds),
+    }
+    if with_change_seq:
+        set_['change_seq'] = excluded.change_seq
+    return statement.on_conflict_do_update(
+        index_elements=[device.c.mac_address],
+        set_=set_,
+        where=device.c.last_seen < excluded.last_seen
+    )
+
+
+def _reserve_change_seqs(rows):
+    """
+    Asigna a cada fila un change_seq de un bloque reservado con una sola sentencia, e
+    incrementa una vez la versión 'devices'. Solo en SQLite, donde los triggers mantienen
+    las secuencias: con change_seq ya asignado no hacen nada por fila (la migración
+    429f6ebfcae8), que es lo que más cuesta al insertar miles de dispositivos.
+    Devuelve False si la base de datos no tiene la secuencia.
+    """
+    sequence = DataVersion.__table__
+    # El UPDATE toma el bloqueo de escritura: nadie más avanza la secuencia hasta el commit
+    db.session.execute(update(sequence).where(sequence.c.name == 'device_changes')
+                       .values(version=sequence.c.version + len(rows)))
+    last = db.session.execute(select(sequence.c.version).where(sequence.c.name == 'device_changes')).scalar()
+    if last is None:
+        return False
+    for seq, row in enumerate(rows, start=last - len(rows) + 1):
+        row['change_seq'] = seq
+    db.session.execute(update(sequence).where(sequence.c.name == 'devices').values(version=sequence.c.version + 1))
+    return True
+
+
+def _write_devices(rows, existing_macs):
+    """Aplica las filas del lote: un único upsert, o INSERT + UPDATE por lotes si el motor no lo admite."""
+    dialect_name = db.session.get_bind().dialect.name
+    with_change_seq = dialect_name == 'sqlite' and _reserve_change_seqs(rows)
+    statement = _upsert_statement(dialect_name, with_change_seq)
+    if statement is not None:
+        db.session.execute(statement, rows)
+        return
+
+    device = Device.__table__
+    new_rows = [row for row in rows if row['mac_address'] not in existing_macs]
+    updated_rows = [
+        {**row, 'b_mac_address': row['mac_address'], 'b_last_seen': row['last_seen']}
+        for row in rows if row['mac_address'] in existing_macs
+    ]
+    if new_rows:
+        db.session.execute(device.insert(), new_rows)
+    if updated_rows:
+        db.session.execute(
+            update(device)
+            .where(device.c.mac_address == bindparam('b_mac_address'), device.c.last_seen < bindparam('b_last_seen'))
+            .values(
+                ip_address=bindparam('ip_address'), ip_int=bindparam('ip_int'), last_seen=bindparam('last_seen'),
+                status='active', last_seen_by=bindparam('last_seen_by'),
+                lease_start_time=func.coalesce(bindparam('lease_start_time'), device.c.lease_start_time),
+                lease_duration_seconds=func.coalesce(bindparam('lease_duration_seconds'), device.c.lease_duration_seconds)
+            ),
+            updated_rows
+        )
+
+
+def _device_ids(macs):
+    """Devuelve {mac: id} de los dispositivos indicados (consultas por bloques)."""
+    ids = {}
+    for start in range(0, len(macs), INGEST_CHUNK_SIZE):
+        chunk = macs[start:start + INGEST_CHUNK_SIZE]
+        ids.update(db.session.query(Device.mac_address, Device.id).filter(Device.mac_address.in_(chunk)).all())
+    return ids
+
+
+def ingest_batch(raw_records, sensor, now=None):
+    """
+    Valida y aplica un lote de avistamientos. Hace commit.
+
+    Por cada MAC solo se aplica el registro más reciente del lote, y solo si es posterior
+    al last_seen guardado: lotes atrasados o repetidos no hacen retroceder el estado de un
+    dispositivo. Todos los registros válidos pasan al historial de presencia.
+
+    Devuelve los contadores por código de resultado, 'results' (un código por registro,
+    en el orden recibido) y 'rejected' (posición y motivo de los inválidos).
+    """
+    now = now or datetime.now(UTC)
+    results = [None] * len(raw_records)
+    rejected = []
+    records = []
+    latest = {}
+
+    for index, raw in enumerate(raw_records):
+        try:
+            record = normalize_record(raw, now)
+        except ValueError as e:
+            results[index] = RESULT_INVALID
+            rejected.append({'index': index, 'error': str(e)})
+            continue
+        record['index'] = index
+        records.append(record)
+
+        record['first_seen'] = record['seen_at']
+        current = latest.get(record['mac'])
+        if current is None:
+            latest[record['mac']] = record
+            continue
+        if record['seen_at'] > current['seen_at']:
+            results[current['index']] = RESULT_DUPLICATE
+            latest[record['mac']] = record
+            newest, older = record, current
+        else:
+            results[index] = RESULT_DUPLICATE
+            newest, older = current, record
+        # Fabricante y concesión solo los informan algunas fuentes: se conservan los de
+        # un registro anterior si el más reciente no los trae
+        newest['vendor'] = newest['vendor'] or older['vendor']
+        if newest['lease_seconds'] is None:
+            newest['lease_start'], newest['lease_seconds'] = older['lease_start'], older['lease_seconds']
+        newest['first_seen'] = min(newest['first_seen'], older['first_seen'])
+
+    # Estado actual de las MACs del lote, para decidir el código de cada registro
+    macs = list(latest.keys())
+    existing = {}
+    for start in range(0, len(macs), INGEST_CHUNK_SIZE):
+        chunk = macs[start:start + INGEST_CHUNK_SIZE]
+        for mac, device_id, last_seen in db.session.query(
+                Device.mac_address, Device.id, Device.last_seen).filter(Device.mac_address.in_(chunk)):
+            existing[mac] = (device_id, _as_utc(last_seen))
+
+    rows, created = [], []
+    for mac, record in latest.items():
+        if mac not in existing:
+            results[record['index']] = RESULT_CREATED
+            created.append(record)
+        elif record['seen_at'] > existing[mac][1]:
+            results[record['index']] = RESULT_UPDATED
+        else:
+            results[record['index']] = RESULT_STALE
+            continue
+        rows.append({
+            'mac_address': mac,
+            'ip_address': record['ip'],
+            'ip_int': record['ip_int'],
+            'vendor': record['vendor'] or f"Desconocido ({record['source']})",
+            'first_seen': record['first_seen'],
+            'last_seen': record['seen_at'],
+            'status': 'active',
+            'is_excluded': False,
+            'last_seen_by': record['source'],
+            'lease_start_time': record['lease_start'],
+            'lease_duration_seconds': record['lease_seconds'],
+        })
+
+    try:
+        if rows:
+            _write_devices(rows, existing)
+        device_ids = {mac: device_id for mac, (device_id, _) in existing.items()}
+        device_ids.update(_device_ids([record['mac'] for record in created]))
+
+        for record in created[:INGEST_LOGGED_NEW_DEVICES]:
+            log_event(f"Nuevo dispositivo descubierto (Ingesta '{sensor}'): IP {record['ip']}, MAC {record['mac']}")
+        if len(created) > INGEST_LOGGED_NEW_DEVICES:
+            log_event(f"Ingesta '{sensor}': {len(created) - INGEST_LOGGED_NEW_DEVICES} dispositivo(s) nuevos más.")
+        record_new_devices(len(created))
+
+        if rows:
+            publish_change('devices', {
+                'source': 'ingest', 'sensor': sensor, 'new': len(created), 'total': len(rows),
+                'devices': [{
+                    'id': device_ids.get(row['mac_address']),
+                    'ip_address': row['ip_address'],
+                    'mac_address': row['mac_address'],
+                    'status': 'active',
+                    'last_seen_by': row['last_seen_by'],
+                } for row in rows[:INGEST_CHANGE_DEVICES]]
+            })
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Historial de presencia: cada registro válido marca su propio intervalo
+    for record in records:
+        record_sighting(device_ids.get(record['mac']), record['seen_at'])
+    flush_sightings()
+
+    response = {code: results.count(code) for code in RESULT_CODES}
+    response.update({'received': len(raw_records), 'results': results, 'rejected': rejected})
+    return response
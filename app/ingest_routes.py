@@ -0,0 +1,45 @@
+# app/ingest_routes.py
+
+from flask import Blueprint, current_app, jsonify, request
+
+from app.ingest import parse_ingest_tokens, authenticate_sensor, decode_body, parse_payload, ingest_batch
+
+# Blueprint aparte de la API: los sensores no tienen sesión de usuario ni token CSRF,
+# se autentican con 'Authorization: Bearer <token>' (ver INGEST_TOKENS en config.py).
+ingest_bp = Blueprint('ingest', __name__, url_prefix='/api/ingest')
+
+@ingest_bp.route('/sightings', methods=['POST'])
+def ingest_sightings():
+    """
+    Recibe un lote de avistamientos: {"records": [{mac, ip, seen_at, source, vendor, lease}, ...]}
+    en JSON o msgpack (Content-Type: application/msgpack), opcionalmente con gzip
+    (Content-Encoding: gzip). El lote se aplica con un único upsert y la respuesta incluye
+    un código de resultado por registro ('results') y el motivo de los inválidos ('rejected').
+    """
+    tokens = parse_ingest_tokens(current_app.config.get('INGEST_TOKENS'))
+    if not tokens:
+        return jsonify({'error': 'La ingesta de sensores no está habilitada (INGEST_TOKENS vacío).'}), 404
+
+    sensor = authenticate_sensor(request.headers.get('Authorization'), tokens)
+    if sensor is None:
+        return jsonify({'error': 'Token de sensor inválido.'}), 401
+
+    try:
+        data = decode_body(request.get_data(cache=False), request.headers.get('Content-Encoding'))
+        raw_records = parse_payload(data, request.mimetype)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    max_records = current_app.config.get('INGEST_MAX_RECORDS', 50000)
+    if len(raw_records) > max_records:
+        return jsonify({'error': f'El lote tiene {len(raw_records)} registros; el máximo es {max_records}.'}), 413
+
+    try:
+        result = ingest_batch(raw_records, sensor)
+    except Exception as e:
+        # El detalle (SQL, rutas del servidor) se queda en el log del servidor
+        print(f"[!!!] ERROR al ingerir el lote de '{sensor}': {e}")
+        return jsonify({'error': 'No se pudo guardar el lote. Inténtelo de nuevo más tarde.'}), 503
+
+    result['sensor'] = sensor
+    return jsonify(result)
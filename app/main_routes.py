@@ -1,7 +1,9 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for
+from flask import Blueprint, Response, current_app, render_template, request, flash, redirect, url_for
 from flask_login import login_user, logout_user, current_user, login_required
 from app.models import User
 from app import db
+from app.counters import get_device_counters
+from app.metrics import render_metrics, authorized, CONTENT_TYPE
 
 main_bp = Blueprint('main', __name__)
 
@@ -41,3 +43,28 @@ def logout():
     logout_user()
     flash('Has cerrado sesión correctamente.', 'success')
     return redirect(url_for('main.login'))
+
+# --- MÉTRICAS PARA PROMETHEUS ---
+@main_bp.route('/metrics')
+def metrics():
+    """
+    Métricas del proceso web (latencia por ruta, commits, liberaciones manuales) y los
+    contadores de dispositivos. Prometheus se autentica con METRICS_TOKEN; sin token
+    configurado solo las ve un usuario con sesión iniciada (para el resto no existen).
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        if not current_user.is_authenticated:
+            return Response('Not Found\n', status=404, mimetype='text/plain')
+    elif not authorized(request.headers.get('Authorization'), token):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+    counters = get_device_counters()
+    devices = [
+        ('devices', 'gauge', 'Dispositivos conocidos, por estado.', [
+            ({'state': 'total'}, counters['total_devices']),
+            ({'state': 'active'}, counters['active_devices']),
+            ({'state': 'released'}, counters['released_devices']),
+        ])
+    ]
+    return Response(render_metrics(devices), content_type=CONTENT_TYPE)
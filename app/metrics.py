@@ -0,0 +1,283 @@
+# app/metrics.py
+
+import bisect
+import functools
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# --- MÉTRICAS EN FORMATO PROMETHEUS ---
+# Registro en memoria y por proceso: la web las sirve en /metrics y el worker con su
+# propio servidor HTTP (start_metrics_server). Sin dependencias externas; los contadores
+# se reinician con el proceso, como espera Prometheus.
+
+METRIC_PREFIX = 'dhcp_sentinel_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Buckets en segundos: peticiones y commits (rápidos) y fases del worker (lentas)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PHASE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = METRIC_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"La métrica {self.name} espera las etiquetas {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, labels, value in self._samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    """Contador que solo crece (ej: paquetes recibidos)."""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('', list(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """Valor que sube y baja (ej: hosts encontrados en el último escaneo)."""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('', list(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    """Distribución de duraciones, con buckets acumulados como los de Prometheus."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mide la duración del bloque 'with' (se registra aunque lance una excepción)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels):
+        """Decorador: mide cada llamada a la función (ej: @worker_phase_seconds.timed(phase='sweep'))."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', labels + [('le', _format_value(float(bound)))], cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, count))
+        return samples
+
+
+def add_collector(func):
+    """
+    Registra una función que se evalúa en cada lectura de /metrics y devuelve una lista
+    de (nombre, tipo, descripción, [(etiquetas, valor), ...]). Sirve para valores que ya
+    existen en otro sitio (ej: las estadísticas de las tareas del planificador).
+    """
+    _collectors.append(func)
+    return func
+
+
+def render_metrics(extra_families=()):
+    """
+    Devuelve todas las métricas del proceso en el formato de texto de Prometheus.
+    extra_families: familias adicionales con el mismo formato que las de los colectores.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+
+    families = list(extra_families)
+    for collector in _collectors:
+        try:
+            families.extend(collector())
+        except Exception as e:
+            print(f"[!] Error al calcular métricas ({collector.__name__}): {e}")
+
+    for name, kind, documentation, samples in families:
+        full_name = METRIC_PREFIX + name
+        lines.append(f'# HELP {full_name} {documentation}')
+        lines.append(f'# TYPE {full_name} {kind}')
+        for labels, value in samples:
+            lines.append(f'{full_name}{_format_labels(sorted(labels.items()))} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def authorized(authorization, token):
+    """Comprueba 'Authorization: Bearer <token>' si hay METRICS_TOKEN configurado."""
+    if not token:
+        return True
+    scheme, _, value = (authorization or '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(value.strip().encode('utf-8'), token.encode('utf-8'))
+
+
+# --- MÉTRICAS DE LA APLICACIÓN ---
+
+worker_phase_seconds = Histogram(
+    'worker_phase_seconds', 'Duración de cada fase del worker (scan, sync, release, sweep).',
+    ['phase'], buckets=PHASE_BUCKETS)
+nmap_scans_total = Counter('nmap_scans_total', 'Escaneos Nmap ejecutados, por resultado.', ['result'])
+nmap_hosts_found = Gauge('nmap_hosts_found', 'Hosts con MAC encontrados en el último escaneo Nmap.')
+sniffer_packets_received_total = Counter(
+    'sniffer_packets_received_total', 'Paquetes DHCP capturados por el sniffer, por tipo de mensaje.', ['message_type'])
+sniffer_packets_processed_total = Counter(
+    'sniffer_packets_processed_total', 'Paquetes DHCP que actualizaron un dispositivo, por tipo de mensaje.', ['message_type'])
+sniffer_packets_dropped_total = Counter(
+    'sniffer_packets_dropped_total', 'Paquetes DHCP descartados, por tipo de mensaje y motivo.', ['message_type', 'reason'])
+db_commit_seconds = Histogram('db_commit_seconds', 'Duración de los commits de la sesión (incluye el flush).')
+release_attempts_total = Counter(
+    'release_attempts_total', 'Intentos de liberación, por tipo y resultado.', ['type', 'result'])
+ping_probe_seconds = Histogram('ping_probe_seconds', 'Duración de las comprobaciones con ping, por resultado.', ['result'])
+http_request_seconds = Histogram(
+    'http_request_seconds', 'Latencia de las peticiones HTTP, por ruta, método y código.', ['route', 'method', 'status'])
+
+
+# --- INSTRUMENTACIÓN ---
+
+@event.listens_for(Session, 'before_commit')
+def _commit_started(session):
+    session.info['metrics_commit_started'] = time.perf_counter()
+
+
+@event.listens_for(Session, 'after_commit')
+def _commit_finished(session):
+    started = session.info.pop('metrics_commit_started', None)
+    if started is not None:
+        db_commit_seconds.observe(time.perf_counter() - started)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _commit_failed(session, previous_transaction):
+    session.info.pop('metrics_commit_started', None)
+
+
+def init_request_metrics(app):
+    """Registra la latencia de cada petición de la app, etiquetada con el patrón de la ruta."""
+    from flask import g, request
+
+    @app.before_request
+    def _request_started():
+        g.metrics_request_started = time.perf_counter()
+
+    @app.after_request
+    def _request_finished(response):
+        started = g.pop('metrics_request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                route=route, method=request.method, status=response.status_code)
+        return response
+
+
+def start_metrics_server(address, port, token=''):
+    """
+    Sirve /metrics en un hilo aparte (exportador del worker, que no tiene servidor web).
+    Devuelve el servidor; server.shutdown() lo detiene.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            if not authorized(self.headers.get('Authorization'), token):
+                self.send_error(401)
+                return
+            body = render_metrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # Sin una línea por cada lectura de Prometheus
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
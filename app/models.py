@@ -1,11 +1,27 @@
 # app/models.py
 
 import datetime
+import ipaddress
 from app import db
 from sqlalchemy.sql import func
+from sqlalchemy.orm import validates
 from flask_login import UserMixin 
 from app import bcrypt
 
+def ip_to_int(ip_address):
+    """Convierte una IPv4 en texto a entero (None si no es una IPv4 válida)."""
+    try:
+        return int(ipaddress.IPv4Address(ip_address))
+    except (ipaddress.AddressValueError, ValueError, TypeError):
+        return None
+
+def format_datetime_utc(dt):
+    """Formatea una fecha como ISO 8601 en UTC con milisegundos y 'Z' (None si no hay fecha)."""
+    if not dt:
+        return None
+    # isoformat() está implementado en C y es bastante más rápido que strftime()
+    return dt.replace(tzinfo=None).isoformat(timespec='milliseconds') + 'Z'
+
 # --- MODELO DE USUARIO ---
 class User(UserMixin, db.Model):
     __tablename__ = 'user'
@@ -28,13 +44,16 @@ class Device(db.Model):
     __tablename__ = 'device'
     id = db.Column(db.Integer, primary_key=True)
     ip_address = db.Column(db.String(15), nullable=False)
+    # Representación numérica de ip_address, mantenida automáticamente. Permite ordenar
+    # por IP numéricamente y filtrar subredes como rangos del índice.
+    ip_int = db.Column(db.BigInteger, nullable=True, index=True)
     mac_address = db.Column(db.String(17), unique=True, nullable=False, index=True)
     vendor = db.Column(db.String(255), nullable=True)
     
-    first_seen = db.Column(db.DateTime(timezone=True), nullable=False)
-    last_seen = db.Column(db.DateTime(timezone=True), nullable=False)
+    first_seen = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+    last_seen = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
 
-    status = db.Column(db.String(50), default='active', nullable=False)
+    status = db.Column(db.String(50), default='active', nullable=False, index=True)
     is_excluded = db.Column(db.Boolean, default=False, nullable=False)
     
     lease_start_time = db.Column(db.DateTime(timezone=True), nullable=True)
@@ -43,27 +62,36 @@ class Device(db.Model):
     # --- NUEVO CAMPO ---
     last_seen_by = db.Column(db.String(10), nullable=True, default='nmap')
 
+    # Secuencia del último cambio de la fila. En SQLite la asignan triggers en cada
+    # INSERT/UPDATE, así que la mantienen todos los escritores (worker, sniffer y API).
+    change_seq = db.Column(db.Integer, nullable=True, index=True)
 
-    def to_dict(self):
-        # Función para formatear fechas de manera segura, asegurando el formato UTC con 'Z'
-        def format_datetime_as_utc(dt):
-            if not dt:
-                return None
-            # Asegura que la cadena ISO siempre termine con 'Z' (Zulu time / UTC)
-            return dt.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    @validates('ip_address')
+    def _sync_ip_int(self, key, value):
+        self.ip_int = ip_to_int(value)
+        return value
+
+    @staticmethod
+    def in_network(network):
+        """Filtro SQL para los dispositivos dentro de una red IPv4 (búsqueda por rango en el índice)."""
+        if isinstance(network, str):
+            network = ipaddress.IPv4Network(network, strict=False)
+        return Device.ip_int.between(int(network.network_address), int(network.broadcast_address))
 
+    def to_dict(self):
         return {
             'id': self.id,
             'ip_address': self.ip_address,
             'mac_address': self.mac_address,
             'vendor': self.vendor,
-            'first_seen': format_datetime_as_utc(self.first_seen),
-            'last_seen': format_datetime_as_utc(self.last_seen),
+            'first_seen': format_datetime_utc(self.first_seen),
+            'last_seen': format_datetime_utc(self.last_seen),
             'status': self.status,
             'is_excluded': self.is_excluded,
-            'lease_start_time': format_datetime_as_utc(self.lease_start_time),
+            'lease_start_time': format_datetime_utc(self.lease_start_time),
             'lease_duration_seconds': self.lease_duration_seconds,
-            'last_seen_by': self.last_seen_by # <-- Añadido
+            'last_seen_by': self.last_seen_by, # <-- Añadido
+            'change_seq': self.change_seq
         }
 
 class ApplicationConfig(db.Model):
@@ -81,6 +109,18 @@ class ApplicationConfig(db.Model):
 
     scan_interval_seconds = db.Column(db.Integer, nullable=False, default=60, server_default='60')
 
+    # Minutos sin ver un dispositivo para considerarlo inactivo (worker y estadísticas)
+    inactive_threshold_minutes = db.Column(db.Integer, nullable=False, default=5, server_default='5')
+
+    # Pools DHCP (un rango 'inicio-fin' o CIDR por línea; vacío = la subred de escaneo) y
+    # ocupación a partir de la cual se liberan inactivos del pool (0 = desactivado)
+    dhcp_pool_ranges = db.Column(db.Text, nullable=False, default='', server_default='')
+    pool_release_threshold_percent = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Presupuesto de liberaciones automáticas: por ciclo y por minuto en cada interfaz
+    # (0 = sin límite). Los pools muy ocupados pueden superarlo (ver app/release_queue.py).
+    release_budget_per_cycle = db.Column(db.Integer, nullable=False, default=50, server_default='50')
+    release_budget_per_interface = db.Column(db.Integer, nullable=False, default=30, server_default='30')
 
     @staticmethod
     def get_settings():
@@ -91,6 +131,10 @@ class ApplicationConfig(db.Model):
             db.session.commit()
         return settings
 
+    def inactive_since(self):
+        """Fecha límite: los dispositivos activos no vistos desde entonces pasan a inactivos."""
+        return datetime.datetime.now(datetime.UTC) - datetime.timedelta(minutes=self.inactive_threshold_minutes)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -102,7 +146,12 @@ class ApplicationConfig(db.Model):
             'dry_run_enabled': self.dry_run_enabled,
             'discovery_method': self.discovery_method,
             'release_policy': self.release_policy,
-            'scan_interval_seconds': self.scan_interval_seconds
+            'scan_interval_seconds': self.scan_interval_seconds,
+            'inactive_threshold_minutes': self.inactive_threshold_minutes,
+            'dhcp_pool_ranges': self.dhcp_pool_ranges,
+            'pool_release_threshold_percent': self.pool_release_threshold_percent,
+            'release_budget_per_cycle': self.release_budget_per_cycle,
+            'release_budget_per_interface': self.release_budget_per_interface
         }
 
 class LogEntry(db.Model):
@@ -120,21 +169,151 @@ class LogEntry(db.Model):
             'message': self.message
         }
 
-class HistoricalStat(db.Model):
-    __tablename__ = 'historical_stat'
-    date = db.Column(db.Date, primary_key=True)
+class DeviceCounter(db.Model):
+    """
+    Contadores en vivo de la tabla de dispositivos (una sola fila, id=1). En SQLite los
+    mantienen triggers sobre 'device', así que cualquier escritura (worker, sniffer o API)
+    los actualiza en la misma transacción. El worker los reconcilia periódicamente.
+    """
+    __tablename__ = 'device_counter'
+    id = db.Column(db.Integer, primary_key=True)
+    total_devices = db.Column(db.Integer, default=0, nullable=False)
+    active_devices = db.Column(db.Integer, default=0, nullable=False)
+    released_devices = db.Column(db.Integer, default=0, nullable=False)
+    reconciled_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+class DataVersion(db.Model):
+    """
+    Versión de cada conjunto de datos que consulta el dashboard ('devices', 'logs', 'stats').
+    En SQLite la incrementan triggers en cada escritura; la API la usa para generar ETags.
+    También guarda la secuencia de cambios de dispositivos ('device_changes') y la marca de
+    tombstones purgados ('device_tombstones_pruned').
+    """
+    __tablename__ = 'data_version'
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+class ChangeEvent(db.Model):
+    """
+    Cola de cambios que publican el worker, el sniffer y la API (dispositivos nuevos o
+    actualizados, transiciones de estado, liberaciones). /api/stream la reenvía por SSE.
+    AUTOINCREMENT evita que SQLite reutilice ids tras purgar los eventos antiguos.
+    """
+    __tablename__ = 'change_event'
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True, default=lambda: datetime.datetime.now(datetime.UTC))
+    kind = db.Column(db.String(32), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+
+class DeviceTombstone(db.Model):
+    """
+    Registro de un dispositivo eliminado, para que los clientes de /api/devices/changes
+    puedan borrarlo de su copia local. Lo crea un trigger al borrar la fila de 'device'.
+    """
+    __tablename__ = 'device_tombstone'
+    change_seq = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    device_id = db.Column(db.Integer, nullable=False)
+    mac_address = db.Column(db.String(17), nullable=False)
+    deleted_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.device_id,
+            'mac_address': self.mac_address,
+            'change_seq': self.change_seq
+        }
+
+class HourlyStat(db.Model):
+    """
+    Estadísticas agregadas por hora (UTC). El worker y la API las actualizan de forma
+    incremental (upsert con suma/máximo); las vistas diarias y semanales se derivan de aquí.
+    """
+    __tablename__ = 'hourly_stat'
+    hour = db.Column(db.DateTime, primary_key=True)
     releases_manual = db.Column(db.Integer, default=0, nullable=False)
     releases_inactivity = db.Column(db.Integer, default=0, nullable=False)
     releases_mac_list = db.Column(db.Integer, default=0, nullable=False)
+    releases_pool_pressure = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    new_devices = db.Column(db.Integer, default=0, nullable=False)
     total_devices_snapshot = db.Column(db.Integer, default=0, nullable=False)
     active_devices_peak = db.Column(db.Integer, default=0, nullable=False)
 
     def to_dict(self):
         return {
-            'date': self.date.isoformat(),
+            'hour': self.hour.strftime('%Y-%m-%dT%H:00:00Z'),
             'releases_manual': self.releases_manual,
             'releases_inactivity': self.releases_inactivity,
             'releases_mac_list': self.releases_mac_list,
+            'releases_pool_pressure': self.releases_pool_pressure,
+            'new_devices': self.new_devices,
             'total_devices_snapshot': self.total_devices_snapshot,
             'active_devices_peak': self.active_devices_peak
         }
+
+class PoolStat(db.Model):
+    """
+    Ocupación de cada pool DHCP por hora (UTC): picos de direcciones asignadas y activas.
+    Alimenta los gráficos históricos y la previsión de agotamiento (ver app/pools.py).
+    """
+    __tablename__ = 'pool_stat'
+    hour = db.Column(db.DateTime, primary_key=True)
+    pool = db.Column(db.String(40), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    allocated_peak = db.Column(db.Integer, default=0, nullable=False)
+    active_peak = db.Column(db.Integer, default=0, nullable=False)
+
+class InterfaceRelease(db.Model):
+    """
+    DHCPRELEASE enviado por una interfaz en el último minuto. Es la ventana del límite de
+    liberaciones por minuto e interfaz (ver app/release_queue.py): vive en la base de datos
+    para que el worker y todos los procesos web compartan el mismo cupo.
+    """
+    __tablename__ = 'interface_release'
+    id = db.Column(db.Integer, primary_key=True)
+    interface = db.Column(db.String(50), nullable=False)
+    sent_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (db.Index('ix_interface_release_window', 'interface', 'sent_at'),)
+
+class IpConflict(db.Model):
+    """
+    Conflicto detectado en una IP por el índice IP->MAC del worker (ver app/conflicts.py):
+    'duplicate' si dos MACs usan la IP a la vez, 'flapping' si la IP cambia de MAC una y
+    otra vez. Sigue abierto (resolved_at nulo) mientras se sigan viendo indicios.
+    """
+    __tablename__ = 'ip_conflict'
+    id = db.Column(db.Integer, primary_key=True)
+    ip_address = db.Column(db.String(15), nullable=False)
+    kind = db.Column(db.String(16), nullable=False)
+    macs = db.Column(db.Text, nullable=False) # MACs implicadas, separadas por comas
+    first_detected = db.Column(db.DateTime(timezone=True), nullable=False)
+    last_detected = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+    occurrences = db.Column(db.Integer, default=1, nullable=False)
+    resolved_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (db.Index('ix_ip_conflict_open', 'resolved_at', 'ip_address'),)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'ip_address': self.ip_address,
+            'kind': self.kind,
+            'macs': self.macs.split(','),
+            'first_detected': format_datetime_utc(self.first_detected),
+            'last_detected': format_datetime_utc(self.last_detected),
+            'occurrences': self.occurrences,
+            'resolved_at': format_datetime_utc(self.resolved_at)
+        }
+
+class DeviceSighting(db.Model):
+    """
+    Presencia de un dispositivo durante un día (UTC), guardada como un mapa de bits:
+    cada bit es un intervalo de resolution_minutes en el que el dispositivo fue visto.
+    Con 5 minutos un día ocupa 36 bytes; los días antiguos se compactan a 1 hora (3 bytes).
+    """
+    __tablename__ = 'device_sighting'
+    device_id = db.Column(db.Integer, db.ForeignKey('device.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    resolution_minutes = db.Column(db.Integer, nullable=False, default=5)
+    bitmap = db.Column(db.LargeBinary, nullable=False)
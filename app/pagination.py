@@ -0,0 +1,125 @@
+# app/pagination.py
+
+import json
+import time
+import base64
+import threading
+from datetime import datetime
+from sqlalchemy import or_, and_, literal
+
+# --- TOTAL APROXIMADO (CACHÉ) ---
+# Contar el conjunto filtrado en cada refresco del dashboard es lo más caro de una página.
+# En modo cursor el total se sirve desde esta caché y se recalcula como mucho cada
+# COUNT_CACHE_TTL_SECONDS por combinación de filtros.
+COUNT_CACHE_TTL_SECONDS = 30
+COUNT_CACHE_MAX_ENTRIES = 256
+
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+
+def cached_count(query, cache_key):
+    """
+    Devuelve el número de filas de 'query', reutilizando el valor calculado en los últimos
+    COUNT_CACHE_TTL_SECONDS para la misma cache_key.
+    """
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(cache_key)
+        if cached and now - cached[1] < COUNT_CACHE_TTL_SECONDS:
+            return cached[0]
+
+    total = query.order_by(None).count()
+
+    with _count_cache_lock:
+        if len(_count_cache) >= COUNT_CACHE_MAX_ENTRIES:
+            _count_cache.clear()
+        _count_cache[cache_key] = (total, now)
+    return total
+
+
+# --- CURSORES OPACOS ---
+
+def encode_cursor(payload):
+    """Codifica un cursor como cadena base64 segura para URLs."""
+    raw = json.dumps(payload, separators=(',', ':'), default=_json_default).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decodifica un cursor generado por encode_cursor. Devuelve None si no es válido."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, dict) or 'id' not in payload or 'v' not in payload:
+        return None
+    # Un cursor manipulado no debe llegar a la consulta: solo escalares y un id entero
+    if not isinstance(payload['id'], int) or isinstance(payload['id'], bool):
+        return None
+    if payload['v'] is not None and not isinstance(payload['v'], (str, int, float)):
+        return None
+    if payload.get('d', 'next') not in ('next', 'prev'):
+        return None
+    return payload
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Tipo no serializable en cursor: {type(value)}')
+
+
+# --- PAGINACIÓN POR CLAVE (KEYSET) ---
+
+def keyset_paginate(query, sort_key, id_column, descending, per_page, cursor=None, parse_value=None):
+    """
+    Pagina 'query' por la tupla (sort_key, id) sin OFFSET: cada página es una búsqueda
+    por rango en el índice, así que la página N cuesta lo mismo que la primera.
+
+    - sort_key: expresión de ordenación (no debe ser NULL; usar coalesce si hace falta).
+    - cursor: payload decodificado con 'v' (valor de ordenación), 'id' y 'd' ('next'/'prev').
+    - parse_value: convierte el valor guardado en el cursor al tipo de la columna. Si falla,
+      el cursor no es válido y se devuelve la primera página.
+
+    Devuelve una tupla: (items, has_next, has_prev)
+    """
+    direction = 'next'
+    value = None
+    if cursor and parse_value:
+        try:
+            value = parse_value(cursor['v'])
+        except (ValueError, TypeError):
+            cursor = None
+    elif cursor:
+        value = cursor['v']
+    if cursor:
+        direction = cursor.get('d', 'next')
+        # literal() evita que SQLAlchemy trate True/False como constantes (no admiten '<' ni '>')
+        value = literal(value, sort_key.type)
+        last_id = cursor['id']
+
+        # Hacia delante en orden descendente (o hacia atrás en ascendente) se buscan claves menores
+        if descending == (direction == 'next'):
+            query = query.filter(or_(sort_key < value, and_(sort_key == value, id_column < last_id)))
+        else:
+            query = query.filter(or_(sort_key > value, and_(sort_key == value, id_column > last_id)))
+
+    # Para ir hacia atrás se recorre el índice en orden inverso y luego se da la vuelta a la página
+    reverse_scan = descending != (direction == 'prev')
+    if reverse_scan:
+        query = query.order_by(sort_key.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_key.asc(), id_column.asc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+
+    if direction == 'prev':
+        items.reverse()
+        return items, True, has_more
+    return items, has_more, cursor is not None
@@ -0,0 +1,327 @@
+# app/pools.py
+
+import ipaddress
+import math
+import threading
+from datetime import datetime, timedelta, UTC
+
+from app import db
+from app.models import Device, PoolStat
+from app.changes import devices_changed_since, get_sequence
+
+# --- ÍNDICE DE OCUPACIÓN DE LOS POOLS DHCP ---
+# Cada pool (un rango de direcciones que reparte el servidor DHCP) se representa con mapas
+# de bits de 1 bit por dirección: asignada (la tiene un dispositivo no liberado), activa y
+# liberada. Los contadores se mantienen al cambiar cada bit, así que la ocupación se
+# consulta en O(1). El índice vive en memoria de cada proceso y se actualiza de forma
+# incremental con los change_seq de los dispositivos (ver app/changes.py).
+MAX_POOL_SIZE = 65536 # Direcciones por rango (una /16); evita mapas enormes por un error de configuración
+CHANGES_BATCH_SIZE = 2000
+FORECAST_DAYS = 7 # Historial usado para la tendencia de ocupación
+FORECAST_MIN_POINTS = 6 # Horas con datos necesarias para estimar la tendencia
+
+
+def parse_pool_ranges(text, fallback_cidr=None):
+    """
+    Interpreta la lista de pools configurada: un rango por línea, como 'inicio-fin'
+    (ej: 192.168.1.100-192.168.1.200) o en notación CIDR (se excluyen red y broadcast).
+    Si no hay ninguno, se usan los hosts de 'fallback_cidr' (la subred de escaneo).
+    Devuelve una lista de tuplas (inicio, fin) como enteros. Lanza ValueError si una línea
+    no es válida, si un rango es demasiado grande o si dos rangos se solapan.
+    """
+    ranges = []
+    for line in (text or '').splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if '-' in line:
+                first, last = (int(ipaddress.IPv4Address(part.strip())) for part in line.split('-', 1))
+            else:
+                network = ipaddress.IPv4Network(line, strict=False)
+                first, last = _network_hosts(network)
+        except ValueError:
+            raise ValueError(f"Rango de pool inválido: '{line}'. Use 'inicio-fin' o notación CIDR.")
+        if first > last:
+            raise ValueError(f"Rango de pool inválido: '{line}'. La primera dirección es mayor que la última.")
+        if last - first + 1 > MAX_POOL_SIZE:
+            raise ValueError(f"El rango '{line}' tiene más de {MAX_POOL_SIZE} direcciones.")
+        ranges.append((first, last))
+
+    ranges.sort()
+    for (_, previous_last), (first, _) in zip(ranges, ranges[1:]):
+        if first <= previous_last:
+            raise ValueError(f"Los rangos de pool se solapan en {ipaddress.IPv4Address(first)}.")
+
+    if not ranges and fallback_cidr:
+        try:
+            first, last = _network_hosts(ipaddress.IPv4Network(fallback_cidr, strict=False))
+        except ValueError:
+            return []
+        # Una subred de escaneo enorme no se indexa: hay que configurar los pools a mano
+        if last - first + 1 <= MAX_POOL_SIZE:
+            ranges.append((first, last))
+    return ranges
+
+
+def _network_hosts(network):
+    if network.num_addresses <= 2:
+        return int(network.network_address), int(network.broadcast_address)
+    return int(network.network_address) + 1, int(network.broadcast_address) - 1
+
+
+class Pool:
+    """Mapas de bits de un rango de direcciones y sus contadores."""
+
+    def __init__(self, first, last):
+        self.first = first
+        self.last = last
+        self.size = last - first + 1
+        self.name = f'{ipaddress.IPv4Address(first)}-{ipaddress.IPv4Address(last)}'
+        nbytes = (self.size + 7) // 8
+        self.allocated = bytearray(nbytes)
+        self.active = bytearray(nbytes)
+        self.released = bytearray(nbytes)
+        # Dispositivos por dirección y estado: una IP puede figurar en varios registros
+        # (un equipo antiguo y el que la tiene ahora), y el bit solo se apaga con el último.
+        self._holders = {}
+        self.allocated_count = 0
+        self.active_count = 0
+        self.released_count = 0 # Liberadas y sin ningún dispositivo que las tenga ahora
+
+    def contains(self, ip_int):
+        return ip_int is not None and self.first <= ip_int <= self.last
+
+    def _bit(self, bitmap, offset):
+        return bitmap[offset >> 3] >> (offset & 7) & 1
+
+    def _set(self, bitmap, offset, value):
+        if value:
+            bitmap[offset >> 3] |= 1 << (offset & 7)
+        else:
+            bitmap[offset >> 3] &= ~(1 << (offset & 7)) & 0xFF
+
+    def _update_bits(self, offset):
+        held, active, released = self._holders.get(offset, (0, 0, 0))
+        for bitmap, counter, value in ((self.allocated, 'allocated_count', held > 0),
+                                       (self.active, 'active_count', active > 0),
+                                       (self.released, 'released_count', released > 0 and not held)):
+            if self._bit(bitmap, offset) != value:
+                self._set(bitmap, offset, value)
+                setattr(self, counter, getattr(self, counter) + (1 if value else -1))
+
+    def add(self, offset, status, delta=1):
+        """Suma (o resta, con delta=-1) un dispositivo con ese estado en la dirección."""
+        held, active, released = self._holders.get(offset, (0, 0, 0))
+        if status == 'released':
+            released += delta
+        else:
+            held += delta
+            if status == 'active':
+                active += delta
+        if held or active or released:
+            self._holders[offset] = (held, active, released)
+        else:
+            self._holders.pop(offset, None)
+        self._update_bits(offset)
+
+    def utilization(self):
+        return self.allocated_count / self.size if self.size else 0.0
+
+    def free_blocks(self, min_size=1, limit=None):
+        """
+        Bloques contiguos de direcciones libres (no asignadas) de al menos 'min_size'
+        direcciones, en orden de dirección. Recorre el mapa de bits por bytes: los bytes
+        llenos o vacíos se saltan de una vez.
+        Devuelve una lista de tuplas (primera, última, tamaño) con las IPs como texto.
+        """
+        blocks = []
+        run_start = None
+
+        def close(end):
+            size = end - run_start
+            if size >= min_size:
+                blocks.append((str(ipaddress.IPv4Address(self.first + run_start)),
+                               str(ipaddress.IPv4Address(self.first + end - 1)), size))
+
+        for index, byte in enumerate(self.allocated):
+            base = index << 3
+            if byte == 0:
+                if run_start is None:
+                    run_start = base
+                continue
+            if byte == 0xFF:
+                if run_start is not None:
+                    close(base)
+                    run_start = None
+                    if limit and len(blocks) >= limit:
+                        return blocks
+                continue
+            for bit in range(8):
+                if byte >> bit & 1:
+                    if run_start is not None:
+                        close(base + bit)
+                        run_start = None
+                elif run_start is None:
+                    run_start = base + bit
+            if limit and len(blocks) >= limit:
+                return blocks[:limit]
+
+        if run_start is not None:
+            # Los bits sobrantes del último byte quedan a 0: no cuentan como libres
+            close(self.size)
+        return blocks[:limit] if limit else blocks
+
+    def largest_free_block(self):
+        blocks = self.free_blocks()
+        return max(blocks, key=lambda block: block[2]) if blocks else None
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'first': str(ipaddress.IPv4Address(self.first)),
+            'last': str(ipaddress.IPv4Address(self.last)),
+            'size': self.size,
+            'allocated': self.allocated_count,
+            'active': self.active_count,
+            'released': self.released_count,
+            'free': self.size - self.allocated_count,
+            'utilization_percent': round(self.utilization() * 100, 2),
+        }
+
+
+class PoolIndex:
+    """
+    Índice de todos los pools configurados. refresh() lo reconstruye entero si cambia la
+    configuración o si se han purgado tombstones que no llegó a ver; en otro caso solo
+    aplica los dispositivos con change_seq posterior al último procesado.
+    """
+
+    def __init__(self):
+        self.pools = []
+        self._key = None
+        self._devices = {} # device_id -> (pool, offset, status)
+        self._last_seq = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, config):
+        key = (config.dhcp_pool_ranges or '', config.scan_subnet or '')
+        with self._lock:
+            pruned = get_sequence('device_tombstones_pruned') or 0
+            if key != self._key or pruned > self._last_seq:
+                self._rebuild(key)
+            else:
+                self._apply_changes()
+        return self
+
+    def _rebuild(self, key):
+        try:
+            ranges = parse_pool_ranges(key[0], key[1])
+        except ValueError as e:
+            print(f"[!] Configuración de pools inválida, se usa la subred de escaneo: {e}")
+            ranges = parse_pool_ranges('', key[1])
+        self.pools = [Pool(first, last) for first, last in ranges]
+        self._devices = {}
+        # La secuencia se lee antes de la consulta: lo que cambie mientras tanto se vuelve
+        # a aplicar en el siguiente refresh, y aplicar un dispositivo dos veces no cambia nada.
+        self._last_seq = get_sequence('device_changes') or 0
+        for pool in self.pools:
+            rows = db.session.query(Device.id, Device.ip_int, Device.status).filter(
+                Device.ip_int.between(pool.first, pool.last)
+            )
+            for device_id, ip_int, status in rows:
+                self._place(device_id, ip_int, status)
+        self._key = key
+
+    def _apply_changes(self):
+        has_more = True
+        while has_more:
+            devices, tombstones, next_seq, has_more = devices_changed_since(self._last_seq, CHANGES_BATCH_SIZE)
+            for device in devices:
+                self._remove(device.id)
+                self._place(device.id, device.ip_int, device.status)
+            for tombstone in tombstones:
+                self._remove(tombstone.device_id)
+            self._last_seq = next_seq
+
+    def pool_for(self, ip_int):
+        """Pool que contiene la dirección (None si no está en ninguno)."""
+        for pool in self.pools:
+            if pool.contains(ip_int):
+                return pool
+        return None
+
+    def _place(self, device_id, ip_int, status):
+        pool = self.pool_for(ip_int)
+        if pool is not None:
+            offset = ip_int - pool.first
+            pool.add(offset, status)
+            self._devices[device_id] = (pool, offset, status)
+
+    def _remove(self, device_id):
+        entry = self._devices.pop(device_id, None)
+        if entry is not None:
+            pool, offset, status = entry
+            pool.add(offset, status, delta=-1)
+
+    def find(self, name):
+        return next((pool for pool in self.pools if pool.name == name), None)
+
+
+_index = PoolIndex()
+
+
+def get_pool_index(config):
+    """Índice de pools del proceso, actualizado con los últimos cambios de dispositivos."""
+    return _index.refresh(config)
+
+
+# --- PREVISIÓN DE AGOTAMIENTO ---
+
+def forecast_exhaustion(pool, now=None):
+    """
+    Ajuste lineal (mínimos cuadrados) del pico horario de direcciones asignadas en los
+    últimos FORECAST_DAYS días. Si la tendencia crece, estima cuándo se llenará el pool
+    partiendo de la ocupación actual.
+    Devuelve un diccionario con la pendiente (direcciones/día), los días restantes y la fecha.
+    """
+    now = now or datetime.now(UTC)
+    since = (now - timedelta(days=FORECAST_DAYS)).replace(tzinfo=None)
+    rows = db.session.query(PoolStat.hour, PoolStat.allocated_peak).filter(
+        PoolStat.pool == pool.name, PoolStat.hour >= since
+    ).order_by(PoolStat.hour).all()
+
+    forecast = {'slope_per_day': None, 'days_left': None, 'exhausted_at': None, 'samples': len(rows)}
+    if len(rows) < FORECAST_MIN_POINTS:
+        return forecast
+
+    xs = [(hour - rows[0].hour).total_seconds() / 86400 for hour, _ in rows]
+    ys = [peak for _, peak in rows]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if not variance:
+        return forecast
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+    forecast['slope_per_day'] = round(slope, 3)
+
+    free = pool.size - pool.allocated_count
+    if free <= 0:
+        forecast['days_left'] = 0
+        forecast['exhausted_at'] = now.isoformat()
+    elif slope > 0:
+        days_left = free / slope
+        forecast['days_left'] = round(days_left, 1)
+        if days_left < 3650:
+            forecast['exhausted_at'] = (now + timedelta(days=days_left)).isoformat()
+    return forecast
+
+
+def pressure_excess(pool, threshold_percent):
+    """
+    Cuántas direcciones hay que liberar para dejar el pool por debajo del umbral
+    (0 si ya lo está o si el umbral está desactivado).
+    """
+    if not threshold_percent or pool.utilization() * 100 < threshold_percent:
+        return 0
+    allowed = math.ceil(pool.size * threshold_percent / 100) - 1
+    return max(pool.allocated_count - allowed, 0)
@@ -0,0 +1,121 @@
+# app/release_queue.py
+
+import heapq
+from datetime import datetime, timedelta, UTC
+
+from app import db
+from app.models import InterfaceRelease
+
+# --- COLA PRIORIZADA DE LIBERACIONES ---
+# Las reglas automáticas (inactividad, lista de MACs, presión del pool) solo proponen
+# candidatos; el orden y la cantidad los decide esta cola. Primero salen los dispositivos
+# que llevan más tiempo sin verse y, a igualdad, los de concesión más antigua. Cada ciclo
+# tiene un presupuesto de liberaciones y cada interfaz un máximo por minuto, para no
+# inundar el servidor DHCP cuando un cambio de configuración vuelve elegibles a miles
+# de dispositivos. Lo que no cabe se queda para el siguiente ciclo. El límite por interfaz
+# se cuenta en la base de datos: lo comparten el worker y la web.
+
+# Multiplicador del presupuesto para los candidatos de un pool según su ocupación (%):
+# un pool casi lleno puede seguir liberando cuando el presupuesto normal ya se ha gastado.
+POOL_PRESSURE_BUDGET_TIERS = ((95, 4), (90, 3), (80, 2))
+INTERFACE_WINDOW_SECONDS = 60
+
+
+def _as_utc(moment):
+    return moment.replace(tzinfo=UTC) if moment.tzinfo is None else moment
+
+
+def release_priority(device, now):
+    """
+    Clave de prioridad de un candidato: (segundos sin verse, edad de la concesión).
+    Cuanto mayor, antes se libera. Sin concesión conocida la edad cuenta como 0.
+    """
+    staleness = (now - _as_utc(device.last_seen)).total_seconds()
+    lease_age = (now - _as_utc(device.lease_start_time)).total_seconds() if device.lease_start_time else 0.0
+    return staleness, lease_age
+
+
+def budget_multiplier(utilization_percent):
+    """Multiplicador del presupuesto para un pool con esa ocupación (1 si no hay presión)."""
+    for threshold, multiplier in POOL_PRESSURE_BUDGET_TIERS:
+        if utilization_percent >= threshold:
+            return multiplier
+    return 1
+
+
+class ReleaseQueue:
+    """
+    Montículo de candidatos a liberar. Un dispositivo propuesto por varias reglas entra
+    una sola vez, con la primera regla que lo propuso.
+    """
+
+    def __init__(self, now=None):
+        self.now = now or datetime.now(UTC)
+        self._heap = []
+        self._queued = set()
+
+    def push(self, device, release_type, multiplier=1):
+        if device.id in self._queued:
+            return False
+        self._queued.add(device.id)
+        staleness, lease_age = release_priority(device, self.now)
+        # heapq es un montículo de mínimos: se niega la prioridad; el id desempata
+        heapq.heappush(self._heap, (-staleness, -lease_age, device.id, release_type, multiplier, device))
+        return True
+
+    def pop(self):
+        """Devuelve (device, release_type, multiplier) del candidato más prioritario."""
+        _, _, _, release_type, multiplier, device = heapq.heappop(self._heap)
+        return device, release_type, multiplier
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class ReleaseBudget:
+    """
+    Presupuesto de una tanda de liberaciones: 'per_cycle' en la tanda (un ciclo del worker o
+    una petición de la web) y 'per_interface' por minuto en la interfaz (0 = sin límite). Un
+    candidato con multiplicador m (pool bajo presión) puede usar hasta m veces ambos límites.
+    La ventana por interfaz se guarda en la tabla 'interface_release', así que el cupo es
+    común al worker y a todos los procesos web. consume() añade a la sesión, pero NO hace
+    commit: la anotación se confirma con el commit de la liberación.
+    """
+
+    def __init__(self, interface, per_cycle, per_interface):
+        self.interface = interface
+        self.per_cycle = per_cycle
+        self.per_interface = per_interface
+        self.used = 0
+
+    def _window_start(self):
+        return datetime.now(UTC) - timedelta(seconds=INTERFACE_WINDOW_SECONDS)
+
+    def _recent(self):
+        return db.session.query(db.func.count(InterfaceRelease.id)).filter(
+            InterfaceRelease.interface == self.interface,
+            InterfaceRelease.sent_at >= self._window_start()
+        ).scalar()
+
+    def allows(self, multiplier=1):
+        if self.per_cycle and self.used >= self.per_cycle * multiplier:
+            return False
+        if self.per_interface and self._recent() >= self.per_interface * multiplier:
+            return False
+        return True
+
+    def exhausted(self, max_multiplier):
+        """True si ya no cabe ni un candidato con el mayor multiplicador de la cola."""
+        return not self.allows(max_multiplier)
+
+    def consume(self):
+        """Anota una liberación enviada (o intentada) por la interfaz."""
+        self.used += 1
+        if not self.per_interface:
+            return
+        # Las anotaciones que ya no cuentan se borran al añadir la siguiente
+        InterfaceRelease.query.filter(
+            InterfaceRelease.interface == self.interface,
+            InterfaceRelease.sent_at < self._window_start()
+        ).delete(synchronize_session=False)
+        db.session.add(InterfaceRelease(interface=self.interface, sent_at=datetime.now(UTC)))
@@ -1,17 +1,40 @@
 # app/routes.py
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, send_file, stream_with_context
 from flask_login import login_required, current_user
-from datetime import datetime, timedelta, UTC, date as date_obj
+from datetime import datetime, timedelta, UTC
 from app import db
-from app.models import Device, ApplicationConfig, LogEntry, HistoricalStat
+from app.models import Device, ApplicationConfig, LogEntry, HourlyStat, DeviceSighting, PoolStat, IpConflict
 from app.scanner.core import perform_dhcp_release, log_event, is_host_alive
-from sqlalchemy import or_
+from app.search import filter_logs_by_text, filter_devices_by_text
+from app.pagination import keyset_paginate, cached_count, encode_cursor, decode_cursor
+from app.sightings import activity_heatmap
+from app.changes import (publish_change, device_summary, changes_since, latest_change_id, oldest_change_id,
+                         devices_changed_since, get_sequence)
+from app.conditional import conditional_get
+from app.compression import compress_response
+from app.serializers import tuple_query, convert_rows, serialize_rows, json_response, DEVICE_COLUMNS, LOG_COLUMNS, SHAPES
+from app.export import export_response, EXPORT_FORMATS, DEVICE_EXPORT_COLUMNS, LOG_EXPORT_COLUMNS
+from app.counters import get_device_counters
+from app.metrics import release_attempts_total
+from app.tracing import read_cycles, request_profile, pending_profile, list_profiles, profile_summary
+from app.stats import record_release, aggregate_stats, aggregate_pool_stats, current_hour, GRANULARITIES
+from app.pools import get_pool_index, parse_pool_ranges, forecast_exhaustion
+from app.conflicts import release_conflict, blocked_releases
+from app.release_queue import ReleaseQueue, ReleaseBudget
+from sqlalchemy import or_, func, case
 from sqlalchemy.exc import OperationalError 
 import ipaddress
+import json
+import os
+import re
+import time
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Comprime las respuestas JSON de la API (brotli si está disponible, si no gzip)
+bp.after_request(compress_response)
+
 # --- PROTECCIÓN PARA TODA LA API ---
 @bp.before_request
 @login_required
@@ -19,16 +42,18 @@ def before_request():
     pass
 
 @bp.route('/stats', methods=['GET'])
+@conditional_get('devices')
 def get_stats():
-    """Endpoint para obtener estadísticas generales de los dispositivos."""
+    """
+    Endpoint para obtener estadísticas generales de los dispositivos.
+    Lee los contadores en vivo (una sola fila mantenida por triggers) en lugar de contar la tabla.
+    """
     try:
-        total_devices = Device.query.count()
-        
-        active_threshold = datetime.now(UTC) - timedelta(minutes=5)
-        active_devices = Device.query.filter(Device.last_seen > active_threshold).count()
+        counters = get_device_counters()
+        total_devices = counters['total_devices']
+        active_devices = counters['active_devices']
+        released_ips = counters['released_devices']
 
-        released_ips = Device.query.filter_by(status='released').count()
-        
         stats = {
             'total_devices': total_devices,
             'active_devices': active_devices,
@@ -38,99 +63,201 @@ def get_stats():
     except Exception as e:
         return jsonify({'error': f'No se pudieron calcular las estadísticas: {str(e)}'}), 500
 
+# --- FLUJO DE CAMBIOS EN VIVO (SERVER-SENT EVENTS) ---
+STREAM_POLL_SECONDS = 1
+STREAM_HEARTBEAT_SECONDS = 15
+# Cada conexión ocupa un hilo del servidor: se cierra periódicamente y EventSource reconecta
+# enviando Last-Event-ID, así que no se pierde ningún evento.
+STREAM_MAX_SECONDS = 300
+STREAM_RETRY_MS = 3000
+
+def _sse(event, data, event_id=None):
+    """Formatea un mensaje Server-Sent Events."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return '\n'.join(lines) + '\n\n'
+
+@bp.route('/stream', methods=['GET'])
+def stream_changes():
+    """
+    Envía por SSE los eventos de la cola de cambios (dispositivos, transiciones de estado,
+    liberaciones) y los contadores de /api/stats cada vez que cambian.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+
+    def generate():
+        nonlocal last_id
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+
+        if last_id is None:
+            last_id = latest_change_id()
+        else:
+            # Si los eventos pendientes ya se purgaron, el cliente debe recargarlo todo
+            oldest = oldest_change_id()
+            if oldest is not None and last_id < oldest - 1:
+                yield _sse('reset', json.dumps({'reason': 'expired'}))
+
+        last_counters = None
+        started = last_write = time.monotonic()
+        while time.monotonic() - started < STREAM_MAX_SECONDS:
+            try:
+                messages = []
+                for change in changes_since(last_id):
+                    messages.append(_sse(change.kind, change.payload, change.id))
+                    last_id = change.id
+
+                counters = get_device_counters()
+                if counters != last_counters:
+                    last_counters = counters
+                    messages.append(_sse('stats', json.dumps({
+                        'total_devices': counters['total_devices'],
+                        'active_devices': counters['active_devices'],
+                        'released_ips': counters['released_devices']
+                    })))
+            finally:
+                # No mantener abierta una transacción de lectura entre sondeos
+                db.session.close()
+
+            if messages:
+                yield ''.join(messages)
+                last_write = time.monotonic()
+            elif time.monotonic() - last_write >= STREAM_HEARTBEAT_SECONDS:
+                yield ": ping\n\n"
+                last_write = time.monotonic()
+
+            time.sleep(STREAM_POLL_SECONDS)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @bp.route('/stats/historical', methods=['GET'])
+@conditional_get('stats', extra=lambda: current_hour().isoformat())
 def get_historical_stats():
     """
     Devuelve datos históricos agregados para los gráficos del frontend.
+    Se derivan de las estadísticas horarias; 'granularity' puede ser hour, day o week.
     """
     period_str = request.args.get('period', '7d')
-    days = 7
-    if period_str == '30d':
-        days = 30
-    elif period_str == '90d':
-        days = 90
+    periods = {'24h': timedelta(hours=24), '7d': timedelta(days=7), '30d': timedelta(days=30), '90d': timedelta(days=90)}
+    period = periods.get(period_str, periods['7d'])
+
+    granularity = request.args.get('granularity') or ('hour' if period <= timedelta(days=2) else 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f"Granularidad inválida: '{granularity}'. Valores permitidos: {', '.join(GRANULARITIES)}."}), 400
 
-    start_date = date_obj.today() - timedelta(days=days - 1)
+    end_hour = current_hour()
+    if granularity == 'hour':
+        start_hour = end_hour - period + timedelta(hours=1)
+    else:
+        start_hour = end_hour.replace(hour=0) - period + timedelta(days=1)
     
     try:
-        stats = HistoricalStat.query.filter(HistoricalStat.date >= start_date).order_by(HistoricalStat.date.asc()).all()
+        labels, data_map = aggregate_stats(start_hour, end_hour, granularity)
+        pool_peaks = aggregate_pool_stats(start_hour, end_hour, labels, granularity)
     except OperationalError:
         error_msg = "La tabla de estadísticas no existe. Por favor, ejecuta 'flask db upgrade' para actualizar el esquema de la base de datos."
+        db.session.rollback()
         log_event(error_msg, "ERROR")
         db.session.commit()
         return jsonify({'error': error_msg}), 500
     except Exception as e:
+        db.session.rollback()
         log_event(f"Error al consultar estadísticas históricas: {str(e)}", "ERROR")
         db.session.commit()
         return jsonify({'error': f'Ocurrió un error en la base de datos: {str(e)}'}), 500
 
-    labels = [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
-    
-    data_map = {label: {
-        'releases_inactivity': 0,
-        'releases_mac_list': 0,
-        'releases_manual': 0,
-        'active_devices_peak': 0,
-        'total_devices_snapshot': 0
-    } for label in labels}
-
-    for stat in stats:
-        date_str = stat.date.isoformat()
-        if date_str in data_map:
-            data_map[date_str] = {
-                'releases_inactivity': stat.releases_inactivity,
-                'releases_mac_list': stat.releases_mac_list,
-                'releases_manual': stat.releases_manual,
-                'active_devices_peak': stat.active_devices_peak,
-                'total_devices_snapshot': stat.total_devices_snapshot
-            }
-
     response_data = {
+        'granularity': granularity,
         'labels': labels,
         'datasets': {
             'releases': [
                 {'label': 'Liberadas por Inactividad', 'data': [data_map[d]['releases_inactivity'] for d in labels]},
                 {'label': 'Liberadas por Lista MAC', 'data': [data_map[d]['releases_mac_list'] for d in labels]},
+                {'label': 'Liberadas por Presión del Pool', 'data': [data_map[d]['releases_pool_pressure'] for d in labels]},
                 {'label': 'Liberadas Manualmente', 'data': [data_map[d]['releases_manual'] for d in labels]}
             ],
             'activity': [
                 {'label': 'Pico de Dispositivos Activos', 'data': [data_map[d]['active_devices_peak'] for d in labels]},
-                {'label': 'Total Dispositivos Conocidos', 'data': [data_map[d]['total_devices_snapshot'] for d in labels]}
+                {'label': 'Total Dispositivos Conocidos', 'data': [data_map[d]['total_devices_snapshot'] for d in labels]},
+                {'label': 'Nuevos Dispositivos', 'data': [data_map[d]['new_devices'] for d in labels]}
+            ],
+            'pools': [
+                {'label': f'Ocupación del pool {pool} (%)', 'data': data} for pool, data in sorted(pool_peaks.items())
             ]
         }
     }
     
     return jsonify(response_data)
 
+def _filter_devices(query, search_term, cidr):
+    """
+    Aplica los filtros de la lista de dispositivos (búsqueda de texto y subred).
+    Lanza ValueError si 'cidr' no es una red válida.
+    """
+    if search_term.strip():
+        query = filter_devices_by_text(query, search_term.strip())
+
+    # Filtro por subred: rango sobre el índice de ip_int
+    if cidr:
+        query = query.filter(Device.in_network(cidr))
+    return query
+
 @bp.route('/devices', methods=['GET'])
+@conditional_get('devices')
 def get_devices():
-    """Endpoint para obtener la lista de dispositivos, con soporte para búsqueda, ordenación y paginación."""
+    """
+    Endpoint para obtener la lista de dispositivos, con soporte para búsqueda, ordenación y paginación.
+
+    Si la petición incluye el parámetro 'cursor' (vacío para la primera página) se usa
+    paginación por clave (sort_by, id) en lugar de OFFSET, con cursores opacos next/prev.
+    En ese modo 'total' elige cómo calcular el total: 'cached' (por defecto), 'exact' o 'none'.
+    """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
     sort_by = request.args.get('sort_by', 'last_seen')
     order = request.args.get('order', 'desc')
     search_term = request.args.get('search', '')
+    cidr = request.args.get('cidr', '').strip()
 
-    query = Device.query
-
-    if search_term:
-        search_pattern = f"%{search_term}%"
-        query = query.filter(or_(Device.ip_address.ilike(search_pattern), Device.mac_address.ilike(search_pattern), Device.vendor.ilike(search_pattern)))
+    try:
+        query = _filter_devices(Device.query, search_term, cidr)
+    except ValueError:
+        return jsonify({'error': f"Formato de subred inválido: '{cidr}'. Use notación CIDR, ej: 192.168.1.0/24."}), 400
 
     allowed_sort_fields = ['ip_address', 'mac_address', 'vendor', 'first_seen', 'last_seen', 'status', 'is_excluded', 'lease_start_time', 'last_seen_by']
     if sort_by not in allowed_sort_fields:
         sort_by = 'last_seen'
-    sort_column = getattr(Device, sort_by)
+    # Las IPs se ordenan numéricamente (10.0.0.2 antes que 10.0.0.100)
+    sort_column = Device.ip_int if sort_by == 'ip_address' else getattr(Device, sort_by)
+
+    # 'shape=columns' devuelve los nombres de columna una vez y cada fila como lista
+    shape = request.args.get('shape', 'objects')
+    if shape not in SHAPES:
+        shape = 'objects'
+
+    if 'cursor' in request.args:
+        return _get_devices_by_cursor(query, sort_by, sort_column, order, per_page, (search_term.strip(), cidr), shape)
+
     if order == 'asc':
-        query = query.order_by(sort_column.asc())
+        query = query.order_by(sort_column.asc(), Device.id.asc())
     else:
-        query = query.order_by(sort_column.desc())
+        query = query.order_by(sort_column.desc(), Device.id.desc())
 
+    query, converters = tuple_query(query, DEVICE_COLUMNS)
     paginated_devices = query.paginate(page=page, per_page=per_page, error_out=False)
-    devices = paginated_devices.items
+    rows = convert_rows(paginated_devices.items, DEVICE_COLUMNS, converters)
 
     response = {
-        'items': [device.to_dict() for device in devices],
+        **serialize_rows(rows, DEVICE_COLUMNS, shape),
         'pagination': {
             'page': paginated_devices.page,
             'per_page': paginated_devices.per_page,
@@ -140,9 +267,105 @@ def get_devices():
             'has_prev': paginated_devices.has_prev
         }
     }
-    return jsonify(response)
+    return json_response(response)
+
+# Columnas que admiten NULL: en modo cursor se ordenan sustituyendo NULL por un centinela,
+# porque la comparación por clave no funciona con valores NULL.
+NULL_SORT_SENTINELS = {
+    'ip_address': -1,
+    'vendor': '',
+    'lease_start_time': datetime(1970, 1, 1),
+    'last_seen_by': ''
+}
+
+def _get_devices_by_cursor(query, sort_by, sort_column, order, per_page, filters_key, shape):
+    """Devuelve una página de dispositivos usando paginación por clave (keyset)."""
+    per_page = max(1, min(per_page, 1024))
+    total_mode = request.args.get('total', 'cached')
+
+    cursor = decode_cursor(request.args.get('cursor'))
+    # Un cursor generado con otra ordenación no es válido: se vuelve a la primera página
+    if cursor and (cursor.get('s') != sort_by or cursor.get('o') != order):
+        cursor = None
+
+    total_items = None
+    if total_mode == 'exact':
+        total_items = query.order_by(None).count()
+    elif total_mode == 'cached':
+        total_items = cached_count(query, ('devices',) + filters_key)
+
+    sentinel = NULL_SORT_SENTINELS.get(sort_by)
+    sort_key = func.coalesce(sort_column, sentinel) if sentinel is not None else sort_column
+    is_datetime = isinstance(sort_column.type, db.DateTime)
+
+    # El valor de ordenación se selecciona sin formatear para construir los cursores
+    query, converters = tuple_query(query, DEVICE_COLUMNS, sort_column.label('sort_value'))
+    devices, has_next, has_prev = keyset_paginate(
+        query, sort_key, Device.id,
+        descending=(order != 'asc'),
+        per_page=per_page,
+        cursor=cursor,
+        parse_value=datetime.fromisoformat if is_datetime else None
+    )
+
+    def cursor_for(device, direction):
+        value = device.sort_value
+        if value is None:
+            value = sentinel
+        return encode_cursor({'v': value, 'id': device.id, 'd': direction, 's': sort_by, 'o': order})
+
+    rows = convert_rows(devices, DEVICE_COLUMNS, converters)
+    response = {
+        **serialize_rows(rows, DEVICE_COLUMNS, shape),
+        'pagination': {
+            'per_page': per_page,
+            'has_next': has_next,
+            'has_prev': has_prev,
+            'next_cursor': cursor_for(devices[-1], 'next') if devices and has_next else None,
+            'prev_cursor': cursor_for(devices[0], 'prev') if devices and has_prev else None,
+            'total_items': total_items,
+            'total_is_estimate': total_mode == 'cached'
+        }
+    }
+    return json_response(response)
 
 # --- [NUEVO] ---
+# Tamaño máximo de cada lote de /api/devices/changes
+DEVICE_CHANGES_MAX_LIMIT = 5000
+
+@bp.route('/devices/changes', methods=['GET'])
+@conditional_get('devices')
+def get_device_changes():
+    """
+    Sincronización incremental: devuelve los dispositivos creados o modificados y los
+    eliminados (tombstones) desde la secuencia 'since'. Ej: /api/devices/changes?since=1520
+    Con since=0 se obtiene la tabla completa. Se repite con 'next_since' mientras has_more.
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), DEVICE_CHANGES_MAX_LIMIT)
+
+    current_seq = get_sequence('device_changes')
+    if current_seq is None:
+        return jsonify({'error': 'La sincronización incremental requiere SQLite con el esquema actualizado (flask db upgrade).'}), 501
+
+    # Si se purgaron tombstones posteriores a 'since', el cliente debe empezar desde cero
+    pruned_seq = get_sequence('device_tombstones_pruned') or 0
+    if 0 < since < pruned_seq:
+        return jsonify({
+            'resync_required': True,
+            'message': 'La secuencia solicitada es demasiado antigua. Vuelva a sincronizar con since=0.'
+        }), 410
+
+    devices, tombstones, next_since, has_more = devices_changed_since(since, limit)
+    return jsonify({
+        'since': since,
+        'next_since': next_since,
+        'current_seq': current_seq,
+        'has_more': has_more,
+        'devices': [device.to_dict() for device in devices],
+        'deleted': [tombstone.to_dict() for tombstone in tombstones]
+    })
+
 @bp.route('/devices/<int:device_id>', methods=['GET'])
 def get_device_detail(device_id):
     """Endpoint para obtener los detalles de un único dispositivo."""
@@ -152,6 +375,14 @@ def get_device_detail(device_id):
     return jsonify(device.to_dict())
 # --- [FIN NUEVO] ---
 
+@bp.route('/devices/<int:device_id>/activity', methods=['GET'])
+def get_device_activity(device_id):
+    """Mapa de calor de actividad (día de la semana x hora) de un dispositivo."""
+    if not db.session.get(Device, device_id):
+        return jsonify({'error': 'Dispositivo no encontrado'}), 404
+    days = max(1, min(request.args.get('days', 28, type=int), 365))
+    return jsonify(activity_heatmap(device_id, days))
+
 @bp.route('/config', methods=['GET'])
 def get_config():
     settings = ApplicationConfig.get_settings()
@@ -233,7 +464,58 @@ def update_config():
             settings.scan_interval_seconds = interval
         except (ValueError, TypeError):
             return jsonify({'error': 'El intervalo de escaneo debe ser un número entero.'}), 400
-    
+
+    if 'inactive_threshold_minutes' in data:
+        new_value = data['inactive_threshold_minutes']
+        try:
+            minutes = int(new_value)
+            if minutes < 1:
+                return jsonify({'error': 'El umbral de inactividad no puede ser menor a 1 minuto.'}), 400
+            if minutes != old_values['inactive_threshold_minutes']:
+                changes_detected.append(f"Umbral de inactividad cambiado de '{old_values['inactive_threshold_minutes']}' a '{minutes}' minutos")
+            settings.inactive_threshold_minutes = minutes
+        except (ValueError, TypeError):
+            return jsonify({'error': 'El umbral de inactividad debe ser un número entero.'}), 400
+
+    if 'dhcp_pool_ranges' in data:
+        new_value = (data['dhcp_pool_ranges'] or '').strip()
+        try:
+            parse_pool_ranges(new_value)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if new_value != old_values['dhcp_pool_ranges']:
+            changes_detected.append("Rangos de los pools DHCP modificados")
+        settings.dhcp_pool_ranges = new_value
+
+    if 'pool_release_threshold_percent' in data:
+        new_value = data['pool_release_threshold_percent']
+        try:
+            percent = int(new_value)
+            if not 0 <= percent <= 100:
+                return jsonify({'error': 'El umbral de ocupación del pool debe estar entre 0 y 100.'}), 400
+            if percent != old_values['pool_release_threshold_percent']:
+                changes_detected.append(f"Umbral de ocupación del pool cambiado de '{old_values['pool_release_threshold_percent']}' a '{percent}' %")
+            settings.pool_release_threshold_percent = percent
+        except (ValueError, TypeError):
+            return jsonify({'error': 'El umbral de ocupación del pool debe ser un número entero.'}), 400
+
+    budget_fields = {
+        'release_budget_per_cycle': ('Liberaciones máximas por ciclo', 'por ciclo'),
+        'release_budget_per_interface': ('Liberaciones máximas por minuto e interfaz', 'por minuto'),
+    }
+    for key, (name, unit) in budget_fields.items():
+        if key not in data:
+            continue
+        try:
+            limit = int(data[key])
+        except (ValueError, TypeError):
+            return jsonify({'error': f'{name}: debe ser un número entero.'}), 400
+        if limit < 0:
+            return jsonify({'error': f'{name}: no puede ser negativo (0 = sin límite).'}), 400
+        if limit != old_values[key]:
+            changes_detected.append(f"{name} cambiado de '{old_values[key]}' a '{limit}' {unit}")
+        setattr(settings, key, limit)
+
     # --- Registrar los cambios si existen ---
     if changes_detected:
         log_message = f"Configuración actualizada por '{current_user.username}': {'; '.join(changes_detected)}."
@@ -245,11 +527,15 @@ def update_config():
 @bp.route('/database/clear', methods=['POST'])
 def clear_database():
     try:
+        db.session.query(DeviceSighting).delete()
         num_devices_deleted = db.session.query(Device).delete()
         num_logs_deleted = db.session.query(LogEntry).delete()
-        num_stats_deleted = db.session.query(HistoricalStat).delete()
+        num_stats_deleted = db.session.query(HourlyStat).delete()
+        db.session.query(PoolStat).delete()
+        db.session.query(IpConflict).delete()
         
         log_event(f"El usuario '{current_user.username}' ha limpiado la base de datos. Se eliminaron {num_devices_deleted} dispositivos, {num_logs_deleted} logs y {num_stats_deleted} registros de estadísticas.", "WARNING")
+        publish_change('reset', {'user': current_user.username})
         
         db.session.commit()
         
@@ -266,6 +552,16 @@ def release_device_ip(device_id):
     device = db.session.get(Device, device_id)
     if not device: return jsonify({'error': 'Dispositivo no encontrado'}), 404
     
+    # Con la IP en conflicto o ya en manos de otra MAC, el DHCPRELEASE podría afectar a otro
+    # cliente: hay que confirmarlo con {"force": true}
+    reason = release_conflict(device)
+    data = request.get_json(silent=True) or {}
+    if reason and data.get('force') is not True:
+        return jsonify({'error': f'No se libera la IP {device.ip_address}: {reason}. Envíe {{"force": true}} para liberarla igualmente.',
+                        'conflict': reason}), 409
+    if reason:
+        log_event(f"Liberación manual forzada de {device.ip_address} (MAC: {device.mac_address}) por '{current_user.username}' pese a: {reason}.", 'WARNING')
+
     config = ApplicationConfig.get_settings()
     
     success, was_dry_run = perform_dhcp_release(
@@ -276,25 +572,14 @@ def release_device_ip(device_id):
         dry_run_enabled=config.dry_run_enabled
     )
     
+    release_attempts_total.inc(type='manual', result='failed' if not success else 'dry_run' if was_dry_run else 'released')
     if success:
         if not was_dry_run:
             device.status = 'released'
             log_event(f"Liberada manualmente la IP {device.ip_address} (MAC: {device.mac_address}) por '{current_user.username}'.", 'INFO')
             
-            today = date_obj.today()
-            stat_entry = db.session.get(HistoricalStat, today)
-            if not stat_entry:
-                stat_entry = HistoricalStat(
-                    date=today,
-                    releases_manual=0,
-                    releases_inactivity=0,
-                    releases_mac_list=0,
-                    active_devices_peak=0,
-                    total_devices_snapshot=0
-                )
-                db.session.add(stat_entry)
-            
-            stat_entry.releases_manual = (stat_entry.releases_manual or 0) + 1
+            record_release('manual')
+            publish_change('release', {'type': 'manual', 'result': 'released', 'device': device_summary(device)})
             
             db.session.commit()
             message = f'Solicitud de liberación para {device.ip_address} enviada correctamente.'
@@ -304,9 +589,210 @@ def release_device_ip(device_id):
         return jsonify({'message': message, 'device': device.to_dict()})
     else:
         log_event(f"Falló el intento de liberación manual para la IP {device.ip_address}", 'ERROR')
+        publish_change('release', {'type': 'manual', 'result': 'failed', 'device': device_summary(device)})
         db.session.commit()
         return jsonify({'error': 'Falló el envío del paquete DHCPRELEASE.'}), 500
 
+@bp.route('/subnets', methods=['GET'])
+def get_subnet_summary():
+    """
+    Resumen de dispositivos por subred dentro de una red dada (por defecto, la subred de
+    escaneo configurada). Ej: /api/subnets?cidr=10.0.0.0/16&prefix=24
+    """
+    cidr = request.args.get('cidr') or ApplicationConfig.get_settings().scan_subnet
+    prefix = request.args.get('prefix', 24, type=int)
+    try:
+        network = ipaddress.IPv4Network(cidr, strict=False)
+    except ValueError:
+        return jsonify({'error': f"Formato de subred inválido: '{cidr}'. Use notación CIDR, ej: 192.168.1.0/24."}), 400
+    if not network.prefixlen <= prefix <= 32:
+        return jsonify({'error': f'El prefijo debe estar entre {network.prefixlen} y 32.'}), 400
+
+    # Desplazar ip_int agrupa las IPs por subred sin salir del rango del índice
+    subnet_key = Device.ip_int.op('>>')(32 - prefix)
+    rows = db.session.query(
+        subnet_key.label('subnet'),
+        func.count(Device.id),
+        func.sum(case((Device.status == 'active', 1), else_=0)),
+        func.sum(case((Device.status == 'released', 1), else_=0)),
+        func.sum(case((Device.is_excluded == True, 1), else_=0))
+    ).filter(Device.in_network(network)).group_by(subnet_key).order_by(subnet_key).all()
+
+    subnets = [{
+        'cidr': f"{ipaddress.IPv4Address(subnet << (32 - prefix))}/{prefix}",
+        'total_devices': total,
+        'active_devices': active or 0,
+        'released_ips': released or 0,
+        'excluded_devices': excluded or 0
+    } for subnet, total, active, released, excluded in rows]
+
+    return jsonify({'cidr': str(network), 'prefix': prefix, 'subnets': subnets})
+
+# Subred más amplia que se puede liberar en una petición (/22 = 1022 direcciones)
+SUBNET_RELEASE_MIN_PREFIX = 22
+
+@bp.route('/subnets/release', methods=['POST'])
+def release_subnet():
+    """
+    Libera las IPs de los dispositivos no excluidos (y no liberados ya) de una subred de
+    /22 o menor. Se omiten los de IPs en conflicto o que ya usa otra MAC. Como en el worker,
+    se liberan primero los que llevan más tiempo sin verse y dentro del presupuesto de
+    liberaciones configurado; los que no caben se indican en 'deferred' para otra petición.
+    Cuerpo: {"cidr": "192.168.1.0/26"}
+    """
+    data = request.get_json()
+    if not data or 'cidr' not in data:
+        return jsonify({'error': 'Cuerpo de la solicitud inválido. Se esperaba {"cidr": "x.x.x.x/n"}'}), 400
+    try:
+        network = ipaddress.IPv4Network(data['cidr'], strict=False)
+    except ValueError:
+        return jsonify({'error': f"Formato de subred inválido: '{data['cidr']}'. Use notación CIDR, ej: 192.168.1.0/24."}), 400
+    if network.prefixlen < SUBNET_RELEASE_MIN_PREFIX:
+        return jsonify({'error': f'La subred es demasiado amplia: el prefijo mínimo es /{SUBNET_RELEASE_MIN_PREFIX}.'}), 400
+
+    # Los excluidos también cuentan para saber qué MAC usa ahora cada IP
+    candidates = Device.query.filter(
+        Device.in_network(network),
+        Device.status != 'released'
+    ).all()
+    blocked = blocked_releases(candidates)
+
+    config = ApplicationConfig.get_settings()
+    queue = ReleaseQueue()
+    conflicts = 0
+    for device in candidates:
+        if device.is_excluded:
+            continue
+        if device.id in blocked:
+            conflicts += 1
+            release_attempts_total.inc(type='subnet', result='conflict')
+            continue
+        queue.push(device, 'subnet')
+
+    budget = ReleaseBudget(config.network_interface, config.release_budget_per_cycle,
+                           config.release_budget_per_interface)
+    released, failed, simulated = 0, 0, 0
+    while queue and budget.allows():
+        device, _, _ = queue.pop()
+        success, was_dry_run = perform_dhcp_release(
+            target_ip=device.ip_address,
+            target_mac=device.mac_address,
+            dhcp_server_ip=config.dhcp_server_ip,
+            interface=config.network_interface,
+            dry_run_enabled=config.dry_run_enabled
+        )
+        budget.consume()
+        release_attempts_total.inc(type='subnet', result='failed' if not success else 'dry_run' if was_dry_run else 'released')
+        if not success:
+            failed += 1
+        elif was_dry_run:
+            simulated += 1
+        else:
+            device.status = 'released'
+            released += 1
+            publish_change('release', {'type': 'manual', 'result': 'released', 'device': device_summary(device)})
+    deferred = len(queue)
+    if deferred:
+        release_attempts_total.inc(deferred, type='subnet', result='deferred')
+
+    if released:
+        record_release('manual', released)
+    log_event(f"Liberación de la subred {network} solicitada por '{current_user.username}': {released} liberadas, {failed} fallidas, {simulated} simuladas, {conflicts} omitidas por conflicto, {deferred} aplazadas por el presupuesto.", 'INFO' if not failed else 'WARNING')
+    db.session.commit()
+
+    return jsonify({
+        'message': f'Liberación de la subred {network} completada.' if not deferred else
+                   f'Liberación de la subred {network} parcial: {deferred} dispositivo(s) superan el presupuesto de liberaciones; repita la petición más tarde.',
+        'cidr': str(network),
+        'released': released,
+        'failed': failed,
+        'simulated': simulated,
+        'conflicts': conflicts,
+        'deferred': deferred
+    })
+
+POOL_TOP_FREE_BLOCKS = 5
+
+@bp.route('/pools', methods=['GET'])
+def get_pools():
+    """
+    Ocupación de cada pool DHCP configurado (o de la subred de escaneo si no hay ninguno),
+    con la previsión de agotamiento según la tendencia de los últimos días y los mayores
+    bloques de direcciones libres.
+    """
+    config = ApplicationConfig.get_settings()
+    index = get_pool_index(config)
+    threshold = config.pool_release_threshold_percent
+    pools = []
+    for position, pool in enumerate(index.pools):
+        blocks = sorted(pool.free_blocks(), key=lambda block: block[2], reverse=True)[:POOL_TOP_FREE_BLOCKS]
+        pools.append({
+            'index': position,
+            **pool.to_dict(),
+            'above_threshold': bool(threshold) and pool.utilization() * 100 >= threshold,
+            'forecast': forecast_exhaustion(pool),
+            'largest_free_blocks': [{'first': first, 'last': last, 'size': size} for first, last, size in blocks]
+        })
+    return jsonify({'release_threshold_percent': threshold, 'pools': pools})
+
+@bp.route('/pools/<int:pool_index>/free', methods=['GET'])
+def get_pool_free_blocks(pool_index):
+    """
+    Bloques de direcciones libres de un pool, en orden de dirección.
+    Ej: /api/pools/0/free?min_size=16&limit=50
+    """
+    pools = get_pool_index(ApplicationConfig.get_settings()).pools
+    if not 0 <= pool_index < len(pools):
+        return jsonify({'error': 'Pool no encontrado.'}), 404
+    pool = pools[pool_index]
+    min_size = max(request.args.get('min_size', 1, type=int), 1)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    blocks = pool.free_blocks(min_size=min_size, limit=limit)
+    return jsonify({
+        'pool': pool.name,
+        'min_size': min_size,
+        'blocks': [{'first': first, 'last': last, 'size': size} for first, last, size in blocks]
+    })
+
+CONFLICT_KINDS = ('duplicate', 'flapping')
+
+@bp.route('/conflicts', methods=['GET'])
+def get_conflicts():
+    """
+    Conflictos de IP detectados por el worker (IPs duplicadas y MACs que cambian sin parar),
+    del más reciente al más antiguo. Ej: /api/conflicts?status=open&kind=duplicate&limit=100
+    """
+    status = request.args.get('status', 'open')
+    kind = request.args.get('kind', '')
+    if status not in ('open', 'resolved', 'all'):
+        return jsonify({'error': "Estado inválido. Use 'open', 'resolved' o 'all'."}), 400
+    if kind and kind not in CONFLICT_KINDS:
+        return jsonify({'error': f"Tipo inválido. Use uno de: {', '.join(CONFLICT_KINDS)}."}), 400
+    limit = min(max(request.args.get('limit', 200, type=int), 1), 1000)
+
+    query = IpConflict.query
+    if status == 'open':
+        query = query.filter(IpConflict.resolved_at.is_(None))
+    elif status == 'resolved':
+        query = query.filter(IpConflict.resolved_at.isnot(None))
+    if kind:
+        query = query.filter(IpConflict.kind == kind)
+    conflicts = query.order_by(IpConflict.last_detected.desc()).limit(limit).all()
+    return jsonify({'status': status, 'conflicts': [conflict.to_dict() for conflict in conflicts]})
+
+@bp.route('/conflicts/<int:conflict_id>/resolve', methods=['POST'])
+def resolve_conflict(conflict_id):
+    """Da por resuelto un conflicto a mano (ej: tras retirar el equipo con la IP fija)."""
+    conflict = db.session.get(IpConflict, conflict_id)
+    if not conflict:
+        return jsonify({'error': 'Conflicto no encontrado'}), 404
+    if conflict.resolved_at is None:
+        conflict.resolved_at = datetime.now(UTC)
+        log_event(f"Conflicto de IP en {conflict.ip_address} ({conflict.kind}) marcado como resuelto por '{current_user.username}'.", 'INFO')
+        publish_change('conflict', conflict.to_dict())
+        db.session.commit()
+    return jsonify({'message': 'Conflicto marcado como resuelto.', 'conflict': conflict.to_dict()})
+
 @bp.route('/devices/<int:device_id>/ping', methods=['POST'])
 def ping_device(device_id):
     device = db.session.get(Device, device_id)
@@ -333,17 +819,34 @@ def toggle_device_exclusion(device_id):
     
     action = "marcado como excluido" if new_state else "desmarcado como excluido"
     log_event(f"Dispositivo {device.mac_address} ({device.ip_address}) {action} por '{current_user.username}'.", 'INFO')
+    publish_change('devices', {'source': 'api', 'new': 0, 'devices': [device_summary(device)]})
     
     db.session.commit()
     
     return jsonify({'message': f'Dispositivo {action} correctamente.', 'device': device.to_dict()})
 
 @bp.route('/logs', methods=['GET'])
+@conditional_get('logs')
 def get_logs():
     limit = request.args.get('limit', 200, type=int)
     event_type = request.args.get('event_type', 'all') 
+    search_text = request.args.get('q', '').strip()
+
+    query = _filter_logs(LogEntry.query, event_type, search_text)
+
+    query, converters = tuple_query(query, LOG_COLUMNS)
+    rows = convert_rows(query.order_by(LogEntry.timestamp.desc()).limit(limit).all(), LOG_COLUMNS, converters)
 
-    query = LogEntry.query
+    # Por compatibilidad la forma clásica es una lista; 'shape=columns' usa el formato compacto
+    if request.args.get('shape') == 'columns':
+        return json_response(serialize_rows(rows, LOG_COLUMNS, 'columns'))
+    return json_response(serialize_rows(rows, LOG_COLUMNS)['items'])
+
+def _filter_logs(query, event_type, search_text):
+    """Aplica los filtros de la lista de logs (tipo de evento y búsqueda de texto)."""
+    # Búsqueda de texto completo: con 'q' los resultados se ordenan por relevancia
+    if search_text:
+        query = filter_logs_by_text(query, search_text)
 
     if event_type == 'user_action':
         query = query.filter(or_(
@@ -361,7 +864,140 @@ def get_logs():
         query = query.filter(LogEntry.level == 'ERROR')
     elif event_type == 'dry_run':
         query = query.filter(LogEntry.message.ilike('%[DRY RUN]%'))
+    return query
+
+# --- EXPORTACIÓN ---
+
+def _export_options():
+    """Lee el formato y la compresión de una petición de exportación."""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return None, None
+    compress = request.args.get('compress') == 'gzip'
+    return export_format, compress
+
+@bp.route('/export/devices', methods=['GET'])
+def export_devices():
+    """
+    Exporta en streaming todos los dispositivos que cumplen los filtros de /api/devices
+    ('search', 'cidr'). Ej: /api/export/devices?format=ndjson&compress=gzip
+    """
+    export_format, compress = _export_options()
+    if not export_format:
+        return jsonify({'error': f"Formato no soportado. Valores permitidos: {', '.join(EXPORT_FORMATS)}."}), 400
+
+    cidr = request.args.get('cidr', '').strip()
+    try:
+        query = _filter_devices(Device.query, request.args.get('search', ''), cidr)
+    except ValueError:
+        return jsonify({'error': f"Formato de subred inválido: '{cidr}'. Use notación CIDR, ej: 192.168.1.0/24."}), 400
+
+    query = query.order_by(None).order_by(Device.id)
+    return export_response(query, DEVICE_EXPORT_COLUMNS, export_format, 'dispositivos', compress)
 
-    logs = query.order_by(LogEntry.timestamp.desc()).limit(limit).all()
-    logs_list = [log.to_dict() for log in logs]
-    return jsonify(logs_list)
+@bp.route('/export/logs', methods=['GET'])
+def export_logs():
+    """
+    Exporta en streaming los logs que cumplen los filtros de /api/logs ('event_type', 'q'),
+    en orden cronológico. 'limit' es opcional (por defecto, todos) y, como en /api/logs,
+    se queda con los N más recientes.
+    """
+    export_format, compress = _export_options()
+    if not export_format:
+        return jsonify({'error': f"Formato no soportado. Valores permitidos: {', '.join(EXPORT_FORMATS)}."}), 400
+
+    query = _filter_logs(LogEntry.query, request.args.get('event_type', 'all'), request.args.get('q', '').strip())
+    query = query.order_by(None)
+
+    limit = request.args.get('limit', type=int)
+    if limit and limit > 0:
+        # Id del N-ésimo log más reciente: desde él se exporta en orden ascendente sin
+        # dejar de hacerlo en streaming
+        cutoff = query.with_entities(LogEntry.id).order_by(LogEntry.id.desc()).offset(limit - 1).limit(1).scalar()
+        if cutoff is not None:
+            query = query.filter(LogEntry.id >= cutoff)
+    query = query.order_by(LogEntry.id)
+    return export_response(query, LOG_EXPORT_COLUMNS, export_format, 'logs', compress)
+
+# --- DIAGNÓSTICO DEL WORKER ---
+
+MAX_PROFILED_CYCLES = 20
+JOB_NAME_PATTERN = re.compile(r'^[a-z_]+$')
+
+def _summarize_cycles(cycles):
+    """Media y máximo por tarea, con el tiempo medio de cada fase por ciclo."""
+    summary = {}
+    for cycle in cycles:
+        job = summary.setdefault(cycle['job'], {'cycles': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'phases': {}})
+        job['cycles'] += 1
+        job['errors'] += 1 if cycle.get('error') else 0
+        job['total_seconds'] += cycle['seconds']
+        job['max_seconds'] = max(job['max_seconds'], cycle['seconds'])
+        for phase, values in cycle['breakdown'].items():
+            job['phases'][phase] = job['phases'].get(phase, 0.0) + values['seconds']
+
+    for job in summary.values():
+        count = job['cycles']
+        job['avg_seconds'] = round(job.pop('total_seconds') / count, 6)
+        job['phases'] = {
+            phase: round(seconds / count, 6)
+            for phase, seconds in sorted(job['phases'].items(), key=lambda item: -item[1])
+        }
+    return summary
+
+@bp.route('/diagnostics/cycles', methods=['GET'])
+def get_worker_cycles():
+    """
+    Últimos ciclos del worker con el desglose de tiempo por fase ('db' = consultas), y un
+    resumen por tarea. Filtros opcionales: 'job' y 'limit'.
+    """
+    directory = current_app.config['DIAGNOSTICS_DIR']
+    job = request.args.get('job') or None
+    limit = request.args.get('limit', 50, type=int)
+    cycles = read_cycles(directory, job=job)
+    return jsonify({
+        'summary': _summarize_cycles(cycles),
+        'cycles': cycles[:max(limit, 0)],
+        'profile_request': pending_profile(directory),
+        'profiles': list_profiles(directory),
+    })
+
+@bp.route('/diagnostics/profile', methods=['POST'])
+def request_worker_profile():
+    """
+    Pide al worker que perfile con cProfile sus próximos ciclos.
+    Cuerpo: {"cycles": 3, "job": "nmap_scan"} ('job' opcional: cualquier tarea).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        cycles = int(data.get('cycles', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': "'cycles' debe ser un número entero."}), 400
+    if not 1 <= cycles <= MAX_PROFILED_CYCLES:
+        return jsonify({'error': f"'cycles' debe estar entre 1 y {MAX_PROFILED_CYCLES}."}), 400
+    job = data.get('job') or None
+    if job is not None and not JOB_NAME_PATTERN.match(str(job)):
+        return jsonify({'error': f"Nombre de tarea inválido: '{job}'."}), 400
+
+    profile = request_profile(current_app.config['DIAGNOSTICS_DIR'], cycles, job)
+    log_event(f"El usuario '{current_user.username}' ha pedido perfilar {cycles} ciclo(s) del worker ({job or 'cualquier tarea'}).", 'INFO')
+    db.session.commit()
+    return jsonify(profile), 202
+
+@bp.route('/diagnostics/profiles/<name>', methods=['GET'])
+def get_worker_profile(name):
+    """
+    Resumen de un perfil guardado (funciones más costosas). Con '?format=raw' se descarga
+    el fichero .prof para abrirlo con pstats, snakeviz, etc.
+    """
+    directory = current_app.config['DIAGNOSTICS_DIR']
+    if name not in list_profiles(directory):
+        return jsonify({'error': 'Perfil no encontrado.'}), 404
+    path = os.path.join(directory, name)
+    if request.args.get('format') == 'raw':
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=name)
+
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'calls'):
+        return jsonify({'error': "Orden no soportado. Valores permitidos: cumulative, tottime, calls."}), 400
+    return Response(profile_summary(path, sort=sort), mimetype='text/plain')
@@ -1,17 +1,17 @@
 # app/scanner/core.py
 
-import nmap
 import sys
+import time
 import subprocess
-from scapy.all import *
 from datetime import datetime, UTC 
 
 from app import db
 from app.models import Device, ApplicationConfig, LogEntry
-
-# Silenciar las advertencias de Scapy sobre IPv6
-import logging
-logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
+from app.changes import publish_change, device_summary
+from app.sightings import record_sighting
+from app.stats import record_new_devices
+from app.metrics import nmap_scans_total, nmap_hosts_found, ping_probe_seconds
+from app.scanner import net
 
 def log_event(message, level='INFO'):
     """
@@ -28,6 +28,7 @@ def is_host_alive(ip_address):
     Usa ping -c 1 -W 1 para enviar un solo paquete y esperar 1 segundo.
     Devuelve True si el host responde, False en caso contrario.
     """
+    started = time.perf_counter()
     try:
         # El comando de ping varía ligeramente entre sistemas operativos.
         # Este formato es para Linux/macOS.
@@ -37,27 +38,26 @@ def is_host_alive(ip_address):
         result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         
         # El código de retorno 0 indica éxito.
-        return result.returncode == 0
+        alive = result.returncode == 0
+        ping_probe_seconds.observe(time.perf_counter() - started, result='up' if alive else 'down')
+        return alive
     except Exception as e:
+        ping_probe_seconds.observe(time.perf_counter() - started, result='error')
         print(f"[ERROR] Excepción al ejecutar ping a {ip_address}: {e}")
         return False
 
 
-def discover_hosts(network_range):
+def scan_hosts(network_range):
     """
-    Usa Nmap para descubrir hosts activos y sus detalles.
+    Ejecuta el escaneo ARP de Nmap y devuelve los hosts con MAC como lista de
+    {'ip', 'mac', 'vendor'}. No toca la base de datos (lo usa también el sensor remoto);
+    los errores de Nmap se propagan.
     """
-    print(f"[*] Iniciando escaneo de red en {network_range}...")
-    nm = nmap.PortScanner()
-    hosts_list = []
-    try:
-        scan_args = '-sn -PR' 
-        nm.scan(hosts=network_range, arguments=scan_args)
-    except Exception as e:
-        log_event(f"Error inesperado durante el escaneo de Nmap: {e}", 'ERROR')
-        db.session.commit()
-        return []
+    nm = net.nmap().PortScanner()
+    scan_args = '-sn -PR' 
+    nm.scan(hosts=network_range, arguments=scan_args)
 
+    hosts_list = []
     for host_ip in nm.all_hosts():
         if 'mac' in nm[host_ip]['addresses']:
             mac_address = nm[host_ip]['addresses']['mac'].upper()
@@ -68,10 +68,60 @@ def discover_hosts(network_range):
                 'mac': mac_address,
                 'vendor': vendor
             })
-            
+    return hosts_list
+
+def discover_hosts(network_range):
+    """
+    Usa Nmap para descubrir hosts activos y sus detalles.
+    """
+    print(f"[*] Iniciando escaneo de red en {network_range}...")
+    try:
+        hosts_list = scan_hosts(network_range)
+    except Exception as e:
+        nmap_scans_total.inc(result='error')
+        log_event(f"Error inesperado durante el escaneo de Nmap: {e}", 'ERROR')
+        db.session.commit()
+        return []
+
+    nmap_scans_total.inc(result='ok')
+    nmap_hosts_found.set(len(hosts_list))
+
     print(f"[OK] Escaneo completado. Se encontraron {len(hosts_list)} hosts activos.")
     return hosts_list
 
+# Tipos de mensaje DHCP (opción 53)
+DHCP_MESSAGE_TYPES = {1: 'DISCOVER', 2: 'OFFER', 3: 'REQUEST', 4: 'DECLINE', 5: 'ACK', 6: 'NAK', 7: 'RELEASE'}
+# Solo OFFER(2), REQUEST(3) y ACK(5) informan de qué IP tiene (o tendrá) un cliente
+DHCP_LEASE_MESSAGE_TYPES = (2, 3, 5)
+
+def parse_dhcp_packet(packet):
+    """
+    Extrae de un paquete DHCP capturado por Scapy un diccionario con 'message_type',
+    'mac', 'ip' ('0.0.0.0' si no se puede determinar) y 'lease_seconds'.
+    Devuelve None si el paquete no es DHCP.
+    """
+    scapy = net.scapy()
+    DHCP, BOOTP = scapy.DHCP, scapy.BOOTP
+    if not packet.haslayer(DHCP):
+        return None
+
+    dhcp_options = {opt[0]: opt[1] for opt in packet[DHCP].options if isinstance(opt, tuple)}
+
+    client_ip = '0.0.0.0'
+    if packet[BOOTP].yiaddr != '0.0.0.0':         # Prioridad 1: IP asignada en OFFER/ACK
+        client_ip = packet[BOOTP].yiaddr
+    elif packet[BOOTP].ciaddr != '0.0.0.0':       # Prioridad 2: IP del cliente en RENEW
+        client_ip = packet[BOOTP].ciaddr
+    elif 'requested_addr' in dhcp_options:        # Prioridad 3: IP solicitada en REQUEST inicial
+        client_ip = dhcp_options['requested_addr']
+
+    return {
+        'message_type': dhcp_options.get('message-type'),
+        'mac': packet[BOOTP].chaddr[:6].hex(':').upper(),
+        'ip': client_ip,
+        'lease_seconds': dhcp_options.get('lease_time')
+    }
+
 def sync_devices_db(discovered_hosts):
     """
     Sincroniza la lista de hosts descubiertos con la base de datos de forma atómica
@@ -86,6 +136,8 @@ def sync_devices_db(discovered_hosts):
     
     processed_macs_in_scan = {host['mac']: host for host in discovered_hosts}
     all_db_devices_map = {device.mac_address: device for device in Device.query.all()}
+    seen_devices = []
+    new_devices_count = 0
     
     try:
         for mac, host in processed_macs_in_scan.items():
@@ -100,6 +152,7 @@ def sync_devices_db(discovered_hosts):
                 device.last_seen = current_time
                 device.status = 'active'
                 device.last_seen_by = 'nmap' # <-- ACTUALIZADO
+                seen_devices.append(device)
             else:
                 # Nuevo dispositivo
                 new_device = Device(
@@ -112,9 +165,19 @@ def sync_devices_db(discovered_hosts):
                     last_seen_by='nmap' # <-- ACTUALIZADO
                 )
                 db.session.add(new_device)
+                seen_devices.append(new_device)
+                new_devices_count += 1
                 log_event(f"Nuevo dispositivo descubierto (Nmap): IP {ip}, MAC {mac}")
         
+        record_new_devices(new_devices_count)
+        # flush() asigna id a los dispositivos nuevos antes de publicar el cambio
+        db.session.flush()
+        publish_change('devices', {'source': 'nmap', 'new': new_devices_count, 'devices': [device_summary(d) for d in seen_devices]})
         db.session.commit()
+
+        # Historial de presencia (los nuevos dispositivos ya tienen id tras el commit)
+        for device in seen_devices:
+            record_sighting(device.id, current_time)
         print("[OK] Sincronización de la base de datos completada.")
 
     except Exception as e:
@@ -137,19 +200,20 @@ def perform_dhcp_release(target_ip, target_mac, dhcp_server_ip, interface, dry_r
     log_event(f"Intentando liberar la IP {target_ip} (MAC: {target_mac}) en la interfaz {interface}")
     
     try:
-        hw = mac2str(target_mac)
-        conf.L3socket = L3RawSocket
-        conf.checkIPaddr = False
-
-        packet = (Ether(src=target_mac, dst="ff:ff:ff:ff:ff:ff") /
-                  IP(src=target_ip, dst=dhcp_server_ip) /
-                  UDP(sport=68, dport=67) /
-                  BOOTP(chaddr=hw, ciaddr=target_ip) /
-                  DHCP(options=[("message-type", "release"), 
-                                ("server_id", dhcp_server_ip), 
-                                "end"]))
+        scapy = net.scapy()
+        hw = scapy.mac2str(target_mac)
+        scapy.conf.L3socket = scapy.L3RawSocket
+        scapy.conf.checkIPaddr = False
+
+        packet = (scapy.Ether(src=target_mac, dst="ff:ff:ff:ff:ff:ff") /
+                  scapy.IP(src=target_ip, dst=dhcp_server_ip) /
+                  scapy.UDP(sport=68, dport=67) /
+                  scapy.BOOTP(chaddr=hw, ciaddr=target_ip) /
+                  scapy.DHCP(options=[("message-type", "release"), 
+                                      ("server_id", dhcp_server_ip), 
+                                      "end"]))
         
-        sendp(packet, iface=interface, verbose=0)
+        net.sendp(packet, iface=interface, verbose=0)
         
         log_event(f"Paquete DHCPRELEASE enviado para IP {target_ip}", 'INFO')
         db.session.commit()
@@ -0,0 +1,30 @@
+# app/scanner/net.py
+
+import importlib
+import logging
+
+# --- ACCESO PEREZOSO A LAS LIBRERÍAS DE RED ---
+# Scapy tarda casi medio segundo en importarse y ocupa decenas de MB; la web, la CLI de
+# Flask (`flask db upgrade`, `flask shell`) y las ramas del worker que no tocan la red no
+# lo necesitan. Este módulo es el único punto de entrada a Scapy y python-nmap: se
+# importan la primera vez que se usan y quedan en sys.modules como cualquier otro módulo.
+
+
+def scapy():
+    """Devuelve scapy.all, importándolo si aún no se ha usado."""
+    # Silenciar las advertencias de Scapy sobre IPv6 (se emiten al importarlo)
+    logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
+    return importlib.import_module('scapy.all')
+
+
+def nmap():
+    """Devuelve el módulo de python-nmap, importándolo si aún no se ha usado."""
+    return importlib.import_module('nmap')
+
+
+def sniff(**kwargs):
+    return scapy().sniff(**kwargs)
+
+
+def sendp(packet, **kwargs):
+    return scapy().sendp(packet, **kwargs)
@@ -0,0 +1,188 @@
+# app/scheduler.py
+
+import asyncio
+import random
+import signal
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+from app import db
+from app.scanner.core import log_event
+from app.tracing import trace_cycle, mark_error
+
+# --- PLANIFICADOR DE TAREAS DEL WORKER ---
+# Cada tarea tiene su propio bucle asyncio con su cadencia. El trabajo bloqueante (nmap,
+# envío de paquetes, consultas) se ejecuta en pools de hilos separados, de modo que una
+# fase lenta no retrasa a las demás.
+
+
+class Job:
+    """
+    Tarea periódica del worker.
+
+    - interval: segundos entre ejecuciones, o una función que los devuelve (se evalúa tras
+      cada ejecución, así que puede depender de la configuración).
+    - jitter: segundos aleatorios (0..jitter) que se suman a cada espera entre ejecuciones,
+      para que las tareas no coincidan siempre en el mismo instante.
+    - deadline: segundos tras los que se deja de esperar a la ejecución en curso y se avisa.
+      La ejecución sigue en su hilo; mientras no termine no se lanza otra (sin solapamiento).
+    - executor: nombre del pool de hilos en el que se ejecuta.
+    - trace: si cada ejecución se guarda como ciclo en el buffer de trazas (app.tracing).
+    """
+
+    def __init__(self, name, func, interval, jitter=0, deadline=None, executor='default', initial_delay=0, trace=True):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.deadline = deadline
+        self.executor = executor
+        self.initial_delay = initial_delay
+        self.trace = trace
+
+        self.running = False
+        self.wake_event = None
+        self.runs = 0
+        self.failures = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_duration = None
+
+    def next_delay(self):
+        interval = self.interval() if callable(self.interval) else self.interval
+        return max(0.0, interval + random.uniform(0, self.jitter))
+
+
+def _run_job(app, job):
+    """Ejecuta una tarea en su propio contexto de aplicación (y, por tanto, su propia sesión)."""
+    started = time.monotonic()
+    with app.app_context(), (trace_cycle(job.name) if job.trace else nullcontext()):
+        try:
+            job.func()
+        except Exception as e:
+            job.failures += 1
+            mark_error(e)
+            print(f"[!!!] ERROR en la tarea '{job.name}' del worker: {e}")
+            try:
+                db.session.rollback()
+                log_event(f"Error en la tarea '{job.name}' del worker: {e}", 'ERROR')
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+        finally:
+            db.session.remove()
+            job.last_duration = time.monotonic() - started
+            job.running = False
+
+
+# Bucle de eventos y tareas en marcha, para poder despertarlas desde otros hilos
+_scheduler = {'loop': None, 'jobs': {}}
+
+
+def wake_jobs(*names):
+    """
+    Adelanta la próxima ejecución de las tareas indicadas (ej: tras un cambio de
+    configuración). Se puede llamar desde cualquier hilo. Si la tarea está en ejecución,
+    volverá a ejecutarse en cuanto termine.
+    """
+    loop = _scheduler['loop']
+    if loop is None:
+        return
+    for name in names:
+        job = _scheduler['jobs'].get(name)
+        if job is not None and job.wake_event is not None:
+            loop.call_soon_threadsafe(job.wake_event.set)
+
+
+async def _sleep_or_stop(stop_event, seconds, wake_event=None):
+    waiters = [asyncio.ensure_future(stop_event.wait())]
+    if wake_event is not None:
+        waiters.append(asyncio.ensure_future(wake_event.wait()))
+    try:
+        await asyncio.wait(waiters, timeout=seconds, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+    if wake_event is not None:
+        wake_event.clear()
+
+
+async def _job_loop(app, job, executor, stop_event):
+    loop = asyncio.get_running_loop()
+    job.wake_event = asyncio.Event()
+    await _sleep_or_stop(stop_event, job.initial_delay, job.wake_event)
+
+    while not stop_event.is_set():
+        if job.running:
+            job.skipped += 1
+            print(f"[!] La tarea '{job.name}' sigue en ejecución. Se omite esta ejecución.")
+        else:
+            job.running = True
+            job.runs += 1
+            future = loop.run_in_executor(executor, _run_job, app, job)
+            try:
+                # shield: si vence el plazo se deja de esperar, pero la ejecución no se cancela
+                await asyncio.wait_for(asyncio.shield(future), timeout=job.deadline)
+            except asyncio.TimeoutError:
+                job.overruns += 1
+                print(f"[!] La tarea '{job.name}' ha superado su plazo de {job.deadline} s. Sigue en segundo plano.")
+
+        await _sleep_or_stop(stop_event, job.next_delay(), job.wake_event)
+
+
+async def _run(app, jobs, executor_sizes):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass # Windows o hilo secundario: se depende de KeyboardInterrupt
+
+    executors = {
+        name: ThreadPoolExecutor(max_workers=size, thread_name_prefix=f'worker-{name}')
+        for name, size in executor_sizes.items()
+    }
+    _scheduler['loop'] = loop
+    _scheduler['jobs'] = {job.name: job for job in jobs}
+    tasks = [asyncio.create_task(_job_loop(app, job, executors[job.executor], stop_event)) for job in jobs]
+
+    try:
+        await stop_event.wait()
+    finally:
+        _scheduler['loop'] = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        print("[*] Esperando a que terminen las tareas en curso...")
+        for executor in executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def job_metric_families(jobs):
+    """Estadísticas de las tareas para el exportador de métricas (ver app.metrics.add_collector)."""
+    def per_job(attribute):
+        return [({'job': job.name}, getattr(job, attribute)) for job in jobs]
+
+    return [
+        ('job_runs_total', 'counter', 'Ejecuciones de cada tarea del worker.', per_job('runs')),
+        ('job_failures_total', 'counter', 'Ejecuciones terminadas con una excepción.', per_job('failures')),
+        ('job_overruns_total', 'counter', 'Ejecuciones que superaron su plazo.', per_job('overruns')),
+        ('job_skipped_total', 'counter', 'Ejecuciones omitidas porque la anterior seguía en marcha.', per_job('skipped')),
+        ('job_running', 'gauge', 'Tareas en ejecución ahora mismo (1 o 0).', [(labels, int(value)) for labels, value in per_job('running')]),
+        ('job_last_duration_seconds', 'gauge', 'Duración de la última ejecución terminada.',
+         [(labels, value) for labels, value in per_job('last_duration') if value is not None]),
+    ]
+
+
+def run_scheduler(app, jobs, executor_sizes):
+    """
+    Ejecuta las tareas hasta recibir SIGINT/SIGTERM (o Ctrl+C).
+    executor_sizes: {nombre del pool: número de hilos}.
+    """
+    try:
+        asyncio.run(_run(app, jobs, executor_sizes))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,163 @@
+# app/search.py
+
+import re
+import ipaddress
+from sqlalchemy import table, column, literal_column, select, and_, or_, text
+
+from app import db
+from app.models import LogEntry, Device
+
+# Tablas virtuales FTS5 creadas por las migraciones e58c300ea544 y 62a1b1d5df7c. No son
+# modelos: se declaran como tablas ligeras para poder consultarlas desde SQLAlchemy.
+log_entry_fts = table('log_entry_fts', column('rowid'), column('rank'))
+device_search = table('device_search', column('rowid'), column('mac_hex'), column('ip'), column('vendor'))
+
+# Un token para FTS5 (unicode61) es cualquier secuencia de letras o dígitos.
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+# Clasificación de los términos de búsqueda de dispositivos
+_MAC_FRAGMENT_RE = re.compile(r'^[0-9a-fA-F:\-.]+$')
+_MAC_SEPARATORS_RE = re.compile(r'[:\-.]')
+_IP_PREFIX_RE = re.compile(r'^\d{1,3}(\.\d{0,3}){1,3}$')
+
+# El tokenizador trigram necesita al menos 3 caracteres para usar el índice.
+TRIGRAM_MIN_LENGTH = 3
+
+
+def fts_enabled():
+    """Indica si la base de datos soporta el índice FTS5 (solo SQLite)."""
+    return db.engine.dialect.name == 'sqlite'
+
+
+def build_fts_query(search_text):
+    """
+    Traduce el texto introducido por el usuario a una expresión MATCH de FTS5.
+
+    Cada palabra se convierte en una frase con sus tokens, y el último token se busca
+    como prefijo. Así '192.168.1' busca la frase "192 168 1"* (que encuentra 192.168.1.x
+    y 192.168.10.x) y 'aa:bb:cc' busca "aa bb cc"*. Las palabras se combinan con AND.
+    Devuelve None si el texto no contiene nada buscable.
+    """
+    phrases = []
+    for term in search_text.split():
+        tokens = _TOKEN_RE.findall(term)
+        if tokens:
+            phrases.append(f'"{" ".join(tokens)}"*')
+    return ' '.join(phrases) if phrases else None
+
+
+def filter_logs_by_text(query, search_text):
+    """
+    Aplica la búsqueda de texto a una consulta de LogEntry.
+    Con FTS5 los resultados se ordenan por relevancia (bm25); sin FTS5 se recurre a ILIKE.
+    """
+    if not fts_enabled():
+        terms = [LogEntry.message.ilike(f'%{term}%') for term in search_text.split()]
+        return query.filter(and_(*terms))
+
+    match_expr = build_fts_query(search_text)
+    if match_expr is None:
+        return query
+
+    return query.join(log_entry_fts, log_entry_fts.c.rowid == LogEntry.id) \
+                .filter(literal_column('log_entry_fts').op('MATCH')(match_expr)) \
+                .order_by(log_entry_fts.c.rank)
+
+
+def _fts_phrase(value):
+    """Escapa un valor como frase FTS5 entre comillas dobles."""
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _parse_ipv4_network(term):
+    """Devuelve la red IPv4 si el término está en notación CIDR (ej: 10.0.0.0/22), o None."""
+    if '/' not in term:
+        return None
+    try:
+        return ipaddress.IPv4Network(term, strict=False)
+    except ValueError:
+        return None
+
+
+def _device_term_conditions(term):
+    """
+    Clasifica un término de búsqueda (que no sea una red CIDR) y devuelve la lista de
+    alternativas (columna, valor, modo) que lo satisfacen. modo es 'contains' (subcadena) o 'prefix' (inicio de la columna).
+    """
+    if _IP_PREFIX_RE.match(term):
+        return [('ip', term, 'prefix')]
+
+    if _MAC_FRAGMENT_RE.match(term):
+        mac_hex = _MAC_SEPARATORS_RE.sub('', term).lower()
+        if _MAC_SEPARATORS_RE.search(term):
+            # Con separadores es claramente un fragmento de MAC (aa:bb, aa-bb, aabb.ccdd)
+            return [('mac_hex', mac_hex, 'contains')]
+        # Sin separadores puede ser un fragmento de MAC, de IP o parte del fabricante
+        return [('mac_hex', mac_hex, 'contains'), ('ip', term, 'contains'), ('vendor', term, 'contains')]
+
+    return [('vendor', term, 'contains')]
+
+
+def filter_devices_by_text(query, search_text):
+    """
+    Aplica la búsqueda de dispositivos a una consulta de Device usando el índice trigram.
+
+    Cada término se clasifica como red CIDR, prefijo de IP, fragmento de MAC (con o sin
+    separadores) o texto de fabricante. Los términos se combinan con AND. Sin FTS5 se
+    mantiene la búsqueda ILIKE original sobre las tres columnas.
+    """
+    if not fts_enabled():
+        pattern = f"%{search_text}%"
+        return query.filter(or_(Device.ip_address.ilike(pattern), Device.mac_address.ilike(pattern), Device.vendor.ilike(pattern)))
+
+    match_groups = []
+    for term in search_text.replace('"', '').split():
+        # Las redes CIDR se resuelven como rango sobre el índice de ip_int
+        network = _parse_ipv4_network(term)
+        if network is not None:
+            query = query.filter(Device.in_network(network))
+            continue
+
+        alternatives = _device_term_conditions(term)
+        if not alternatives:
+            continue
+
+        if all(len(value) >= TRIGRAM_MIN_LENGTH for _, value, _ in alternatives):
+            match_groups.append(' OR '.join(
+                f"{col} : {'^' if mode == 'prefix' else ''}{_fts_phrase(value)}"
+                for col, value, mode in alternatives
+            ))
+        else:
+            # Términos cortos: el índice no ayuda, se filtra la tabla de búsqueda con LIKE
+            like_conditions = [
+                device_search.c[col].startswith(value, autoescape=True) if mode == 'prefix'
+                else device_search.c[col].contains(value, autoescape=True)
+                for col, value, mode in alternatives
+            ]
+            query = query.filter(Device.id.in_(select(device_search.c.rowid).where(or_(*like_conditions))))
+
+    if match_groups:
+        match_expr = ' AND '.join(f'({group})' for group in match_groups)
+        query = query.filter(Device.id.in_(
+            select(device_search.c.rowid).where(literal_column('device_search').op('MATCH')(match_expr))
+        ))
+    return query
+
+
+def rebuild_device_index():
+    """Reconstruye el índice de búsqueda de dispositivos a partir de la tabla device."""
+    db.session.execute(text("DELETE FROM device_search"))
+    db.session.execute(text(
+        "INSERT INTO device_search(rowid, mac_hex, ip, vendor) "
+        "SELECT id, lower(replace(replace(replace(mac_address, ':', ''), '-', ''), '.', '')), "
+        "ip_address, coalesce(vendor, '') FROM device"
+    ))
+    db.session.execute(text("INSERT INTO device_search(device_search) VALUES ('optimize')"))
+    db.session.commit()
+
+
+def rebuild_log_index():
+    """Reconstruye el índice FTS5 de los logs a partir de la tabla log_entry."""
+    db.session.execute(text("INSERT INTO log_entry_fts(log_entry_fts) VALUES ('rebuild')"))
+    db.session.execute(text("INSERT INTO log_entry_fts(log_entry_fts) VALUES ('optimize')"))
+    db.session.commit()
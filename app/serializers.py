@@ -0,0 +1,93 @@
+# app/serializers.py
+
+import json
+from flask import Response
+from sqlalchemy import func
+
+from app import db
+from app.models import Device, LogEntry, format_datetime_utc
+
+# orjson es opcional: si está instalado se usa para codificar las respuestas grandes
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# --- SERIALIZACIÓN RÁPIDA DE LISTADOS ---
+# Los listados seleccionan solo las columnas necesarias como tuplas (sin objetos ORM) y,
+# en SQLite, las fechas ya salen formateadas de la consulta con strftime(), así que no hay
+# que convertirlas a datetime y de vuelta a texto en Python.
+
+# Mismas claves y orden que Device.to_dict() y LogEntry.to_dict()
+DEVICE_COLUMNS = [
+    Device.id, Device.ip_address, Device.mac_address, Device.vendor, Device.first_seen,
+    Device.last_seen, Device.status, Device.is_excluded, Device.lease_start_time,
+    Device.lease_duration_seconds, Device.last_seen_by, Device.change_seq
+]
+LOG_COLUMNS = [LogEntry.id, LogEntry.timestamp, LogEntry.level, LogEntry.message]
+
+
+def _sqlite_timestamp(column):
+    """
+    Equivalente en SQLite a format_datetime_utc. Los milisegundos se recortan del texto
+    guardado ('YYYY-MM-DD HH:MM:SS.ffffff'), igual que en Python; '%f' de strftime los
+    redondearía. Si el valor no tiene fracción (ej: CURRENT_TIMESTAMP) se usa '.000'.
+    """
+    milliseconds = func.substr(func.substr(column, 21) + '000', 1, 3)
+    return func.strftime('%Y-%m-%dT%H:%M:%S', column).concat('.').concat(milliseconds).concat('Z')
+
+SHAPES = ('objects', 'columns')
+
+
+def tuple_query(query, columns, *extra):
+    """
+    Sustituye las entidades de 'query' por las columnas indicadas (más 'extra', que no se
+    serializan). Devuelve (query, converters): converters tiene, por columna, la función
+    que formatea el valor en Python o None si ya sale formateado de la base de datos.
+    """
+    sqlite = db.session.get_bind().dialect.name == 'sqlite'
+    entities, converters = [], []
+    for column in columns:
+        if isinstance(column.type, db.DateTime):
+            if sqlite:
+                entities.append(_sqlite_timestamp(column).label(column.key))
+                converters.append(None)
+            else:
+                entities.append(column)
+                converters.append(format_datetime_utc)
+        else:
+            entities.append(column)
+            converters.append(None)
+    return query.with_entities(*entities, *extra), converters
+
+
+def convert_rows(rows, columns, converters):
+    """Devuelve las filas como listas con los valores de 'columns' ya formateados."""
+    width = len(columns)
+    if not any(converters):
+        return [list(row[:width]) for row in rows]
+    return [
+        [convert(value) if convert else value for value, convert in zip(row[:width], converters)]
+        for row in rows
+    ]
+
+
+def serialize_rows(rows, columns, shape='objects'):
+    """
+    Devuelve el contenido de 'items' en la forma pedida:
+    - 'objects': lista de diccionarios (formato clásico de la API).
+    - 'columns': {'columns': [nombres], 'items': [[valores], ...]} con los nombres una sola vez.
+    """
+    names = [column.key for column in columns]
+    if shape == 'columns':
+        return {'columns': names, 'items': rows}
+    return {'items': [dict(zip(names, row)) for row in rows]}
+
+
+def json_response(payload, status=200):
+    """Codifica 'payload' como JSON compacto (con orjson si está disponible)."""
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+    return Response(body, status=status, mimetype='application/json')
@@ -0,0 +1,205 @@
+# app/sightings.py
+
+import threading
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import select, update, bindparam
+
+from app import db
+from app.models import DeviceSighting
+
+# --- CONFIGURACIÓN DEL HISTORIAL DE PRESENCIA ---
+SIGHTING_BUCKET_MINUTES = 5     # Resolución de los días recientes
+ROLLUP_BUCKET_MINUTES = 60      # Resolución tras la compactación
+ROLLUP_AFTER_DAYS = 14          # Días que se conservan a resolución completa
+RETENTION_DAYS = 365            # Días que se conserva el historial compactado
+FLUSH_CHUNK_SIZE = 500          # Dispositivos por consulta al volcar los avistamientos
+
+MINUTES_PER_DAY = 24 * 60
+
+# Avistamientos pendientes de guardar: {(device_id, day): bitmap_int}
+# Lo alimentan el sniffer (hilo propio) y los escaneos; el worker lo vuelca en cada ciclo.
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def _bitmap_size(resolution_minutes):
+    """Número de bytes del mapa de bits de un día a la resolución dada."""
+    return (MINUTES_PER_DAY // resolution_minutes + 7) // 8
+
+
+def _bucket_of(moment, resolution_minutes):
+    return (moment.hour * 60 + moment.minute) // resolution_minutes
+
+
+def record_sighting(device_id, seen_at=None):
+    """
+    Anota en memoria que un dispositivo ha sido visto. Es barato (no toca la base de datos):
+    los avistamientos se agregan por intervalo y se guardan con flush_sightings().
+    """
+    if device_id is None:
+        return
+    seen_at = seen_at or datetime.now(UTC)
+    key = (device_id, seen_at.date())
+    bit = 1 << _bucket_of(seen_at, SIGHTING_BUCKET_MINUTES)
+    with _pending_lock:
+        _pending[key] = _pending.get(key, 0) | bit
+
+
+def flush_sightings():
+    """
+    Guarda en la base de datos los avistamientos acumulados en memoria, fusionándolos (OR)
+    con los mapas de bits existentes. Hace commit. Devuelve el número de filas escritas.
+    """
+    global _pending
+    with _pending_lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return 0
+
+    try:
+        by_day = {}
+        for (device_id, day), bits in pending.items():
+            by_day.setdefault(day, {})[device_id] = bits
+
+        # Sin objetos ORM: se leen los mapas existentes como tuplas y se escriben por lotes
+        # (executemany), solo los que cambian. Un avistamiento repetido en el mismo
+        # intervalo no genera escritura.
+        size = _bitmap_size(SIGHTING_BUCKET_MINUTES)
+        table = DeviceSighting.__table__
+        for day, device_bits in by_day.items():
+            device_ids = list(device_bits.keys())
+            existing = {}
+            for start in range(0, len(device_ids), FLUSH_CHUNK_SIZE):
+                chunk = device_ids[start:start + FLUSH_CHUNK_SIZE]
+                existing.update(db.session.execute(
+                    select(table.c.device_id, table.c.bitmap)
+                    .where(table.c.day == day, table.c.device_id.in_(chunk))
+                ).all())
+
+            new_rows, changed_rows = [], []
+            for device_id, bits in device_bits.items():
+                bitmap = existing.get(device_id)
+                if bitmap is None:
+                    new_rows.append({
+                        'device_id': device_id, 'day': day,
+                        'resolution_minutes': SIGHTING_BUCKET_MINUTES,
+                        'bitmap': bits.to_bytes(size, 'little')
+                    })
+                    continue
+                current = int.from_bytes(bitmap, 'little')
+                merged = current | bits
+                if merged != current:
+                    changed_rows.append({'b_device_id': device_id, 'b_day': day, 'bitmap': merged.to_bytes(size, 'little')})
+
+            if new_rows:
+                db.session.execute(table.insert(), new_rows)
+            if changed_rows:
+                db.session.execute(
+                    update(table)
+                    .where(table.c.device_id == bindparam('b_device_id'), table.c.day == bindparam('b_day'))
+                    .values(bitmap=bindparam('bitmap')),
+                    changed_rows
+                )
+
+        db.session.commit()
+        return len(pending)
+    except Exception as e:
+        print(f"[!!!] ERROR al guardar el historial de presencia: {e}")
+        db.session.rollback()
+        # Devuelve los avistamientos al buffer para reintentarlo en el siguiente ciclo
+        with _pending_lock:
+            for key, bits in pending.items():
+                _pending[key] = _pending.get(key, 0) | bits
+        return 0
+
+
+def _downsample(bitmap_int, from_minutes, to_minutes):
+    """Reduce la resolución de un mapa de bits: un intervalo grueso está activo si lo está alguno de los finos."""
+    ratio = to_minutes // from_minutes
+    mask = (1 << ratio) - 1
+    result = 0
+    for coarse in range(MINUTES_PER_DAY // to_minutes):
+        if (bitmap_int >> (coarse * ratio)) & mask:
+            result |= 1 << coarse
+    return result
+
+
+def compact_sightings(today=None):
+    """
+    Mantenimiento del historial: compacta a resolución horaria los días con más de
+    ROLLUP_AFTER_DAYS y borra los que superan RETENTION_DAYS. Hace commit.
+    """
+    today = today or datetime.now(UTC).date()
+    rollup_before = today - timedelta(days=ROLLUP_AFTER_DAYS)
+    delete_before = today - timedelta(days=RETENTION_DAYS)
+    try:
+        deleted = DeviceSighting.query.filter(DeviceSighting.day < delete_before).delete()
+
+        size = _bitmap_size(ROLLUP_BUCKET_MINUTES)
+        rows = DeviceSighting.query.filter(
+            DeviceSighting.day < rollup_before,
+            DeviceSighting.resolution_minutes < ROLLUP_BUCKET_MINUTES
+        ).all()
+        for row in rows:
+            coarse = _downsample(int.from_bytes(row.bitmap, 'little'), row.resolution_minutes, ROLLUP_BUCKET_MINUTES)
+            row.bitmap = coarse.to_bytes(size, 'little')
+            row.resolution_minutes = ROLLUP_BUCKET_MINUTES
+
+        db.session.commit()
+        if rows or deleted:
+            print(f"[OK] Historial de presencia: {len(rows)} día(s) compactados, {deleted} eliminados.")
+    except Exception as e:
+        print(f"[!!!] ERROR al compactar el historial de presencia: {e}")
+        db.session.rollback()
+
+
+def activity_heatmap(device_id, days=28):
+    """
+    Calcula el mapa de calor de actividad de un dispositivo en los últimos 'days' días (UTC):
+    para cada día de la semana y hora, en cuántos días se le vio al menos una vez.
+    También devuelve la mayor ausencia observada, útil para ajustar el umbral de liberación.
+    """
+    today = datetime.now(UTC).date()
+    start = today - timedelta(days=days - 1)
+    rows = DeviceSighting.query.filter(
+        DeviceSighting.device_id == device_id,
+        DeviceSighting.day >= start
+    ).order_by(DeviceSighting.day.asc()).all()
+
+    heatmap = [[0] * 24 for _ in range(7)]
+    days_by_weekday = [0] * 7
+    daily_minutes = {}
+
+    # Recorre el periodo intervalo a intervalo (a resolución horaria) para medir ausencias
+    longest_gap_hours = 0
+    current_gap = None
+    rows_by_day = {row.day: row for row in rows}
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        days_by_weekday[day.weekday()] += 1
+        row = rows_by_day.get(day)
+        bits = int.from_bytes(row.bitmap, 'little') if row else 0
+        hourly = _downsample(bits, row.resolution_minutes, 60) if row else 0
+        if row:
+            daily_minutes[day.isoformat()] = bin(bits).count('1') * row.resolution_minutes
+
+        for hour in range(24):
+            if hourly >> hour & 1:
+                heatmap[day.weekday()][hour] += 1
+                if current_gap is not None:
+                    longest_gap_hours = max(longest_gap_hours, current_gap)
+                current_gap = 0
+            elif current_gap is not None:
+                current_gap += 1
+
+    return {
+        'device_id': device_id,
+        'timezone': 'UTC',
+        'days': days,
+        'start_date': start.isoformat(),
+        # Filas: lunes (0) a domingo (6); columnas: horas 0-23
+        'heatmap': heatmap,
+        'days_by_weekday': days_by_weekday,
+        'daily_minutes': daily_minutes,
+        'longest_absence_hours': longest_gap_hours
+    }
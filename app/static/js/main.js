@@ -3,12 +3,18 @@
 // Estado global de la aplicación
 const state = {
     currentPage: 1,
+    // Cursor de la página actual (paginación por clave). Vacío = primera página.
+    cursor: '',
     perPage: 50,
     sortBy: 'last_seen',
     sortOrder: 'desc',
     searchTerm: '',
     autoRefresh: true,
     autoRefreshInterval: null,
+    // Conexión SSE con /api/stream; el sondeo solo se usa si no está disponible
+    eventSource: null,
+    streamRefreshTimer: null,
+    devicesStale: false,
     // [NUEVO] Referencia al objeto Offcanvas de Bootstrap
     deviceDetailOffcanvas: null, 
 };
@@ -95,6 +101,7 @@ function setupTableControls() {
                 state.sortBy = newSortBy;
                 state.sortOrder = 'desc';
             }
+            resetPagination();
             fetchDevices();
         });
     });
@@ -105,7 +112,7 @@ function setupTableControls() {
         clearTimeout(searchTimeout);
         searchTimeout = setTimeout(() => {
             state.searchTerm = e.target.value;
-            state.currentPage = 1;
+            resetPagination();
             fetchDevices();
         }, 300);
     });
@@ -113,7 +120,7 @@ function setupTableControls() {
     // Selector de elementos por página
     document.getElementById('per-page-select').addEventListener('change', (e) => {
         state.perPage = e.target.value;
-        state.currentPage = 1;
+        resetPagination();
         fetchDevices();
     });
     
@@ -145,6 +152,15 @@ function setupLogControls() {
     document.getElementById('log-filter-select').addEventListener('change', (e) => {
         fetchLogs(e.target.value);
     });
+
+    // Búsqueda de texto completo en los logs
+    let logSearchTimeout;
+    document.getElementById('log-search-input').addEventListener('input', () => {
+        clearTimeout(logSearchTimeout);
+        logSearchTimeout = setTimeout(() => {
+            fetchLogs(document.getElementById('log-filter-select').value);
+        }, 300);
+    });
 }
 
 // --- LÓGICA DE NAVEGACIÓN ENTRE VISTAS ---
@@ -159,6 +175,9 @@ function switchView(viewId) {
         fetchHistoricalStats();
     } else if (viewId === 'logs-view') {
         fetchLogs();
+    } else if (viewId === 'dashboard-view' && state.devicesStale) {
+        state.devicesStale = false;
+        fetchDevices();
     }
 }
 
@@ -179,6 +198,14 @@ async function apiFetch(url, options = {}) {
         },
     };
 
+    // Las peticiones GET envían el ETag de la última respuesta: si los datos no han
+    // cambiado el servidor contesta 304 y se reutiliza la copia guardada.
+    const isGet = !config.method || config.method.toUpperCase() === 'GET';
+    const cached = isGet ? responseCache.get(url) : undefined;
+    if (cached) {
+        config.headers['If-None-Match'] = cached.etag;
+    }
+
     const response = await fetch(url, config);
 
     if (response.status === 401) {
@@ -186,12 +213,34 @@ async function apiFetch(url, options = {}) {
         throw new Error('No autorizado');
     }
 
+    if (response.status === 304 && cached) {
+        return cached.data;
+    }
+
     if (!response.ok) {
         const errorData = await response.json().catch(() => ({ error: 'Error desconocido' }));
         throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
     }
 
-    return response.json();
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (isGet && etag) {
+        rememberResponse(url, etag, data);
+    }
+    return data;
+}
+
+// --- CACHÉ DE RESPUESTAS CONDICIONALES (ETag) ---
+const RESPONSE_CACHE_MAX_ENTRIES = 50;
+const responseCache = new Map();
+
+function rememberResponse(url, etag, data) {
+    // Map conserva el orden de inserción: se descarta la entrada más antigua
+    responseCache.delete(url);
+    if (responseCache.size >= RESPONSE_CACHE_MAX_ENTRIES) {
+        responseCache.delete(responseCache.keys().next().value);
+    }
+    responseCache.set(url, { etag, data });
 }
 
 function fetchDashboardData() {
@@ -201,19 +250,28 @@ function fetchDashboardData() {
 async function fetchStats() {
     try {
         const data = await apiFetch('/api/stats');
-        document.getElementById('stats-total-devices').textContent = data.total_devices;
-        document.getElementById('stats-active-devices').textContent = data.active_devices;
-        document.getElementById('stats-released-ips').textContent = data.released_ips;
+        renderStats(data);
     } catch (error) {
         console.error('Error fetching stats:', error);
     }
 }
 
+function renderStats(data) {
+    document.getElementById('stats-total-devices').textContent = data.total_devices;
+    document.getElementById('stats-active-devices').textContent = data.active_devices;
+    document.getElementById('stats-released-ips').textContent = data.released_ips;
+}
+
 async function fetchDevices() {
     try {
-        const url = `/api/devices?page=${state.currentPage}&per_page=${state.perPage}&sort_by=${state.sortBy}&order=${state.sortOrder}&search=${state.searchTerm}`;
+        const url = `/api/devices?shape=columns&cursor=${state.cursor}&per_page=${state.perPage}&sort_by=${state.sortBy}&order=${state.sortOrder}&search=${encodeURIComponent(state.searchTerm)}`;
         const data = await apiFetch(url);
-        renderDevices(data.items);
+        // Si al volver atrás ya no hay páginas anteriores, estamos en la primera:
+        // los siguientes refrescos deben pedir la cabeza de la lista.
+        if (!data.pagination.has_prev) {
+            resetPagination();
+        }
+        renderDevices(rowsToObjects(data.columns, data.items));
         renderPagination(data.pagination);
         updateSortIndicator();
     } catch (error) {
@@ -240,7 +298,7 @@ async function handleConfigSave(event) {
     formData.forEach((value, key) => {
         if (key === 'dry_run_enabled') {
             data[key] = value === 'on';
-        } else if (['auto_release_threshold_hours', 'scan_interval_seconds'].includes(key)) {
+        } else if (['auto_release_threshold_hours', 'scan_interval_seconds', 'inactive_threshold_minutes', 'pool_release_threshold_percent', 'release_budget_per_cycle', 'release_budget_per_interface'].includes(key)) {
             data[key] = parseInt(value, 10);
         } else {
             data[key] = value;
@@ -350,12 +408,46 @@ async function showDeviceDetails(deviceId) {
         placeholder.classList.add('d-none');
         realContent.classList.remove('d-none');
 
+        // El mapa de calor se carga aparte para no retrasar el panel
+        fetchDeviceActivity(device.id);
+
     } catch (error) {
         showToast(`Error al cargar detalles: ${error.message}`, 'danger');
         state.deviceDetailOffcanvas.hide();
     }
 }
 
+async function fetchDeviceActivity(deviceId) {
+    const container = document.getElementById('detail-activity-heatmap');
+    const summary = document.getElementById('detail-activity-summary');
+    container.innerHTML = '';
+    summary.textContent = '';
+    try {
+        const activity = await apiFetch(`/api/devices/${deviceId}/activity?days=28`);
+        renderActivityHeatmap(activity);
+    } catch (error) {
+        summary.textContent = 'No se pudo cargar el historial de actividad.';
+    }
+}
+
+function renderActivityHeatmap(activity) {
+    const weekdays = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom'];
+    let html = '<table>';
+    activity.heatmap.forEach((hours, weekday) => {
+        const daysObserved = activity.days_by_weekday[weekday] || 1;
+        html += `<tr><th>${weekdays[weekday]}</th>`;
+        hours.forEach((count, hour) => {
+            const intensity = count / daysObserved;
+            html += `<td title="${weekdays[weekday]} ${hour}:00 · visto ${count} de ${daysObserved} días" style="background-color: rgba(25, 135, 84, ${0.08 + intensity * 0.92});"></td>`;
+        });
+        html += '</tr>';
+    });
+    html += '</table>';
+    document.getElementById('detail-activity-heatmap').innerHTML = html;
+    document.getElementById('detail-activity-summary').textContent =
+        `Mayor ausencia observada: ${activity.longest_absence_hours} h`;
+}
+
 function setupOffcanvasActionButtons() {
     document.getElementById('detail-ping-btn').addEventListener('click', async (e) => {
         const deviceId = e.target.dataset.deviceId;
@@ -419,65 +511,49 @@ function renderPagination(pagination) {
     const controls = document.getElementById('pagination-controls');
     controls.innerHTML = '';
     
-    if (pagination.total_pages <= 1) return;
+    if (!pagination.has_next && !pagination.has_prev) return;
+
+    // El total en modo cursor es aproximado (se cachea unos segundos en el servidor)
+    const totalText = pagination.total_items !== null
+        ? `${pagination.total_is_estimate ? '~' : ''}${pagination.total_items} dispositivos`
+        : '';
     
-    let html = '<nav><ul class="pagination mb-0">';
+    let html = '<nav class="d-flex align-items-center"><ul class="pagination mb-0">';
     
     // Botón Anterior
     html += `<li class="page-item ${pagination.has_prev ? '' : 'disabled'}">
-        <a class="page-link" href="#" data-page="${pagination.page - 1}">Anterior</a>
+        <a class="page-link" href="#" data-cursor="${pagination.prev_cursor || ''}" data-step="-1">Anterior</a>
     </li>`;
 
-    // Lógica para mostrar las páginas
-    const maxPagesToShow = 5;
-    let startPage = Math.max(1, pagination.page - Math.floor(maxPagesToShow / 2));
-    let endPage = Math.min(pagination.total_pages, startPage + maxPagesToShow - 1);
-    
-    if (endPage - startPage + 1 < maxPagesToShow) {
-        startPage = Math.max(1, endPage - maxPagesToShow + 1);
-    }
-    
-    if (startPage > 1) {
-        html += `<li class="page-item"><a class="page-link" href="#" data-page="1">1</a></li>`;
-        if (startPage > 2) {
-            html += `<li class="page-item disabled"><span class="page-link">...</span></li>`;
-        }
-    }
-    
-    for (let i = startPage; i <= endPage; i++) {
-        html += `<li class="page-item ${i === pagination.page ? 'active' : ''}">
-            <a class="page-link" href="#" data-page="${i}">${i}</a>
-        </li>`;
-    }
-
-    if (endPage < pagination.total_pages) {
-        if (endPage < pagination.total_pages - 1) {
-            html += `<li class="page-item disabled"><span class="page-link">...</span></li>`;
-        }
-        html += `<li class="page-item"><a class="page-link" href="#" data-page="${pagination.total_pages}">${pagination.total_pages}</a></li>`;
-    }
+    html += `<li class="page-item disabled"><span class="page-link">Página ${state.currentPage}</span></li>`;
     
     // Botón Siguiente
     html += `<li class="page-item ${pagination.has_next ? '' : 'disabled'}">
-        <a class="page-link" href="#" data-page="${pagination.page + 1}">Siguiente</a>
+        <a class="page-link" href="#" data-cursor="${pagination.next_cursor || ''}" data-step="1">Siguiente</a>
     </li>`;
     
-    html += '</ul></nav>';
+    html += `</ul><span class="text-muted small ms-3">${totalText}</span></nav>`;
     controls.innerHTML = html;
 
     // Añadir event listeners a los nuevos botones
     controls.querySelectorAll('a.page-link').forEach(link => {
         link.addEventListener('click', (e) => {
             e.preventDefault();
-            const page = e.target.dataset.page;
-            if (page) {
-                state.currentPage = parseInt(page);
+            const cursor = e.target.dataset.cursor;
+            if (cursor) {
+                state.cursor = cursor;
+                state.currentPage = Math.max(1, state.currentPage + parseInt(e.target.dataset.step));
                 fetchDevices();
             }
         });
     });
 }
 
+function resetPagination() {
+    state.cursor = '';
+    state.currentPage = 1;
+}
+
 function populateConfigForm(config) {
     document.getElementById('dry_run_enabled').checked = config.dry_run_enabled;
     document.getElementById('discovery_method').value = config.discovery_method;
@@ -486,8 +562,13 @@ function populateConfigForm(config) {
     document.getElementById('dhcp_server_ip').value = config.dhcp_server_ip;
     document.getElementById('network_interface').value = config.network_interface;
     document.getElementById('scan_interval_seconds').value = config.scan_interval_seconds;
+    document.getElementById('inactive_threshold_minutes').value = config.inactive_threshold_minutes;
     document.getElementById('auto_release_threshold_hours').value = config.auto_release_threshold_hours;
     document.getElementById('mac_auto_release_list').value = config.mac_auto_release_list;
+    document.getElementById('dhcp_pool_ranges').value = config.dhcp_pool_ranges;
+    document.getElementById('pool_release_threshold_percent').value = config.pool_release_threshold_percent;
+    document.getElementById('release_budget_per_cycle').value = config.release_budget_per_cycle;
+    document.getElementById('release_budget_per_interface').value = config.release_budget_per_interface;
 }
 
 // --- FUNCIONES DE ACCIÓN ---
@@ -542,6 +623,15 @@ async function toggleExclusion(deviceId, exclude) {
 
 // --- UTILIDADES ---
 
+// Convierte una respuesta compacta (shape=columns) en la lista de objetos habitual
+function rowsToObjects(columns, rows) {
+    return rows.map(row => {
+        const item = {};
+        columns.forEach((name, i) => { item[name] = row[i]; });
+        return item;
+    });
+}
+
 function updateSortIndicator() {
     document.querySelectorAll('.sortable span').forEach(span => span.textContent = '');
     const activeHeader = document.querySelector(`.sortable[data-sort="${state.sortBy}"] span`);
@@ -550,8 +640,69 @@ function updateSortIndicator() {
     }
 }
 
+// --- ACTUALIZACIONES EN VIVO (SSE) CON SONDEO DE RESPALDO ---
+const STREAM_RECONNECT_DELAY_MS = 30000;
+const STREAM_REFRESH_DEBOUNCE_MS = 500;
+
 function startAutoRefresh() {
-    if (state.autoRefreshInterval) clearInterval(state.autoRefreshInterval);
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    openEventStream();
+}
+
+function stopAutoRefresh() {
+    if (state.eventSource) {
+        state.eventSource.close();
+        state.eventSource = null;
+    }
+    stopPolling();
+}
+
+function openEventStream() {
+    if (state.eventSource || !state.autoRefresh) return;
+
+    const source = new EventSource('/api/stream');
+    state.eventSource = source;
+
+    // Con el flujo conectado el sondeo sobra
+    source.onopen = () => stopPolling();
+
+    source.addEventListener('stats', (e) => renderStats(JSON.parse(e.data)));
+    ['devices', 'status', 'release'].forEach(kind => {
+        source.addEventListener(kind, scheduleDevicesRefresh);
+    });
+    source.addEventListener('reset', () => {
+        fetchStats();
+        scheduleDevicesRefresh();
+    });
+
+    source.onerror = () => {
+        // Mientras EventSource reintenta (CONNECTING) se sondea para no perder cambios.
+        // Si la conexión se da por cerrada, se vuelve a intentar más tarde.
+        startPolling();
+        if (source.readyState === EventSource.CLOSED) {
+            state.eventSource = null;
+            setTimeout(openEventStream, STREAM_RECONNECT_DELAY_MS);
+        }
+    };
+}
+
+function scheduleDevicesRefresh() {
+    // Agrupa ráfagas de eventos (ej: un escaneo Nmap) en una sola recarga de la tabla
+    clearTimeout(state.streamRefreshTimer);
+    state.streamRefreshTimer = setTimeout(() => {
+        if (document.getElementById('dashboard-view').offsetParent !== null) {
+            fetchDevices();
+        } else {
+            state.devicesStale = true;
+        }
+    }, STREAM_REFRESH_DEBOUNCE_MS);
+}
+
+function startPolling() {
+    if (state.autoRefreshInterval) return;
     state.autoRefreshInterval = setInterval(() => {
         if (state.autoRefresh && document.getElementById('dashboard-view').offsetParent !== null) {
             console.log("Auto-refrescando datos del dashboard...");
@@ -560,7 +711,7 @@ function startAutoRefresh() {
     }, 10000); // Cada 10 segundos
 }
 
-function stopAutoRefresh() {
+function stopPolling() {
     clearInterval(state.autoRefreshInterval);
     state.autoRefreshInterval = null;
 }
@@ -679,8 +830,17 @@ function renderCharts(data) {
         releases_inactivity: 'rgba(255, 159, 64, 0.7)',
         releases_mac_list: 'rgba(255, 99, 132, 0.7)',
         releases_manual: 'rgba(201, 203, 207, 0.7)',
+        releases_pool_pressure: 'rgba(255, 205, 86, 0.7)',
         active_devices_peak: 'rgba(75, 192, 192, 0.7)',
         total_devices_snapshot: 'rgba(54, 162, 235, 0.7)',
+        new_devices: 'rgba(153, 102, 255, 0.7)',
+    };
+
+    const activityColor = (label) => {
+        const lower = label.toLowerCase();
+        if (lower.includes('pico')) return chartColors.active_devices_peak;
+        if (lower.includes('nuevos')) return chartColors.new_devices;
+        return chartColors.total_devices_snapshot;
     };
     
     const commonOptions = {
@@ -700,7 +860,7 @@ function renderCharts(data) {
             labels: data.labels,
             datasets: data.datasets.releases.map(ds => ({
                 ...ds,
-                backgroundColor: chartColors[ds.label.toLowerCase().includes('inactividad') ? 'releases_inactivity' : ds.label.toLowerCase().includes('mac') ? 'releases_mac_list' : 'releases_manual']
+                backgroundColor: chartColors[ds.label.toLowerCase().includes('inactividad') ? 'releases_inactivity' : ds.label.toLowerCase().includes('mac') ? 'releases_mac_list' : ds.label.toLowerCase().includes('pool') ? 'releases_pool_pressure' : 'releases_manual']
             })),
         },
         options: { ...commonOptions, scales: { x: { stacked: true }, y: { stacked: true, beginAtZero: true } } }
@@ -715,8 +875,8 @@ function renderCharts(data) {
             labels: data.labels,
             datasets: data.datasets.activity.map(ds => ({
                 ...ds,
-                borderColor: chartColors[ds.label.toLowerCase().includes('pico') ? 'active_devices_peak' : 'total_devices_snapshot'],
-                backgroundColor: chartColors[ds.label.toLowerCase().includes('pico') ? 'active_devices_peak' : 'total_devices_snapshot'],
+                borderColor: activityColor(ds.label),
+                backgroundColor: activityColor(ds.label),
                 fill: false,
                 tension: 0.1
             })),
@@ -728,8 +888,9 @@ function renderCharts(data) {
 async function fetchLogs(eventType = 'all') {
     showSpinner();
     try {
-        const logs = await apiFetch(`/api/logs?event_type=${eventType}`);
-        renderLogs(logs);
+        const searchText = document.getElementById('log-search-input').value.trim();
+        const data = await apiFetch(`/api/logs?shape=columns&event_type=${eventType}&q=${encodeURIComponent(searchText)}`);
+        renderLogs(rowsToObjects(data.columns, data.items));
     } catch (error) {
         console.error('Error fetching logs:', error);
         showToast(error.message, 'danger');
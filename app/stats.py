@@ -0,0 +1,190 @@
+# app/stats.py
+
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+from app import db
+from app.models import HourlyStat, PoolStat
+
+# Columnas de liberaciones por tipo ('manual', 'inactivity', 'mac_list', 'pool_pressure')
+RELEASE_COLUMNS = {
+    'manual': 'releases_manual',
+    'inactivity': 'releases_inactivity',
+    'mac_list': 'releases_mac_list',
+    'pool_pressure': 'releases_pool_pressure',
+}
+
+COUNTER_COLUMNS = ('releases_manual', 'releases_inactivity', 'releases_mac_list', 'releases_pool_pressure', 'new_devices')
+
+_UPSERT_DIALECTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert,
+}
+
+
+def current_hour(now=None):
+    """Inicio de la hora actual en UTC (sin tzinfo, como se guarda en la base de datos)."""
+    now = now or datetime.now(UTC)
+    return now.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def _greatest(a, b):
+    """
+    Máximo de dos expresiones SQL. En SQLite max() con dos argumentos es escalar; en
+    PostgreSQL max() solo existe como agregado y la función escalar es greatest().
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return func.max(a, b)
+    return func.greatest(a, b)
+
+
+def _upsert_hour(increments=None, maxima=None, snapshots=None, hour=None):
+    """
+    Actualiza la fila de la hora actual con un único upsert:
+    - increments: columnas a sumar.
+    - maxima: columnas que guardan el máximo (marca de agua).
+    - snapshots: columnas que se sobrescriben con el último valor.
+    Añade la sentencia a la sesión, pero NO hace commit.
+    """
+    increments, maxima, snapshots = increments or {}, maxima or {}, snapshots or {}
+    hour = hour or current_hour()
+    values = {column: 0 for column in COUNTER_COLUMNS + ('total_devices_snapshot', 'active_devices_peak')}
+    values.update(increments)
+    values.update(maxima)
+    values.update(snapshots)
+
+    insert = _UPSERT_DIALECTS.get(db.engine.dialect.name)
+    if insert is None:
+        # Motores sin upsert: lectura-modificación-escritura mediante el ORM
+        stat = db.session.get(HourlyStat, hour)
+        if stat is None:
+            db.session.add(HourlyStat(hour=hour, **values))
+            return
+        for column, amount in increments.items():
+            setattr(stat, column, getattr(stat, column) + amount)
+        for column, value in maxima.items():
+            setattr(stat, column, max(getattr(stat, column), value))
+        for column, value in snapshots.items():
+            setattr(stat, column, value)
+        return
+
+    table = HourlyStat.__table__
+    stmt = insert(table).values(hour=hour, **values)
+    update = {column: table.c[column] + stmt.excluded[column] for column in increments}
+    update.update({column: _greatest(table.c[column], stmt.excluded[column]) for column in maxima})
+    update.update({column: stmt.excluded[column] for column in snapshots})
+    db.session.execute(stmt.on_conflict_do_update(index_elements=['hour'], set_=update))
+
+
+def record_release(release_type, count=1):
+    """Suma 'count' liberaciones del tipo dado a la hora actual (sin commit)."""
+    column = RELEASE_COLUMNS.get(release_type)
+    if column and count:
+        _upsert_hour(increments={column: count})
+
+
+def record_new_devices(count=1):
+    """Suma dispositivos nuevos descubiertos en la hora actual (sin commit)."""
+    if count:
+        _upsert_hour(increments={'new_devices': count})
+
+
+def record_device_counts(active_devices, total_devices):
+    """Actualiza el pico de activos y la foto del total de dispositivos de la hora actual (sin commit)."""
+    _upsert_hour(maxima={'active_devices_peak': active_devices}, snapshots={'total_devices_snapshot': total_devices})
+
+
+def record_pool_usage(pools, hour=None):
+    """
+    Guarda el pico de direcciones asignadas y activas de cada pool en la hora actual
+    (un upsert con máximo por pool). Añade las sentencias a la sesión, pero NO hace commit.
+    """
+    hour = hour or current_hour()
+    insert = _UPSERT_DIALECTS.get(db.engine.dialect.name)
+    for pool in pools:
+        values = {'size': pool.size, 'allocated_peak': pool.allocated_count, 'active_peak': pool.active_count}
+        if insert is None:
+            stat = db.session.get(PoolStat, (hour, pool.name))
+            if stat is None:
+                db.session.add(PoolStat(hour=hour, pool=pool.name, **values))
+                continue
+            stat.size = pool.size
+            stat.allocated_peak = max(stat.allocated_peak, pool.allocated_count)
+            stat.active_peak = max(stat.active_peak, pool.active_count)
+            continue
+
+        table = PoolStat.__table__
+        stmt = insert(table).values(hour=hour, pool=pool.name, **values)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['hour', 'pool'], set_={
+            'size': stmt.excluded.size,
+            'allocated_peak': _greatest(table.c.allocated_peak, stmt.excluded.allocated_peak),
+            'active_peak': _greatest(table.c.active_peak, stmt.excluded.active_peak),
+        }))
+
+
+# --- VISTAS DERIVADAS ---
+
+GRANULARITIES = ('hour', 'day', 'week')
+
+
+def _bucket_start(hour, granularity):
+    if granularity == 'hour':
+        return hour
+    day = hour.replace(hour=0)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def _bucket_label(bucket, granularity):
+    return bucket.strftime('%Y-%m-%d %H:00' if granularity == 'hour' else '%Y-%m-%d')
+
+
+def aggregate_stats(start, end, granularity='day'):
+    """
+    Agrega las filas horarias entre 'start' y 'end' (inicio de hora, UTC) en intervalos
+    de la granularidad pedida. Las liberaciones y los nuevos dispositivos se suman, el pico
+    de activos es el máximo y el total de dispositivos es la última foto del intervalo.
+    Devuelve una tupla: (labels, {label: valores})
+    """
+    step = timedelta(hours=1) if granularity == 'hour' else timedelta(days=1)
+    labels = []
+    bucket = _bucket_start(start, granularity)
+    while bucket <= end:
+        label = _bucket_label(_bucket_start(bucket, granularity), granularity)
+        if not labels or labels[-1] != label:
+            labels.append(label)
+        bucket += step
+
+    empty = {column: 0 for column in COUNTER_COLUMNS + ('active_devices_peak', 'total_devices_snapshot')}
+    data_map = {label: dict(empty) for label in labels}
+
+    rows = HourlyStat.query.filter(HourlyStat.hour >= start, HourlyStat.hour <= end).order_by(HourlyStat.hour.asc()).all()
+    for row in rows:
+        values = data_map.get(_bucket_label(_bucket_start(row.hour, granularity), granularity))
+        if values is None:
+            continue
+        for column in COUNTER_COLUMNS:
+            values[column] += getattr(row, column)
+        values['active_devices_peak'] = max(values['active_devices_peak'], row.active_devices_peak)
+        if row.total_devices_snapshot:
+            values['total_devices_snapshot'] = row.total_devices_snapshot
+
+    return labels, data_map
+
+
+def aggregate_pool_stats(start, end, labels, granularity='day'):
+    """
+    Pico de ocupación (% de direcciones asignadas) de cada pool en los intervalos de
+    aggregate_stats(). Devuelve {pool: [porcentaje o None por etiqueta]}.
+    """
+    peaks = {}
+    rows = PoolStat.query.filter(PoolStat.hour >= start, PoolStat.hour <= end).order_by(PoolStat.hour.asc()).all()
+    for row in rows:
+        label = _bucket_label(_bucket_start(row.hour, granularity), granularity)
+        percent = round(row.allocated_peak * 100 / row.size, 2) if row.size else 0.0
+        by_label = peaks.setdefault(row.pool, {})
+        by_label[label] = max(by_label.get(label, 0.0), percent)
+    return {pool: [by_label.get(label) for label in labels] for pool, by_label in peaks.items()}
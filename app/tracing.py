@@ -0,0 +1,258 @@
+# app/tracing.py
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, UTC
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# --- TRAZAS DE LOS CICLOS DEL WORKER ---
+# Cada ejecución de una tarea del worker es un "ciclo": se anotan sus fases (span) y el
+# tiempo pasado en la base de datos, y se guardan los últimos TRACE_RING_SIZE ciclos en
+# memoria. El worker y la web son procesos distintos, así que el worker copia el buffer a
+# DIAGNOSTICS_DIR/cycles.json tras cada ciclo y la web lo lee de ahí.
+#
+# Perfilado bajo demanda: la web deja una petición en DIAGNOSTICS_DIR/profile_request.json
+# y el worker perfila con cProfile los N ciclos siguientes (de una tarea o de cualquiera),
+# guardando un fichero .prof por ciclo.
+
+TRACE_RING_SIZE = 200 # Ciclos que se conservan
+MAX_SPANS_PER_CYCLE = 500 # Más allá solo se acumulan en el desglose (ej: una liberación por dispositivo)
+
+CYCLES_FILE = 'cycles.json'
+PROFILE_REQUEST_FILE = 'profile_request.json'
+PROFILE_PREFIX = 'profile-'
+
+_local = threading.local()
+_ring = deque(maxlen=TRACE_RING_SIZE)
+_ring_lock = threading.Lock()
+_profile_lock = threading.Lock()
+_state = {'directory': None}
+
+
+def init_tracing(directory):
+    """Activa la copia del buffer y el perfilado bajo demanda en 'directory' (la crea si no existe)."""
+    os.makedirs(directory, exist_ok=True)
+    _state['directory'] = directory
+
+
+def _write_json(path, data):
+    """Escritura atómica: quien lea el fichero nunca ve uno a medias."""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(temporary, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# --- SPANS ---
+
+class _Cycle:
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now(UTC)
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped_spans = 0
+        self.breakdown = {}
+        self.depth = 0
+        self.error = None
+
+    def add(self, name, offset, duration, depth):
+        entry = self.breakdown.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+        if len(self.spans) < MAX_SPANS_PER_CYCLE:
+            self.spans.append({'name': name, 'start': round(offset, 6), 'seconds': round(duration, 6), 'depth': depth})
+        else:
+            self.dropped_spans += 1
+
+    def to_dict(self, duration):
+        return {
+            'job': self.name,
+            'started_at': self.started_at.isoformat(),
+            'seconds': round(duration, 6),
+            'error': self.error,
+            'breakdown': {
+                name: {'count': count, 'seconds': round(seconds, 6)}
+                for name, (count, seconds) in sorted(self.breakdown.items(), key=lambda item: -item[1][1])
+            },
+            'spans': self.spans,
+            'dropped_spans': self.dropped_spans,
+        }
+
+
+def _current():
+    return getattr(_local, 'cycle', None)
+
+
+@contextmanager
+def span(name):
+    """Mide una fase dentro del ciclo en curso. Fuera de un ciclo (ej: en la web) no hace nada."""
+    cycle = _current()
+    if cycle is None:
+        yield
+        return
+    started = time.perf_counter()
+    depth = cycle.depth
+    cycle.depth += 1
+    try:
+        yield
+    finally:
+        cycle.depth = depth
+        cycle.add(name, started - cycle.started, time.perf_counter() - started, depth)
+
+
+def mark_error(message):
+    """Anota en el ciclo en curso la excepción que lo ha hecho fallar."""
+    cycle = _current()
+    if cycle is not None:
+        cycle.error = str(message)
+
+
+# Consultas: cada sentencia cuenta en el desglose como 'db' (no como span, serían miles)
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if _current() is not None:
+        conn.info.setdefault('tracing_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    cycle = _current()
+    pending = conn.info.get('tracing_started')
+    if cycle is None or not pending:
+        return
+    duration = time.perf_counter() - pending.pop()
+    entry = cycle.breakdown.setdefault('db', [0, 0.0])
+    entry[0] += 1
+    entry[1] += duration
+
+
+# --- CICLOS ---
+
+def _take_profile_slot(job_name):
+    """
+    Si hay una petición de perfilado pendiente que aplique a esta tarea, consume uno de sus
+    ciclos y devuelve True. Solo se perfila un ciclo a la vez.
+    """
+    directory = _state['directory']
+    if directory is None:
+        return False
+    path = os.path.join(directory, PROFILE_REQUEST_FILE)
+    if not os.path.exists(path) or not _profile_lock.acquire(blocking=False):
+        return False
+
+    try:
+        request = _read_json(path)
+        if not request or request.get('job') not in (None, job_name):
+            _profile_lock.release()
+            return False
+
+        remaining = int(request.get('cycles', 1)) - 1
+        if remaining > 0:
+            request['cycles'] = remaining
+            _write_json(path, request)
+        else:
+            os.remove(path)
+        return True
+    except (OSError, ValueError) as e:
+        print(f"[!] Petición de perfilado inválida: {e}")
+        _profile_lock.release()
+        return False
+
+
+def _save_profile(profiler, job_name):
+    try:
+        stamp = datetime.now(UTC).strftime('%Y%m%d-%H%M%S-%f')
+        path = os.path.join(_state['directory'], f'{PROFILE_PREFIX}{job_name}-{stamp}.prof')
+        profiler.dump_stats(path)
+        print(f"[OK] Perfil del ciclo '{job_name}' guardado en {path}")
+    finally:
+        _profile_lock.release()
+
+
+@contextmanager
+def trace_cycle(name):
+    """
+    Traza una ejecución completa de una tarea. Al terminar la añade al buffer y, si se ha
+    llamado a init_tracing(), actualiza cycles.json.
+    """
+    cycle = _Cycle(name)
+    profiler = cProfile.Profile() if _take_profile_slot(name) else None
+    _local.cycle = cycle
+    if profiler:
+        profiler.enable()
+    try:
+        yield cycle
+    except BaseException as e:
+        cycle.error = str(e)
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        _local.cycle = None
+        record = cycle.to_dict(time.perf_counter() - cycle.started)
+        record['profiled'] = profiler is not None
+        if profiler:
+            _save_profile(profiler, name)
+        with _ring_lock: # También serializa la escritura del fichero entre hilos
+            _ring.append(record)
+            if _state['directory']:
+                try:
+                    _write_json(os.path.join(_state['directory'], CYCLES_FILE), list(_ring))
+                except OSError as e:
+                    print(f"[!] No se pudo guardar el buffer de trazas: {e}")
+
+
+# --- LECTURA (desde la web) ---
+
+def read_cycles(directory, job=None, limit=None):
+    """Ciclos guardados por el worker, del más reciente al más antiguo."""
+    cycles = _read_json(os.path.join(directory, CYCLES_FILE)) or []
+    cycles.reverse()
+    if job:
+        cycles = [cycle for cycle in cycles if cycle['job'] == job]
+    return cycles[:limit] if limit else cycles
+
+
+def request_profile(directory, cycles, job=None):
+    """Pide al worker que perfile los 'cycles' ciclos siguientes (de 'job' o de cualquier tarea)."""
+    os.makedirs(directory, exist_ok=True)
+    request = {'cycles': cycles, 'job': job, 'requested_at': datetime.now(UTC).isoformat()}
+    _write_json(os.path.join(directory, PROFILE_REQUEST_FILE), request)
+    return request
+
+
+def pending_profile(directory):
+    return _read_json(os.path.join(directory, PROFILE_REQUEST_FILE))
+
+
+def list_profiles(directory):
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory) if name.startswith(PROFILE_PREFIX) and name.endswith('.prof')]
+    return sorted(names, reverse=True)
+
+
+def profile_summary(path, limit=40, sort='cumulative'):
+    """Las 'limit' funciones más costosas de un perfil, en el formato de texto de pstats."""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
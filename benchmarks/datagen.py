@@ -0,0 +1,254 @@
+# benchmarks/datagen.py
+
+import hashlib
+import os
+import random
+import shutil
+import sqlite3
+from datetime import datetime, timedelta, UTC
+
+from flask_migrate import upgrade
+from sqlalchemy import insert
+
+from app import create_app, db
+from app.models import ApplicationConfig, Device, HourlyStat, LogEntry, User
+from config import Config
+
+# --- GENERADOR DE DATOS SINTÉTICOS ---
+# Crea bases de datos SQLite con el esquema real (migraciones incluidas, con sus triggers
+# de búsqueda y contadores) y N dispositivos con distribuciones parecidas a una red real:
+# pocos fabricantes acaparan la mayoría de MACs, un porcentaje de MACs aleatorias
+# (privacidad de Wi-Fi), IPs repartidas en /24 y la mayoría de equipos vistos hace poco.
+# Las bases generadas se guardan en benchmarks/.cache y se copian para cada escenario.
+
+BENCHMARKS_DIR = os.path.abspath(os.path.dirname(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+CACHE_DIR = os.path.join(BENCHMARKS_DIR, '.cache')
+MIGRATIONS_DIR = os.path.join(ROOT_DIR, 'migrations')
+
+BENCH_USERNAME = 'bench'
+BENCH_PASSWORD = 'bench'
+
+INSERT_CHUNK_SIZE = 10000
+HOSTS_PER_SUBNET = 230 # Hosts usados de cada /24
+
+# (OUI, fabricante, peso)
+VENDORS = [
+    ('3C:22:FB', 'Apple, Inc.', 14),
+    ('F0:18:98', 'Apple, Inc.', 8),
+    ('8C:85:90', 'Apple, Inc.', 5),
+    ('5C:0A:5B', 'Samsung Electronics Co.,Ltd', 9),
+    ('D0:22:BE', 'Samsung Electronics Co.,Ltd', 4),
+    ('F8:BC:12', 'Dell Inc.', 7),
+    ('3C:52:82', 'Hewlett Packard', 6),
+    ('00:1B:54', 'Cisco Systems, Inc', 4),
+    ('A4:4C:C8', 'Intel Corporate', 8),
+    ('8C:16:45', 'LCFC(HeFei) Electronics Technology co., ltd', 4),
+    ('50:C7:BF', 'TP-LINK TECHNOLOGIES CO.,LTD.', 5),
+    ('24:0A:C4', 'Espressif Inc.', 5),
+    ('B8:27:EB', 'Raspberry Pi Foundation', 1),
+    ('44:19:B6', 'Hangzhou Hikvision Digital Technology Co.,Ltd.', 3),
+    ('00:50:56', 'VMware, Inc.', 3),
+    ('FC:EC:DA', 'Ubiquiti Networks Inc.', 2),
+    ('64:09:80', 'Xiaomi Communications Co Ltd', 4),
+    ('00:E0:FC', 'Huawei Technologies Co.,Ltd', 3),
+]
+# MACs aleatorias (bit de administración local): Nmap no conoce el fabricante
+RANDOM_MAC_PREFIXES = ['DA:A1:19', '5E:E9:31', 'B2:4F:7C', '7A:10:8E']
+RANDOM_MAC_WEIGHT = 6
+
+# Reparto de estados: (estado, peso)
+STATUS_WEIGHTS = [('active', 60), ('inactive', 32), ('released', 8)]
+STALE_INACTIVE_FRACTION = 0.006 # Inactivos desde hace días (~0,2 % del total): candidatos a liberar por inactividad
+EXCLUDED_FRACTION = 0.02
+SNIFFER_FRACTION = 0.3
+
+LOG_TEMPLATES = [
+    ('INFO', 40, "Nuevo dispositivo descubierto (Nmap): IP {ip}, MAC {mac}"),
+    ('INFO', 15, "Nuevo dispositivo descubierto (Sniffer): IP {ip}, MAC {mac}"),
+    ('INFO', 12, "IP {ip} liberada automáticamente por 'inactivity'."),
+    ('INFO', 4, "IP {ip} liberada automáticamente por 'mac_list'."),
+    ('INFO', 10, "[DRY RUN] Se habría liberado la IP {ip} (MAC: {mac})"),
+    ('INFO', 6, "OMITIDA liberación para {ip} (MAC: {mac}) porque responde al ping."),
+    ('INFO', 3, "Liberada manualmente la IP {ip} (MAC: {mac}) por 'admin'."),
+    ('INFO', 2, "Dispositivo {mac} ({ip}) marcado como excluido por 'admin'."),
+    ('INFO', 1, "Configuración actualizada por 'admin': Umbral de liberación: '24' -> '48'."),
+    ('ERROR', 3, "Falló el intento de liberación automática para la IP {ip}"),
+    ('ERROR', 1, "Error inesperado durante el escaneo de Nmap: timeout"),
+    ('WARNING', 3, "Contadores de dispositivos reconciliados: active_devices: 10 -> 11."),
+]
+
+LOGS_PER_DEVICE = 1
+STATS_DAYS = 90
+
+
+def _nic(i, seed):
+    """Parte NIC de la MAC: una permutación de i en 24 bits (única para i < 2^24)."""
+    return (i * 0x9E3779B1 + seed * 7919) % (1 << 24)
+
+
+def format_mac(prefix, nic):
+    return f'{prefix}:{nic >> 16:02X}:{(nic >> 8) & 0xFF:02X}:{nic & 0xFF:02X}'
+
+
+def device_ip(i):
+    """IP del dispositivo i: se llenan /24 consecutivas de 10.0.0.0/8."""
+    subnet, host = divmod(i, HOSTS_PER_SUBNET)
+    return f'10.{(subnet >> 8) & 0xFF}.{subnet & 0xFF}.{host + 10}'
+
+
+def ip_int(ip):
+    a, b, c, d = (int(part) for part in ip.split('.'))
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+
+def generate_devices(count, seed=0, now=None):
+    """Genera 'count' filas de dispositivo (diccionarios listos para un INSERT masivo)."""
+    rng = random.Random(seed)
+    now = now or datetime.now(UTC)
+    choices = [(prefix, vendor) for prefix, vendor, _ in VENDORS] + [(prefix, None) for prefix in RANDOM_MAC_PREFIXES]
+    weights = [weight for _, _, weight in VENDORS] + [RANDOM_MAC_WEIGHT / len(RANDOM_MAC_PREFIXES)] * len(RANDOM_MAC_PREFIXES)
+    vendors = rng.choices(choices, weights=weights, k=count)
+    statuses = rng.choices([status for status, _ in STATUS_WEIGHTS], weights=[weight for _, weight in STATUS_WEIGHTS], k=count)
+
+    for i in range(count):
+        prefix, vendor = vendors[i]
+        ip = device_ip(i)
+        status = statuses[i]
+        first_seen = now - timedelta(days=rng.random() * 180)
+        if status == 'active':
+            last_seen = now - timedelta(seconds=rng.random() * 240)
+        elif rng.random() < STALE_INACTIVE_FRACTION:
+            last_seen = now - timedelta(days=3 + rng.random() * 27)
+        else:
+            last_seen = now - timedelta(minutes=10 + rng.random() * 46 * 60)
+        last_seen = max(last_seen, first_seen)
+        by_sniffer = rng.random() < SNIFFER_FRACTION
+
+        yield {
+            'ip_address': ip,
+            'ip_int': ip_int(ip),
+            'mac_address': format_mac(prefix, _nic(i, seed)),
+            'vendor': vendor or ('Desconocido (Sniffer)' if by_sniffer else None),
+            'first_seen': first_seen,
+            'last_seen': last_seen,
+            'status': status,
+            'is_excluded': rng.random() < EXCLUDED_FRACTION,
+            'lease_start_time': last_seen if by_sniffer else None,
+            'lease_duration_seconds': 86400 if by_sniffer else None,
+            'last_seen_by': 'sniffer' if by_sniffer else 'nmap',
+        }
+
+
+def generate_logs(count, device_count, seed=0, now=None):
+    rng = random.Random(seed + 1)
+    now = now or datetime.now(UTC)
+    templates = rng.choices(LOG_TEMPLATES, weights=[weight for _, weight, _ in LOG_TEMPLATES], k=count)
+    for level, _, template in templates:
+        i = rng.randrange(max(device_count, 1))
+        yield {
+            'timestamp': now - timedelta(seconds=rng.random() * STATS_DAYS * 86400),
+            'level': level,
+            'message': template.format(ip=device_ip(i), mac=format_mac(VENDORS[i % len(VENDORS)][0], _nic(i, seed))),
+        }
+
+
+def generate_hourly_stats(device_count, seed=0, now=None):
+    rng = random.Random(seed + 2)
+    now = (now or datetime.now(UTC)).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+    for hours_ago in range(STATS_DAYS * 24):
+        peak = int(device_count * (0.45 + 0.2 * rng.random()))
+        yield {
+            'hour': now - timedelta(hours=hours_ago),
+            'releases_manual': rng.randrange(3),
+            'releases_inactivity': rng.randrange(20),
+            'releases_mac_list': rng.randrange(5),
+            'new_devices': rng.randrange(30),
+            'total_devices_snapshot': device_count,
+            'active_devices_peak': peak,
+        }
+
+
+def _insert_chunked(table, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= INSERT_CHUNK_SIZE:
+            db.session.execute(insert(table), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(table), chunk)
+
+
+# --- BASES DE DATOS ---
+
+def bench_config(database_path):
+    """Configuración de la app apuntando a 'database_path' y sin CSRF (peticiones de prueba)."""
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + database_path
+        WTF_CSRF_ENABLED = False
+        WORKER_METRICS_PORT = 0
+        DIAGNOSTICS_DIR = os.path.join(os.path.dirname(database_path), 'diagnostics')
+    return BenchmarkConfig
+
+
+def open_app(database_path):
+    return create_app(bench_config(database_path))
+
+
+def populate(app, devices, seed=0, logs=None):
+    """Aplica las migraciones y rellena una base de datos vacía."""
+    logs = devices * LOGS_PER_DEVICE if logs is None else logs
+    now = datetime.now(UTC)
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+
+        user = User(username=BENCH_USERNAME)
+        user.set_password(BENCH_PASSWORD)
+        db.session.add(user)
+        ApplicationConfig.get_settings()
+
+        _insert_chunked(Device.__table__, generate_devices(devices, seed, now))
+        _insert_chunked(LogEntry.__table__, generate_logs(logs, devices, seed, now))
+        _insert_chunked(HourlyStat.__table__, generate_hourly_stats(devices, seed, now))
+        db.session.commit()
+        db.engine.dispose()
+
+
+def _checkpoint(path):
+    """Vuelca el WAL al fichero principal para poder copiar la base de datos como un único fichero."""
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        connection.close()
+
+
+def cached_database(devices, seed=0):
+    """
+    Ruta de una base de datos con 'devices' dispositivos, generándola la primera vez.
+    La clave incluye la última migración: si cambia el esquema se genera otra.
+    """
+    migrations = sorted(name for name in os.listdir(os.path.join(MIGRATIONS_DIR, 'versions')) if name.endswith('.py'))
+    revision = hashlib.sha1('\n'.join(migrations).encode('utf-8')).hexdigest()[:8]
+    path = os.path.join(CACHE_DIR, f'devices-{devices}-seed{seed}-{revision}.db')
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    building = path + '.building'
+    for leftover in (building, building + '-wal', building + '-shm'):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    print(f"[*] Generando base de datos sintética con {devices} dispositivos (se guarda en {CACHE_DIR})...")
+    populate(open_app(building), devices, seed)
+    _checkpoint(building)
+    os.replace(building, path)
+    return path
+
+
+def copy_database(source, directory):
+    """Copia de trabajo de una base de datos generada (los escenarios la modifican)."""
+    target = os.path.join(directory, os.path.basename(source))
+    shutil.copyfile(source, target)
+    return target
@@ -0,0 +1,53 @@
+# benchmarks/fakes.py
+
+import contextlib
+import subprocess
+from unittest import mock
+
+import app.scanner.core as scanner_core
+from app.scanner import net
+
+# --- RED SIMULADA ---
+# Los escenarios ejecutan el código real del worker, pero sin tocar la red: Nmap devuelve
+# una lista de hosts preparada, el ping responde al instante y los DHCPRELEASE no salen
+# de la máquina. Así se mide solo el coste de la aplicación (consultas, ORM, Python).
+
+
+class FakeNetwork:
+    """Estado de la red simulada; los escenarios lo ajustan antes de cada ejecución."""
+
+    def __init__(self):
+        self.hosts = []             # Lo que "encuentra" Nmap
+        self.alive_ips = set()      # IPs que responden al ping
+        self.sent_packets = 0       # DHCPRELEASE "enviados"
+        self.pings = 0
+
+    def scan_hosts(self, network_range):
+        return list(self.hosts)
+
+    def run(self, command, *args, **kwargs):
+        # Solo se usa para el ping de is_host_alive: ['ping', '-c', '1', '-W', '1', ip]
+        self.pings += 1
+        return subprocess.CompletedProcess(command, 0 if command[-1] in self.alive_ips else 1)
+
+    def sendp(self, packet, *args, **kwargs):
+        self.sent_packets += 1
+
+
+@contextlib.contextmanager
+def fake_network(network=None):
+    """
+    Sustituye Nmap, ping y el envío de paquetes por la red simulada, y elimina la pausa
+    de un segundo entre liberaciones del worker. Devuelve el FakeNetwork en uso.
+    Ojo: subprocess.run y time.sleep se sustituyen en sus módulos, es decir, para todo el
+    proceso mientras dure el bloque (el benchmark no los usa para nada más).
+    """
+    import scanner_worker
+
+    network = network or FakeNetwork()
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.object(scanner_core, 'scan_hosts', network.scan_hosts))
+        stack.enter_context(mock.patch.object(scanner_core.subprocess, 'run', network.run))
+        stack.enter_context(mock.patch.object(net, 'sendp', network.sendp))
+        stack.enter_context(mock.patch.object(scanner_worker.time, 'sleep', lambda seconds: None))
+        yield network
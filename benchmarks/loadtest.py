@@ -0,0 +1,583 @@
+# benchmarks/loadtest.py
+
+import argparse
+import atexit
+import contextlib
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, quote
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from benchmarks.datagen import BENCH_USERNAME, BENCH_PASSWORD, ROOT_DIR, cached_database, copy_database, open_app
+from benchmarks.run import RESULTS_DIR, parse_count, percentile
+
+# --- PRUEBA DE CARGA HTTP ---
+# Levanta la app (servidor de desarrollo de Werkzeug, waitress o gunicorn) sobre una copia
+# de una base de datos sintética, arranca a la vez un simulador del worker que escribe en el
+# mismo fichero SQLite (sniffer, escaneos Nmap, barrido de inactivos) y lanza usuarios
+# virtuales por etapas de carga creciente:
+#   - dashboards: como main.js, abren /api/stream y recargan /api/devices ante cada evento
+#     (o, con --dashboard-mode poll, sondean /api/stats y /api/devices cada 10 s)
+#   - buscadores: escriben en el buscador de dispositivos y de logs (con el debounce de 300 ms)
+#   - operadores: guardan la configuración, liberan (en simulación) y excluyen dispositivos
+# Informa por etapa de percentiles de latencia por endpoint, tasa de errores y de bloqueos
+# de SQLite ("database is locked") y del punto de saturación.
+#
+# Uso (desde la raíz del proyecto):
+#   python -m benchmarks.loadtest run --devices 100k --stages 5,10,20,40 --stage-seconds 60
+#   python -m benchmarks.loadtest run --server gunicorn --server-workers 4 --server-threads 8
+
+POLL_INTERVAL_SECONDS = 10 # setInterval de main.js
+STREAM_REFRESH_DEBOUNCE_SECONDS = 0.5 # STREAM_REFRESH_DEBOUNCE_MS de main.js
+SEARCH_DEBOUNCE_SECONDS = 0.3 # Debounce de los buscadores de main.js
+DEVICES_URL = '/api/devices?shape=columns&cursor=&per_page=50&sort_by=last_seen&order=desc&search={search}'
+LOGS_URL = '/api/logs?shape=columns&event_type=all&q={search}'
+SEARCH_TERMS = ['apple', 'samsung', 'raspberry', '10.0.1', '3C:22:FB', 'hikvision', 'dell', 'liberada', 'sniffer']
+REQUEST_TIMEOUT_SECONDS = 30
+SERVER_START_TIMEOUT_SECONDS = 60
+
+LOCK_STATS_ENV = 'LOADTEST_STATS_DIR'
+DATABASE_ENV = 'LOADTEST_DATABASE'
+
+
+# --- CONTADOR DE BLOQUEOS (en el servidor y en el simulador del worker) ---
+
+_lock_errors = {'count': 0}
+
+
+def install_lock_counter(stats_dir, role):
+    """Cuenta los 'database is locked' del proceso y los guarda en stats_dir al terminar."""
+    @event.listens_for(Engine, 'handle_error')
+    def _count_locks(context):
+        if 'database is locked' in str(context.original_exception):
+            _lock_errors['count'] += 1
+
+    def _save():
+        path = os.path.join(stats_dir, f'locks-{role}-{os.getpid()}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'role': role, 'lock_errors': _lock_errors['count']}, f)
+    atexit.register(_save)
+
+
+def create_server_app():
+    """Fábrica para gunicorn/waitress: la app sobre la base de datos de la prueba (variables de entorno)."""
+    app = open_app(os.environ[DATABASE_ENV])
+    app.config['WTF_CSRF_ENABLED'] = True # Como en producción: los usuarios virtuales envían el token
+    install_lock_counter(os.environ[LOCK_STATS_ENV], 'web')
+    return app
+
+
+def serve(args):
+    app = create_server_app()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if args.server == 'waitress':
+        from waitress import serve as waitress_serve
+        waitress_serve(app, host='127.0.0.1', port=args.port, threads=args.server_threads, _quiet=True)
+    else:
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING) # Sin una línea por petición
+        # El servidor de Werkzeug crea un hilo por petición (sin límite de hilos)
+        make_server('127.0.0.1', args.port, app, threaded=True).serve_forever()
+
+
+# --- SIMULADOR DEL WORKER ---
+
+def simulate_worker(args):
+    """
+    Ejecuta el código real del worker contra la base de datos de la prueba con la red
+    simulada: un DHCPACK cada 1/--sniffer-rate segundos, un escaneo Nmap cada
+    --scan-interval segundos y el barrido de inactivos y el volcado del historial cada minuto.
+    """
+    import scanner_worker
+    from app.sightings import flush_sightings
+    from app.models import ApplicationConfig
+    from benchmarks.fakes import fake_network
+    from benchmarks.scenarios import BenchContext, _prepare_scan, _next_scan, _prepare_packets, _stop_packets
+
+    install_lock_counter(os.environ[LOCK_STATS_ENV], 'worker')
+    app = open_app(os.environ[DATABASE_ENV])
+    stop_event = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop_event.set())
+
+    timings = {'sniffer': [], 'scan': [], 'housekeeping': []}
+
+    def timed(kind, func):
+        started = time.perf_counter()
+        func()
+        timings[kind].append(time.perf_counter() - started)
+
+    def in_context(func):
+        def wrapper():
+            with app.app_context():
+                func()
+        return wrapper
+
+    def loop(kind, interval, func):
+        while not stop_event.wait(interval):
+            try:
+                timed(kind, func)
+            except Exception as e:
+                print(f"[!!!] Error en el simulador del worker ({kind}): {e}", file=sys.stderr)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), fake_network() as network:
+        ctx = BenchContext(app, None, network, 0, random.Random(args.seed))
+        _prepare_scan(ctx)
+        _prepare_packets(ctx)
+        scan = in_context(lambda: scanner_worker.run_scan_cycle(ApplicationConfig.get_settings()))
+        housekeeping = in_context(lambda: (scanner_worker.update_inactive_devices_status(), flush_sightings()))
+
+        threads = [
+            threading.Thread(target=loop, args=('sniffer', 1 / args.sniffer_rate, lambda: scanner_worker.packet_handler(next(ctx.state['packets'])))),
+            threading.Thread(target=loop, args=('scan', args.scan_interval, lambda: (_next_scan(ctx), scan()))),
+            threading.Thread(target=loop, args=('housekeeping', 60, housekeeping)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        _stop_packets(ctx)
+
+    summary = {kind: _latency_summary(values) for kind, values in timings.items()}
+    with open(os.path.join(os.environ[LOCK_STATS_ENV], f'worker-{os.getpid()}.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f)
+
+
+# --- CLIENTE HTTP DE LOS USUARIOS VIRTUALES ---
+
+class HttpSession:
+    """Conexión keep-alive con cookies y ETags, como un navegador con la app abierta."""
+
+    def __init__(self, port):
+        self.port = port
+        self.connection = None
+        self.cookies = SimpleCookie()
+        self.etags = {}
+        self.csrf_token = None
+
+    def _connect(self):
+        self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=REQUEST_TIMEOUT_SECONDS)
+
+    def headers(self, extra=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items())
+        headers.update(extra or {})
+        return headers
+
+    def request(self, method, path, body=None, headers=None):
+        """Devuelve (código, cuerpo). Reintenta una vez si la conexión keep-alive se cerró."""
+        headers = self.headers(headers)
+        if method == 'GET' and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        for attempt in range(2):
+            if self.connection is None:
+                self._connect()
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+        for value in response.headers.get_all('Set-Cookie') or []:
+            self.cookies.load(value)
+        if method == 'GET' and response.getheader('ETag'):
+            self.etags[path] = response.getheader('ETag')
+        return response.status, data
+
+    def json(self, method, path, payload):
+        return self.request(method, path, json.dumps(payload).encode('utf-8'), {
+            'Content-Type': 'application/json', 'X-CSRFToken': self.csrf_token
+        })
+
+    def login(self):
+        status, page = self.request('GET', '/login')
+        token = re.search(rb'name="csrf_token" value="([^"]+)"', page)
+        form = {'username': BENCH_USERNAME, 'password': BENCH_PASSWORD, 'csrf_token': token.group(1).decode() if token else ''}
+        status, _ = self.request('POST', '/login', urlencode(form).encode(), {'Content-Type': 'application/x-www-form-urlencoded'})
+        if status != 302:
+            raise RuntimeError(f'Login fallido (HTTP {status})')
+        status, page = self.request('GET', '/')
+        token = re.search(rb'name="csrf-token" content="([^"]+)"', page)
+        self.csrf_token = token.group(1).decode() if token else None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+class Recorder:
+    """Resultados de todas las peticiones de una etapa."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def record(self, endpoint, status, seconds, body=b''):
+        with self._lock:
+            self.samples.append((endpoint, status, seconds, b'locked' in body if status >= 500 else False))
+
+    def call(self, session, endpoint, method, path, payload=None):
+        started = time.perf_counter()
+        try:
+            if payload is None:
+                status, body = session.request(method, path)
+            else:
+                status, body = session.json(method, path, payload)
+        except (OSError, http.client.HTTPException):
+            status, body = 599, b'' # Error de conexión o timeout
+        self.record(endpoint, status, time.perf_counter() - started, body)
+        return status, body
+
+
+# --- USUARIOS VIRTUALES ---
+
+def dashboard_poll(session, recorder, stop_event, rng, scale):
+    while not stop_event.is_set():
+        recorder.call(session, 'stats', 'GET', '/api/stats')
+        recorder.call(session, 'devices', 'GET', DEVICES_URL.format(search=''))
+        stop_event.wait(POLL_INTERVAL_SECONDS * scale)
+
+
+def dashboard_stream(session, recorder, stop_event, rng, scale):
+    """Como main.js con EventSource: el flujo trae las estadísticas y avisa de cambios en la tabla."""
+    recorder.call(session, 'stats', 'GET', '/api/stats')
+    recorder.call(session, 'devices', 'GET', DEVICES_URL.format(search=''))
+    refresh = {'at': None}
+    refresh_lock = threading.Lock()
+
+    def read_stream():
+        while not stop_event.is_set():
+            connection = http.client.HTTPConnection('127.0.0.1', session.port, timeout=REQUEST_TIMEOUT_SECONDS)
+            streams.append(connection)
+            started = time.perf_counter()
+            try:
+                connection.request('GET', '/api/stream', headers=session.headers({'Accept': 'text/event-stream'}))
+                response = connection.getresponse()
+                recorder.record('stream_connect', response.status, time.perf_counter() - started)
+                if response.status != 200:
+                    stop_event.wait(3)
+                    continue
+                while not stop_event.is_set():
+                    line = response.readline()
+                    if not line:
+                        break # El servidor cierra el flujo cada STREAM_MAX_SECONDS: se reconecta
+                    if line.startswith(b'event:') and line.split(b':', 1)[1].strip() in (b'devices', b'status', b'release', b'reset'):
+                        with refresh_lock:
+                            refresh['at'] = refresh['at'] or time.monotonic() + STREAM_REFRESH_DEBOUNCE_SECONDS
+            except (OSError, http.client.HTTPException):
+                if not stop_event.is_set():
+                    recorder.record('stream_connect', 599, time.perf_counter() - started)
+                    stop_event.wait(3)
+            finally:
+                connection.close()
+
+    streams = []
+    reader = threading.Thread(target=read_stream, daemon=True)
+    reader.start()
+    while not stop_event.wait(0.1):
+        with refresh_lock:
+            due = refresh['at'] is not None and time.monotonic() >= refresh['at']
+            if due:
+                refresh['at'] = None
+        if due:
+            recorder.call(session, 'devices', 'GET', DEVICES_URL.format(search=''))
+    for connection in streams:
+        with contextlib.suppress(OSError):
+            if connection.sock:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+    reader.join(timeout=5)
+
+
+def searcher(session, recorder, stop_event, rng, scale):
+    """Escribe términos carácter a carácter; solo se pide al servidor tras una pausa de 300 ms."""
+    while not stop_event.is_set():
+        term = rng.choice(SEARCH_TERMS)
+        endpoint, url = ('logs_search', LOGS_URL) if rng.random() < 0.3 else ('devices_search', DEVICES_URL)
+        for length in range(1, len(term) + 1):
+            pause = rng.uniform(0.08, 0.45)
+            if stop_event.wait(pause * scale):
+                return
+            if pause >= SEARCH_DEBOUNCE_SECONDS or length == len(term):
+                recorder.call(session, endpoint, 'GET', url.format(search=quote(term[:length])))
+        stop_event.wait(rng.uniform(2, 6) * scale)
+
+
+def operator(session, recorder, stop_event, rng, scale, devices):
+    while not stop_event.wait(rng.uniform(15, 45) * scale):
+        action = rng.random()
+        device_id = rng.randint(1, devices)
+        if action < 0.3:
+            status, body = recorder.call(session, 'config_get', 'GET', '/api/config')
+            if status == 200:
+                config = json.loads(body)
+                config['scan_interval_seconds'] = 61 if config.get('scan_interval_seconds') == 60 else 60
+                config['dry_run_enabled'] = True # Nunca liberar de verdad durante la prueba
+                recorder.call(session, 'config_put', 'PUT', '/api/config', config)
+        elif action < 0.7:
+            recorder.call(session, 'release', 'POST', f'/api/devices/{device_id}/release', {})
+        else:
+            recorder.call(session, 'exclude', 'PUT', f'/api/devices/{device_id}/exclude', {'is_excluded': rng.random() < 0.5})
+
+
+# --- EJECUCIÓN ---
+
+def _latency_summary(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {'count': 0}
+    return {
+        'count': len(ordered),
+        'p50': round(percentile(ordered, 0.50), 6),
+        'p95': round(percentile(ordered, 0.95), 6),
+        'p99': round(percentile(ordered, 0.99), 6),
+        'max': round(ordered[-1], 6),
+    }
+
+
+def summarize_stage(recorder, seconds):
+    by_endpoint = {}
+    for endpoint, status, latency, locked in recorder.samples:
+        by_endpoint.setdefault(endpoint, []).append((status, latency, locked))
+
+    def describe(samples):
+        summary = _latency_summary([latency for _, latency, _ in samples])
+        summary['errors'] = sum(1 for status, _, _ in samples if status >= 500)
+        summary['locked'] = sum(1 for _, _, locked in samples if locked)
+        summary['not_modified'] = sum(1 for status, _, _ in samples if status == 304)
+        return summary
+
+    requests = [sample for endpoint, *sample in recorder.samples if endpoint != 'stream_connect']
+    overall = describe(requests)
+    overall['requests_per_second'] = round(len(requests) / seconds, 2) if seconds else None
+    overall['error_rate'] = round(overall['errors'] / len(requests), 4) if requests else 0.0
+    return {'overall': overall, 'endpoints': {endpoint: describe(samples) for endpoint, samples in sorted(by_endpoint.items())}}
+
+
+def run_stage(port, dashboards, searchers, operators, args, devices, recorder):
+    stop_event = threading.Event()
+    rng = random.Random(args.seed + dashboards)
+    dashboard = dashboard_stream if args.dashboard_mode == 'stream' else dashboard_poll
+    users = ([(dashboard, ()) for _ in range(dashboards)] +
+             [(searcher, ()) for _ in range(searchers)] +
+             [(operator, (devices,)) for _ in range(operators)])
+
+    sessions = []
+    for _ in users:
+        session = HttpSession(port)
+        session.login() # Fuera de la medida: cada login cuesta un bcrypt
+        sessions.append(session)
+
+    threads = [
+        threading.Thread(target=target, args=(session, recorder, stop_event, random.Random(rng.random()), args.think_scale) + extra, daemon=True)
+        for (target, extra), session in zip(users, sessions)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+        time.sleep(args.ramp_seconds / max(len(threads), 1)) # Arranque escalonado, no todos a la vez
+    stop_event.wait(max(0, args.stage_seconds - (time.monotonic() - started)))
+    stop_event.set()
+    for thread in threads:
+        thread.join(timeout=REQUEST_TIMEOUT_SECONDS)
+    for session in sessions:
+        session.close()
+    return time.monotonic() - started
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_server(port, process):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'[!!!] El servidor terminó al arrancar (código {process.returncode}).')
+        with contextlib.suppress(OSError):
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        time.sleep(0.2)
+    raise SystemExit('[!!!] El servidor no respondió a tiempo.')
+
+
+def start_server(args, port, env):
+    if args.server == 'gunicorn':
+        command = ['gunicorn', '-b', f'127.0.0.1:{port}', '-w', str(args.server_workers), '--threads', str(args.server_threads),
+                   '--worker-class', 'gthread', '--timeout', '120', '--log-level', 'warning',
+                   'benchmarks.loadtest:create_server_app()']
+    else:
+        command = [sys.executable, '-m', 'benchmarks.loadtest', 'serve', '--server', args.server,
+                   '--port', str(port), '--server-threads', str(args.server_threads)]
+    return subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL)
+
+
+def find_saturation(stages, slo_seconds, max_error_rate):
+    """
+    Primera etapa saturada: p95 por encima del objetivo, demasiados errores, o el
+    rendimiento apenas crece (< 10 %) aunque haya más usuarios que en la anterior.
+    """
+    previous = None
+    for stage in stages:
+        overall = stage['summary']['overall']
+        reasons = []
+        if overall.get('p95', 0) > slo_seconds:
+            reasons.append(f"p95 {overall['p95'] * 1000:.0f} ms > {slo_seconds * 1000:.0f} ms")
+        if overall['error_rate'] > max_error_rate:
+            reasons.append(f"errores {overall['error_rate']:.1%}")
+        if previous and (overall['requests_per_second'] or 0) < previous['requests_per_second'] * 1.1:
+            reasons.append('el rendimiento no crece con más usuarios')
+        if reasons:
+            return {'dashboards': stage['dashboards'], 'reasons': reasons}
+        previous = overall
+    return None
+
+
+def run(args):
+    devices = parse_count(args.devices)
+    ratio = [int(part) for part in args.mix.split(':')]
+    stages = [int(stage) for stage in args.stages.split(',')]
+
+    workdir = tempfile.mkdtemp(prefix='dhcp-sentinel-load-')
+    stats_dir = os.path.join(workdir, 'stats')
+    os.makedirs(stats_dir)
+    database = copy_database(cached_database(devices, args.seed), workdir)
+
+    # Sin liberaciones reales: la prueba fuerza el modo simulación
+    app = open_app(database)
+    with app.app_context():
+        from app import db
+        from app.models import ApplicationConfig
+        ApplicationConfig.get_settings().dry_run_enabled = True
+        db.session.commit()
+        db.engine.dispose()
+
+    env = dict(os.environ, **{DATABASE_ENV: database, LOCK_STATS_ENV: stats_dir})
+    port = _free_port()
+    server = start_server(args, port, env)
+    worker = None
+    results = {'config': vars(args), 'stages': []}
+    try:
+        _wait_for_server(port, server)
+        if not args.no_worker:
+            worker = subprocess.Popen([sys.executable, '-m', 'benchmarks.loadtest', 'worker', '--seed', str(args.seed),
+                                       '--sniffer-rate', str(args.sniffer_rate), '--scan-interval', str(args.scan_interval)],
+                                      cwd=ROOT_DIR, env=env)
+        print(f"[*] Servidor {args.server} en 127.0.0.1:{port} · {devices} dispositivos · "
+              f"simulador del worker {'desactivado' if args.no_worker else 'activo'}")
+
+        for dashboards in stages:
+            searchers = math.ceil(dashboards * ratio[1] / ratio[0])
+            operators = max(1, math.ceil(dashboards * ratio[2] / ratio[0])) if ratio[2] else 0
+            print(f"[*] Etapa: {dashboards} dashboards, {searchers} buscadores, {operators} operadores ({args.stage_seconds} s)...")
+            recorder = Recorder()
+            seconds = run_stage(port, dashboards, searchers, operators, args, devices, recorder)
+            summary = summarize_stage(recorder, seconds)
+            overall = summary['overall']
+            print(f"    {overall['requests_per_second']} pet/s · p50 {overall.get('p50', 0) * 1000:.1f} ms · "
+                  f"p95 {overall.get('p95', 0) * 1000:.1f} ms · p99 {overall.get('p99', 0) * 1000:.1f} ms · "
+                  f"errores {overall['error_rate']:.2%} · bloqueos {overall['locked']}")
+            results['stages'].append({'dashboards': dashboards, 'searchers': searchers, 'operators': operators, 'summary': summary})
+    finally:
+        for process in (worker, server):
+            if process is not None and process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+                with contextlib.suppress(subprocess.TimeoutExpired):
+                    process.wait(timeout=30)
+
+    results['processes'] = {}
+    for name in sorted(os.listdir(stats_dir)):
+        with open(os.path.join(stats_dir, name), encoding='utf-8') as f:
+            results['processes'][name[:-5]] = json.load(f)
+    lock_errors = {name: data['lock_errors'] for name, data in results['processes'].items() if 'lock_errors' in data}
+    results['saturation'] = find_saturation(results['stages'], args.slo_ms / 1000, args.max_error_rate)
+
+    print("\n--- Resumen ---")
+    for name, data in results['processes'].items():
+        if name.startswith('worker-'):
+            for kind, summary in data.items():
+                if summary['count']:
+                    print(f"    worker {kind:<12} {summary['count']:>6} escrituras · p95 {summary['p95'] * 1000:.1f} ms · máx {summary['max'] * 1000:.1f} ms")
+    print(f"    'database is locked': {sum(lock_errors.values())} ({', '.join(f'{k}: {v}' for k, v in lock_errors.items()) or 'sin datos'})")
+    if results['saturation']:
+        print(f"[!] Saturación con {results['saturation']['dashboards']} dashboards: {'; '.join(results['saturation']['reasons'])}.")
+    else:
+        print("[OK] Ninguna etapa ha llegado a la saturación.")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"[OK] Resultados guardados en {output}")
+    shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prueba de carga HTTP de DHCP Sentinel.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Ejecuta la prueba de carga completa')
+    run_parser.add_argument('--devices', default='100k', help='Dispositivos de la base de datos sintética (ej: 10k, 1m)')
+    run_parser.add_argument('--stages', default='5,10,20,40', help='Dashboards de cada etapa, separados por comas')
+    run_parser.add_argument('--mix', default='10:2:1', help='Proporción dashboards:buscadores:operadores')
+    run_parser.add_argument('--stage-seconds', type=int, default=60, help='Duración de cada etapa')
+    run_parser.add_argument('--ramp-seconds', type=float, default=5, help='Tiempo en el que arrancan los usuarios de una etapa')
+    run_parser.add_argument('--think-scale', type=float, default=1.0,
+                            help='Multiplica las esperas de los usuarios (0.1 = sondeo cada segundo: 10 veces más carga por usuario)')
+    run_parser.add_argument('--dashboard-mode', choices=('stream', 'poll'), default='stream',
+                            help="'stream' (EventSource, como main.js) o 'poll' (sondeo cada 10 s, el modo de respaldo)")
+    run_parser.add_argument('--server', choices=('werkzeug', 'waitress', 'gunicorn'), default='werkzeug')
+    run_parser.add_argument('--server-workers', type=int, default=2, help='Procesos de gunicorn')
+    run_parser.add_argument('--server-threads', type=int, default=8, help='Hilos por proceso (waitress y gunicorn)')
+    run_parser.add_argument('--no-worker', action='store_true', help='Sin simulador del worker escribiendo en la base de datos')
+    run_parser.add_argument('--sniffer-rate', type=float, default=20, help='DHCPACK por segundo del simulador del worker')
+    run_parser.add_argument('--scan-interval', type=float, default=60, help='Segundos entre escaneos Nmap simulados')
+    run_parser.add_argument('--slo-ms', type=float, default=1000, help='p95 máximo aceptable antes de considerar saturación')
+    run_parser.add_argument('--max-error-rate', type=float, default=0.01, help='Tasa de errores máxima aceptable')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', default=None, help='Fichero JSON de resultados')
+
+    serve_parser = commands.add_parser('serve', help='(interno) Servidor web de la prueba')
+    serve_parser.add_argument('--server', choices=('werkzeug', 'waitress'), default='werkzeug')
+    serve_parser.add_argument('--port', type=int, required=True)
+    serve_parser.add_argument('--server-threads', type=int, default=8)
+
+    worker_parser = commands.add_parser('worker', help='(interno) Simulador del worker')
+    worker_parser.add_argument('--seed', type=int, default=0)
+    worker_parser.add_argument('--sniffer-rate', type=float, default=20)
+    worker_parser.add_argument('--scan-interval', type=float, default=60)
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        return serve(args)
+    if args.command == 'worker':
+        return simulate_worker(args)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
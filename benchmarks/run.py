@@ -0,0 +1,207 @@
+# benchmarks/run.py
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, UTC
+
+from benchmarks.datagen import BENCHMARKS_DIR, BENCH_USERNAME, BENCH_PASSWORD, cached_database, copy_database, open_app
+from benchmarks.fakes import fake_network
+from benchmarks.scenarios import SCENARIOS, BenchContext
+
+# --- EJECUCIÓN DE LOS BENCHMARKS ---
+# Uso (desde la raíz del proyecto):
+#   python -m benchmarks.run --devices 10k,100k
+#   python -m benchmarks.run --devices 1m --scenarios scan_cycle,devices_search_vendor
+#   python -m benchmarks.run --baseline benchmarks/results/anterior.json --threshold 0.2
+#
+# Guarda los resultados en JSON (benchmarks/results/ por defecto). Con --baseline compara
+# la métrica elegida (p50 por defecto) escenario a escenario y termina con código 1 si
+# alguno empeora más del umbral.
+
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+DEFAULT_DEVICES = '10k,100k'
+COMPARABLE_METRICS = ('mean', 'p50', 'p95', 'p99')
+
+
+def parse_count(text):
+    """'10k' -> 10000, '1m' -> 1000000."""
+    text = text.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+
+def percentile(sorted_values, fraction):
+    """Percentil por rango más cercano sobre una lista ya ordenada: el valor de rango ⌈p·n⌉."""
+    if not sorted_values:
+        return None
+    # round() quita el error de coma flotante (0.1 * 30 = 3.0000000000000004) antes del techo
+    rank = math.ceil(round(fraction * len(sorted_values), 9))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+def summarize(latencies, items):
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        'iterations': len(ordered),
+        'items': items,
+        'seconds_total': round(total, 6),
+        'items_per_second': round(items / total, 2) if total else None,
+        'latency': {
+            'mean': round(total / len(ordered), 6),
+            'p50': round(percentile(ordered, 0.50), 6),
+            'p95': round(percentile(ordered, 0.95), 6),
+            'p99': round(percentile(ordered, 0.99), 6),
+            'max': round(ordered[-1], 6),
+        },
+    }
+
+
+def run_scenario(scenario, ctx, iterations=None):
+    iterations = iterations or scenario.iterations
+    latencies = []
+    items = 0
+    # La salida de la aplicación (prints de cada dispositivo, etc.) no debe contar en la medida
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if scenario.setup:
+            scenario.setup(ctx)
+        try:
+            for iteration in range(scenario.warmup + iterations):
+                if scenario.before_each:
+                    scenario.before_each(ctx)
+                started = time.perf_counter()
+                processed = scenario.run(ctx)
+                elapsed = time.perf_counter() - started
+                if iteration >= scenario.warmup:
+                    latencies.append(elapsed)
+                    items += processed
+        finally:
+            if scenario.teardown:
+                scenario.teardown(ctx)
+    return summarize(latencies, items)
+
+
+def run_scale(devices, scenario_names, seed, iterations=None):
+    source = cached_database(devices, seed)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='dhcp-sentinel-bench-') as directory:
+        app = open_app(copy_database(source, directory))
+        client = app.test_client()
+        response = client.post('/login', data={'username': BENCH_USERNAME, 'password': BENCH_PASSWORD})
+        if response.status_code != 302:
+            raise SystemExit(f'[!!!] No se pudo iniciar sesión en la app del benchmark (HTTP {response.status_code}).')
+
+        with fake_network() as network:
+            ctx = BenchContext(app, client, network, devices, random.Random(seed))
+            for name in scenario_names:
+                scenario = SCENARIOS[name]
+                print(f"[*] {devices} dispositivos · {name}: {scenario.description}")
+                result = run_scenario(scenario, ctx, iterations)
+                latency = result['latency']
+                print(f"    p50 {latency['p50'] * 1000:.2f} ms · p95 {latency['p95'] * 1000:.2f} ms · "
+                      f"p99 {latency['p99'] * 1000:.2f} ms · {result['items_per_second']} elementos/s")
+                results[name] = result
+
+        with app.app_context():
+            from app import db
+            db.engine.dispose()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=BENCHMARKS_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, metric, threshold):
+    """
+    Compara dos ficheros de resultados. Devuelve la lista de regresiones
+    (escala, escenario, antes, ahora, cambio relativo).
+    """
+    regressions = []
+    print(f"\n--- Comparación con la referencia ({metric}, umbral {threshold:.0%}) ---")
+    for scale, scenarios in current['results'].items():
+        for name, result in scenarios.items():
+            previous = baseline.get('results', {}).get(scale, {}).get(name)
+            if not previous:
+                continue
+            before, now = previous['latency'][metric], result['latency'][metric]
+            change = (now - before) / before if before else 0.0
+            regressed = change > threshold
+            marker = '[!!!]' if regressed else ('[OK]' if change < -threshold else '    ')
+            print(f"{marker} {scale:>8} {name:<24} {before * 1000:10.2f} ms -> {now * 1000:10.2f} ms ({change:+.1%})")
+            if regressed:
+                regressions.append((scale, name, before, now, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks de DHCP Sentinel con datos sintéticos.')
+    parser.add_argument('--devices', default=DEFAULT_DEVICES, help="Escalas separadas por comas, ej: 10k,100k,1m")
+    parser.add_argument('--scenarios', default='', help=f"Escenarios (por defecto todos): {', '.join(SCENARIOS)}")
+    parser.add_argument('--iterations', type=int, default=None, help='Iteraciones por escenario (por defecto las de cada uno)')
+    parser.add_argument('--seed', type=int, default=0, help='Semilla de los datos y de las muestras')
+    parser.add_argument('--output', default=None, help='Fichero JSON de resultados')
+    parser.add_argument('--baseline', default=None, help='Resultados de referencia con los que comparar')
+    parser.add_argument('--metric', default='p50', choices=COMPARABLE_METRICS, help='Métrica de latencia a comparar')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Empeoramiento relativo tolerado (0.2 = 20 %%)')
+    parser.add_argument('--list', action='store_true', help='Muestra los escenarios disponibles y termina')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, scenario in SCENARIOS.items():
+            print(f"{name:<24} {scenario.description}")
+        return 0
+
+    scenario_names = [name.strip() for name in args.scenarios.split(',') if name.strip()] or list(SCENARIOS)
+    unknown = [name for name in scenario_names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(unknown)}")
+
+    results = {
+        'meta': {
+            'created_at': datetime.now(UTC).isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+        },
+        'results': {},
+    }
+    for scale in args.devices.split(','):
+        devices = parse_count(scale)
+        results['results'][str(devices)] = run_scale(devices, scenario_names, args.seed, args.iterations)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[OK] Resultados guardados en {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.metric, args.threshold)
+        if regressions:
+            print(f"\n[!!!] {len(regressions)} escenario(s) han empeorado más de un {args.threshold:.0%}.")
+            return 1
+        print("\n[OK] Sin regresiones respecto a la referencia.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
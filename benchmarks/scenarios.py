@@ -0,0 +1,322 @@
+# benchmarks/scenarios.py
+
+import itertools
+from datetime import datetime, timedelta, UTC
+from unittest import mock
+
+from sqlalchemy import func, or_, select, update
+
+from app import db
+from app.models import ApplicationConfig, Device
+from app.scanner import net
+
+# --- ESCENARIOS ---
+# Cada escenario mide una ruta de código real contra una copia de la base de datos
+# sintética. 'setup' y 'teardown' se ejecutan una vez; 'before_each' antes de cada
+# iteración sin medirse; 'run' es lo que se mide y devuelve cuántos elementos ha procesado
+# (hosts, liberaciones, paquetes...) para calcular el rendimiento por elemento.
+
+SCAN_HOSTS = 4096 # Hosts que "encuentra" cada escaneo Nmap (una /20 llena)
+NEW_HOST_FRACTION = 0.05 # De ellos, dispositivos nuevos
+RELEASE_MAC_PREFIX = 'B8:27:EB:0' # Lista de MACs del escenario de liberación (~1/16 de las Raspberry Pi)
+ALIVE_FRACTION = 0.1 # Candidatos que responden al ping (liberación omitida)
+PACKETS = 400 # Paquetes DHCP preparados para el escenario del sniffer
+INGEST_RECORDS = 20000 # Registros por lote de ingesta (un lote grande de un sensor remoto)
+
+SCENARIOS = {}
+
+
+class Scenario:
+    def __init__(self, name, run, description, iterations=20, warmup=2, setup=None, before_each=None, teardown=None):
+        self.name = name
+        self.run = run
+        self.description = description
+        self.iterations = iterations
+        self.warmup = warmup
+        self.setup = setup
+        self.before_each = before_each
+        self.teardown = teardown
+
+
+def scenario(name, description, **options):
+    def register(run):
+        SCENARIOS[name] = Scenario(name, run, description, **options)
+        return run
+    return register
+
+
+class BenchContext:
+    """Lo que comparten los escenarios de una escala: app, cliente con sesión y red simulada."""
+
+    def __init__(self, app, client, network, devices, rng):
+        self.app = app
+        self.client = client
+        self.network = network
+        self.devices = devices
+        self.rng = rng
+        self.state = {}
+
+
+def _new_mac(counter):
+    return f'02:BE:00:{counter >> 16 & 0xFF:02X}:{counter >> 8 & 0xFF:02X}:{counter & 0xFF:02X}'
+
+
+def _sample_devices(ctx, count, *criteria):
+    """Muestra aleatoria de (id, mac, ip, vendor) de dispositivos existentes."""
+    query = select(Device.id, Device.mac_address, Device.ip_address, Device.vendor).where(*criteria)
+    total = db.session.scalar(select(func.count()).select_from(query.subquery()))
+    if not total:
+        return []
+    # Ventana aleatoria por id: mucho más barato que ORDER BY random() con un millón de filas
+    start = ctx.rng.randrange(max(total - count, 0) + 1)
+    return db.session.execute(query.order_by(Device.id).offset(start).limit(count)).all()
+
+
+def _get(ctx, url):
+    response = ctx.client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f'GET {url} -> HTTP {response.status_code}')
+    response.get_data()
+    return 1
+
+
+# --- WORKER: ESCANEO NMAP ---
+
+def _prepare_scan(ctx):
+    with ctx.app.app_context():
+        existing = _sample_devices(ctx, int(SCAN_HOSTS * (1 - NEW_HOST_FRACTION)))
+    ctx.state['scan_existing'] = [{'ip': row.ip_address, 'mac': row.mac_address, 'vendor': row.vendor} for row in existing]
+    ctx.state['new_macs'] = itertools.count()
+
+
+def _next_scan(ctx):
+    new_hosts = [
+        {'ip': f'172.16.{n >> 8 & 0xFF}.{n & 0xFF}', 'mac': _new_mac(n), 'vendor': 'Nuevo'}
+        for n in itertools.islice(ctx.state['new_macs'], int(SCAN_HOSTS * NEW_HOST_FRACTION))
+    ]
+    ctx.network.hosts = ctx.state['scan_existing'] + new_hosts
+
+
+@scenario('scan_cycle', 'run_scan_cycle: Nmap simulado + sync_devices_db (95 % conocidos, 5 % nuevos)',
+          iterations=10, warmup=1, setup=_prepare_scan, before_each=_next_scan)
+def run_scan(ctx):
+    import scanner_worker
+    with ctx.app.app_context():
+        scanner_worker.run_scan_cycle(ApplicationConfig.get_settings())
+    return len(ctx.network.hosts)
+
+
+# --- WORKER: LIBERACIÓN AUTOMÁTICA ---
+
+def _release_candidates():
+    config = ApplicationConfig.get_settings()
+    threshold = datetime.now(UTC) - timedelta(hours=config.auto_release_threshold_hours)
+    return db.session.execute(
+        select(Device.id, Device.ip_address, Device.status).where(
+            Device.is_excluded == False,
+            Device.status != 'released',
+            or_(Device.last_seen < threshold, Device.mac_address.startswith(RELEASE_MAC_PREFIX))
+        )
+    ).all()
+
+
+def _prepare_release(ctx):
+    with ctx.app.app_context():
+        config = ApplicationConfig.get_settings()
+        config.auto_release_threshold_hours = 48
+        config.mac_auto_release_list = RELEASE_MAC_PREFIX
+        config.release_policy = 'ping_before_release'
+        config.dry_run_enabled = False
+        # Sin presupuesto: cada iteración procesa todos los candidatos (mide la cola completa)
+        config.release_budget_per_cycle = 0
+        config.release_budget_per_interface = 0
+        db.session.commit()
+        candidates = _release_candidates()
+    ctx.state['release_snapshot'] = [{'device_id': row.id, 'old_status': row.status} for row in candidates]
+    alive = ctx.rng.sample(candidates, int(len(candidates) * ALIVE_FRACTION))
+    ctx.network.alive_ips = {row.ip_address for row in alive}
+
+
+def _restore_release(ctx):
+    """Deja los candidatos como estaban para que cada iteración libere los mismos."""
+    snapshot = ctx.state['release_snapshot']
+    if not snapshot:
+        return
+    with ctx.app.app_context():
+        db.session.execute(
+            update(Device.__table__).where(Device.__table__.c.id == db.bindparam('device_id')).values(status=db.bindparam('old_status')),
+            snapshot
+        )
+        db.session.commit()
+
+
+@scenario('auto_release_cycle', 'run_auto_release_cycle: inactividad + lista de MACs, ping previo y envío simulados',
+          iterations=3, warmup=0, setup=_prepare_release, before_each=_restore_release, teardown=_restore_release)
+def run_release(ctx):
+    import scanner_worker
+    pings = ctx.network.pings
+    with ctx.app.app_context():
+        scanner_worker.run_auto_release_cycle(ApplicationConfig.get_settings())
+    return ctx.network.pings - pings
+
+
+# --- WORKER: SNIFFER DHCP ---
+
+def _dhcp_ack(mac, ip):
+    scapy = net.scapy()
+    packet = (scapy.Ether(src='00:11:22:33:44:55', dst=mac) /
+              scapy.IP(src='10.0.0.1', dst=ip) /
+              scapy.UDP(sport=67, dport=68) /
+              scapy.BOOTP(op=2, yiaddr=ip, chaddr=scapy.mac2str(mac) + b'\x00' * 10) /
+              scapy.DHCP(options=[('message-type', 'ack'), ('lease_time', 86400), 'end']))
+    # Se disecciona desde los bytes, como un paquete capturado (las opciones quedan numéricas)
+    return scapy.Ether(bytes(packet))
+
+
+def _prepare_packets(ctx):
+    import scanner_worker
+    with ctx.app.app_context():
+        existing = _sample_devices(ctx, int(PACKETS * 0.8))
+    packets = [_dhcp_ack(row.mac_address, row.ip_address) for row in existing]
+    packets += [_dhcp_ack(_new_mac(0x800000 + n), f'172.17.{n >> 8 & 0xFF}.{n & 0xFF}') for n in range(PACKETS - len(packets))]
+    ctx.rng.shuffle(packets)
+    ctx.state['packets'] = itertools.cycle(packets)
+
+    # El handler usa la app del worker: se apunta a la del benchmark
+    ctx.state['sniffer_patches'] = [
+        mock.patch.dict(scanner_worker.runtime, {'app': ctx.app}),
+        mock.patch.object(scanner_worker, 'ENABLE_SNIFFER_DIAGNOSTICS', False),
+    ]
+    for patcher in ctx.state['sniffer_patches']:
+        patcher.start()
+
+
+def _stop_packets(ctx):
+    for patcher in ctx.state.pop('sniffer_patches', []):
+        patcher.stop()
+
+
+@scenario('packet_handler', 'packet_handler: un DHCPACK (80 % dispositivos conocidos, 20 % nuevos)',
+          iterations=PACKETS, warmup=5, setup=_prepare_packets, teardown=_stop_packets)
+def run_packet(ctx):
+    import scanner_worker
+    scanner_worker.packet_handler(next(ctx.state['packets']))
+    return 1
+
+
+# --- INGESTA DE SENSORES REMOTOS ---
+
+def _ingest_record(mac, ip, seen_at):
+    return {'mac': mac, 'ip': ip, 'seen_at': seen_at.isoformat(), 'source': 'sniffer', 'lease_seconds': 86400}
+
+
+def _prepare_ingest_updates(ctx):
+    with ctx.app.app_context():
+        ctx.state['ingest_existing'] = [(row.mac_address, row.ip_address) for row in _sample_devices(ctx, INGEST_RECORDS)]
+    ctx.state['ingest_new_macs'] = itertools.count(0x900000)
+
+
+@scenario('ingest_new', f'ingest_batch: lote de {INGEST_RECORDS} avistamientos de dispositivos nuevos',
+          iterations=5, warmup=1, setup=_prepare_ingest_updates)
+def run_ingest_new(ctx):
+    from app.ingest import ingest_batch
+    seen_at = datetime.now(UTC)
+    records = [
+        _ingest_record(_new_mac(n), f'172.18.{n >> 8 & 0xFF}.{n & 0xFF}', seen_at)
+        for n in itertools.islice(ctx.state['ingest_new_macs'], INGEST_RECORDS)
+    ]
+    with ctx.app.app_context():
+        ingest_batch(records, 'benchmark')
+    return len(records)
+
+
+@scenario('ingest_update', f'ingest_batch: lote de hasta {INGEST_RECORDS} avistamientos de dispositivos conocidos',
+          iterations=5, warmup=1, setup=_prepare_ingest_updates)
+def run_ingest_update(ctx):
+    from app.ingest import ingest_batch
+    # Cada lote es posterior al anterior: todos los registros actualizan su dispositivo
+    seen_at = datetime.now(UTC)
+    records = [_ingest_record(mac, ip, seen_at) for mac, ip in ctx.state['ingest_existing']]
+    with ctx.app.app_context():
+        ingest_batch(records, 'benchmark')
+    return len(records)
+
+
+# --- API: DISPOSITIVOS ---
+
+def _cycle_urls(ctx, key, urls):
+    if key not in ctx.state:
+        ctx.state[key] = itertools.cycle(urls)
+    return next(ctx.state[key])
+
+
+@scenario('devices_default', 'GET /api/devices (primera página, orden por last_seen)')
+def devices_default(ctx):
+    return _get(ctx, '/api/devices?page=1&per_page=50')
+
+
+@scenario('devices_deep_page', 'GET /api/devices con OFFSET profundo (página 200)')
+def devices_deep_page(ctx):
+    return _get(ctx, '/api/devices?page=200&per_page=50')
+
+
+@scenario('devices_cursor', 'GET /api/devices con paginación por cursor y total cacheado')
+def devices_cursor(ctx):
+    return _get(ctx, '/api/devices?cursor=&per_page=50')
+
+
+@scenario('devices_search_vendor', 'GET /api/devices?search=<fabricante> (búsqueda de texto)')
+def devices_search_vendor(ctx):
+    return _get(ctx, _cycle_urls(ctx, 'vendor_urls', [
+        f'/api/devices?search={term}' for term in ('apple', 'samsung', 'raspberry', 'hikvision', 'dell')
+    ]))
+
+
+@scenario('devices_search_mac', 'GET /api/devices?search=<fragmento de MAC>')
+def devices_search_mac(ctx):
+    return _get(ctx, _cycle_urls(ctx, 'mac_urls', [
+        f'/api/devices?search={term}' for term in ('3C:22:FB', 'B8:27:EB:0', 'A4:4C', 'DA:A1:19:4')
+    ]))
+
+
+@scenario('devices_search_ip', 'GET /api/devices?search=<prefijo de IP>')
+def devices_search_ip(ctx):
+    return _get(ctx, _cycle_urls(ctx, 'ip_urls', [
+        f'/api/devices?search={term}' for term in ('10.0.1.', '10.0.15', '10.3.', '10.0.0.12')
+    ]))
+
+
+@scenario('devices_sort_ip', 'GET /api/devices ordenado por IP ascendente')
+def devices_sort_ip(ctx):
+    return _get(ctx, '/api/devices?sort_by=ip_address&order=asc')
+
+
+@scenario('devices_sort_vendor', 'GET /api/devices ordenado por fabricante')
+def devices_sort_vendor(ctx):
+    return _get(ctx, '/api/devices?sort_by=vendor&order=asc')
+
+
+@scenario('devices_cidr', 'GET /api/devices?cidr=<red /20>')
+def devices_cidr(ctx):
+    return _get(ctx, '/api/devices?cidr=10.0.16.0/20')
+
+
+# --- API: LOGS ---
+
+@scenario('logs_all', 'GET /api/logs (últimos 200)')
+def logs_all(ctx):
+    return _get(ctx, '/api/logs')
+
+
+@scenario('logs_event_type', 'GET /api/logs?event_type=<tipo> (filtros LIKE)')
+def logs_event_type(ctx):
+    return _get(ctx, _cycle_urls(ctx, 'event_urls', [
+        f'/api/logs?event_type={event_type}' for event_type in ('auto_release', 'discovery', 'user_action', 'system_error', 'dry_run')
+    ]))
+
+
+@scenario('logs_search', 'GET /api/logs?q=<texto> (búsqueda de texto completo)')
+def logs_search(ctx):
+    return _get(ctx, _cycle_urls(ctx, 'log_search_urls', [
+        f'/api/logs?q={term}' for term in ('liberada', 'sniffer', '10.0.1.20', 'timeout')
+    ]))
@@ -0,0 +1,133 @@
+# benchmarks/startup.py
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, UTC
+
+from benchmarks.datagen import ROOT_DIR
+from benchmarks.run import RESULTS_DIR, COMPARABLE_METRICS, compare, summarize
+
+# --- ARRANQUE DE CADA PROCESO ---
+# Mide cuánto tarda en arrancar cada proceso de la aplicación (hasta tener la app lista,
+# sin servir peticiones ni ejecutar tareas) y cuánta memoria ocupa: cada proceso se lanza
+# en un intérprete nuevo, como lo haría gunicorn, la CLI de Flask o systemd. Informa
+# también de si se ha cargado Scapy o Nmap, que solo deben importarse al usar la red.
+# Uso (desde la raíz del proyecto):
+#   python -m benchmarks.startup
+#   python -m benchmarks.startup --repeat 20 --baseline benchmarks/results/startup-anterior.json
+
+# Se ejecuta tras el código de cada proceso: pico de memoria y módulos de red cargados.
+# El pico se lee de VmHWM (Linux), que empieza de cero en el exec: ru_maxrss heredaría
+# la memoria del proceso que lanza el benchmark. En otros sistemas se usa ru_maxrss.
+REPORT = """
+import json, resource, sys
+try:
+    with open('/proc/self/status') as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1)
+print(json.dumps({'rss_kb': rss_kb, 'scapy': 'scapy' in sys.modules, 'nmap': 'nmap' in sys.modules}))
+"""
+
+PROCESSES = {
+    'interpreter': ('Intérprete vacío (referencia)', 'pass'),
+    'web': ('Web: create_app() (cada worker de gunicorn)', 'from app import create_app; create_app()'),
+    'flask_cli': ('CLI de Flask: run.py (flask db upgrade, flask shell...)', 'import run'),
+    'worker': ('Worker: módulo y create_app() antes de la primera tarea',
+               'import scanner_worker; from app import create_app; create_app()'),
+    'sensor': ('Sensor remoto: módulo', 'import sensor'),
+    'web_scapy': ('Web + Scapy (lo que costaba arrancar antes de cargarlo bajo demanda)',
+                  'from app import create_app; create_app(); from app.scanner import net; net.scapy(); net.nmap()'),
+}
+
+
+def measure(code, environ):
+    """
+    Lanza un intérprete que ejecuta 'code' y espera a que termine.
+    Devuelve (segundos, RSS máximo en MB, {módulo de red: cargado}).
+    """
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', f'{code}\n{REPORT}'], cwd=ROOT_DIR, env=environ,
+                               capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"El proceso falló:\n{completed.stderr}")
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    return elapsed, report.pop('rss_kb') / 1024, report
+
+
+def run_process(code, repeat, environ):
+    latencies, rss = [], []
+    loaded = {}
+    for _ in range(repeat):
+        elapsed, rss_mb, loaded = measure(code, environ)
+        latencies.append(elapsed)
+        rss.append(rss_mb)
+    result = summarize(latencies, repeat)
+    result['rss_mb'] = round(max(rss), 1)
+    result['modules'] = loaded
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tiempo de arranque y memoria de cada proceso de DHCP Sentinel.')
+    parser.add_argument('--processes', default='', help=f"Procesos (por defecto todos): {', '.join(PROCESSES)}")
+    parser.add_argument('--repeat', type=int, default=10, help='Arranques por proceso')
+    parser.add_argument('--output', default=None, help='Fichero JSON de resultados')
+    parser.add_argument('--baseline', default=None, help='Resultados de referencia con los que comparar')
+    parser.add_argument('--metric', default='p50', choices=COMPARABLE_METRICS, help='Métrica de tiempo a comparar')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Empeoramiento relativo tolerado (0.2 = 20 %%)')
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.processes.split(',') if name.strip()] or list(PROCESSES)
+    unknown = [name for name in names if name not in PROCESSES]
+    if unknown:
+        parser.error(f"Procesos desconocidos: {', '.join(unknown)}")
+
+    results = {
+        'meta': {
+            'created_at': datetime.now(UTC).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': {'startup': {}},
+    }
+    with tempfile.TemporaryDirectory(prefix='dhcp-sentinel-startup-') as directory:
+        # Base de datos y diagnósticos desechables: arrancar no debe tocar los de verdad
+        environ = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(directory, 'startup.db'),
+                       DIAGNOSTICS_DIR=os.path.join(directory, 'diagnostics'))
+        for name in names:
+            description, code = PROCESSES[name]
+            print(f"[*] {name}: {description}")
+            result = run_process(code, args.repeat, environ)
+            network = ', '.join(module for module, loaded in result['modules'].items() if loaded) or 'ninguno'
+            print(f"    p50 {result['latency']['p50'] * 1000:.0f} ms · p95 {result['latency']['p95'] * 1000:.0f} ms · "
+                  f"RSS {result['rss_mb']:.1f} MB · módulos de red: {network}")
+            results['results']['startup'][name] = result
+
+    output = args.output or os.path.join(RESULTS_DIR, f"startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[OK] Resultados guardados en {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.metric, args.threshold)
+        if regressions:
+            print(f"\n[!!!] {len(regressions)} proceso(s) arrancan más de un {args.threshold:.0%} más lento.")
+            return 1
+        print("\n[OK] Sin regresiones respecto a la referencia.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
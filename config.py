@@ -12,3 +12,19 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'app.db')
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Ingesta de avistamientos (sensores remotos, hooks del servidor DHCP, etc.): tokens
+    # aceptados por /api/ingest/sightings con el nombre de cada origen,
+    # ej: "sede-norte=token1,dhcp-hook=token2". Vacío = desactivado.
+    INGEST_TOKENS = os.environ.get('INGEST_TOKENS', '')
+    INGEST_MAX_RECORDS = int(os.environ.get('INGEST_MAX_RECORDS', 50000))
+
+    # Métricas Prometheus: /metrics en la web y exportador del worker (puerto 0 = desactivado).
+    # Con METRICS_TOKEN se exige 'Authorization: Bearer <token>' para leerlas; sin él, el
+    # /metrics de la web solo responde a usuarios con sesión iniciada.
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    WORKER_METRICS_ADDRESS = os.environ.get('WORKER_METRICS_ADDRESS', '127.0.0.1')
+    WORKER_METRICS_PORT = int(os.environ.get('WORKER_METRICS_PORT', 9101))
+
+    # Trazas de los ciclos del worker y perfiles bajo demanda (ver app/tracing.py).
+    DIAGNOSTICS_DIR = os.environ.get('DIAGNOSTICS_DIR') or os.path.join(basedir, 'diagnostics')
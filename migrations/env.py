@@ -1,6 +1,7 @@
 import logging
 from logging.config import fileConfig
 
+import sqlalchemy as sa
 from flask import current_app
 
 from alembic import context
@@ -45,6 +46,27 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+# Tablas virtuales FTS5 (y sus tablas internas *_data, *_idx, ...) que se crean a mano
+# en las migraciones. No están en los modelos, así que autogenerate las ignora.
+UNMANAGED_TABLE_PREFIXES = ('log_entry_fts', 'device_search')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and reflected and name.startswith(UNMANAGED_TABLE_PREFIXES):
+        return False
+    return True
+
+
+def compare_type(context, inspected_column, metadata_column, inspected_type, metadata_type):
+    # En SQLite INTEGER y BIGINT son el mismo tipo (entero de 64 bits). Sin esto, las bases
+    # creadas con 'device.ip_int' como INTEGER darían un cambio de tipo, y autogenerate
+    # recrearía la tabla 'device' en modo batch perdiendo sus triggers.
+    if context.dialect.name == 'sqlite' and all(
+            isinstance(t, sa.Integer) for t in (inspected_type, metadata_type)):
+        return False
+    return None
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +87,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -91,13 +114,16 @@ def run_migrations_online():
                 logger.info('No changes in schema detected.')
 
     connectable = get_engine()
+    # Flask-Migrate pasa compare_type=True; se sustituye por la comparación de arriba
+    configure_args = dict(current_app.extensions['migrate'].configure_args, compare_type=compare_type)
 
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
             process_revision_directives=process_revision_directives,
-            **current_app.extensions['migrate'].configure_args
+            include_object=include_object,
+            **configure_args
         )
 
         with context.begin_transaction():
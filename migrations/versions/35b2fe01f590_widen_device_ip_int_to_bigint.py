@@ -0,0 +1,31 @@
+"""Widen device.ip_int to BigInteger
+
+Revision ID: 35b2fe01f590
+Revises: fead453f0ffb
+Create Date: 2026-10-19 09:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '35b2fe01f590'
+down_revision = 'fead453f0ffb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las IPs desde 128.0.0.0 no caben en un entero de 32 bits con signo. En SQLite INTEGER
+    # ya es de 64 bits y no hay nada que hacer (el modo batch recrearía la tabla 'device' y
+    # se perderían sus triggers); en el resto de motores se amplía la columna.
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    op.alter_column('device', 'ip_int', existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    op.alter_column('device', 'ip_int', existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=True)
@@ -0,0 +1,70 @@
+"""Let bulk writers assign device change_seq
+
+Revision ID: 429f6ebfcae8
+Revises: f26cb99ea0bf
+Create Date: 2026-10-19 10:21:37.552904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '429f6ebfcae8'
+down_revision = 'f26cb99ea0bf'
+branch_labels = None
+depends_on = None
+
+NEXT_SEQ_SQL = """
+    UPDATE data_version SET version = version + 1 WHERE name = 'device_changes';
+"""
+CURRENT_SEQ_SQL = "(SELECT version FROM data_version WHERE name = 'device_changes')"
+DEVICES_VERSION_SQL = "UPDATE data_version SET version = version + 1 WHERE name = 'devices';"
+
+# Por cada dispositivo insertado, los triggers hacían dos UPDATE de data_version y un
+# segundo UPDATE de la fila (para escribir change_seq) que a su vez volvía a disparar
+# data_version_device_au. La ingesta por lotes reserva un bloque de la secuencia con una
+# sola sentencia y escribe change_seq ella misma (ver app/ingest.py): con un change_seq
+# ya asignado en el INSERT, o cambiado en el UPDATE, los triggers no hacen nada.
+# El resto de escrituras no tocan change_seq y siguen igual.
+TRIGGERS = {
+    'device_change_seq_ai': (
+        "AFTER INSERT ON device WHEN new.change_seq IS NULL",
+        f"{NEXT_SEQ_SQL} UPDATE device SET change_seq = {CURRENT_SEQ_SQL} WHERE id = new.id;",
+    ),
+    'data_version_device_ai': (
+        "AFTER INSERT ON device WHEN new.change_seq IS NULL",
+        DEVICES_VERSION_SQL,
+    ),
+    # También evita el segundo incremento por la escritura de change_seq de los triggers
+    'data_version_device_au': (
+        "AFTER UPDATE ON device WHEN new.change_seq IS old.change_seq",
+        DEVICES_VERSION_SQL,
+    ),
+}
+
+ORIGINAL_TRIGGERS = {
+    'device_change_seq_ai': (
+        "AFTER INSERT ON device",
+        f"{NEXT_SEQ_SQL} UPDATE device SET change_seq = {CURRENT_SEQ_SQL} WHERE id = new.id;",
+    ),
+    'data_version_device_ai': ("AFTER INSERT ON device", DEVICES_VERSION_SQL),
+    'data_version_device_au': ("AFTER UPDATE ON device", DEVICES_VERSION_SQL),
+}
+
+
+def _replace_triggers(triggers):
+    for name, (event, body) in triggers.items():
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute(f"CREATE TRIGGER {name} {event} BEGIN {body} END")
+
+
+def upgrade():
+    # Los triggers solo existen en SQLite
+    if op.get_bind().dialect.name == 'sqlite':
+        _replace_triggers(TRIGGERS)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        _replace_triggers(ORIGINAL_TRIGGERS)
@@ -0,0 +1,76 @@
+"""Add device search index
+
+Revision ID: 62a1b1d5df7c
+Revises: e58c300ea544
+Create Date: 2026-10-19 11:40:07.218554
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '62a1b1d5df7c'
+down_revision = 'e58c300ea544'
+branch_labels = None
+depends_on = None
+
+# MAC normalizada: sin separadores y en minúsculas ('AA:BB:CC:DD:EE:FF' -> 'aabbccddeeff')
+MAC_HEX_SQL = "lower(replace(replace(replace({mac}, ':', ''), '-', ''), '.', ''))"
+
+
+def upgrade():
+    # FTS5 solo existe en SQLite. En otros motores la búsqueda de dispositivos recurre a ILIKE.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    # El tokenizador trigram indexa cada subcadena de 3 caracteres, así que sirve para
+    # buscar fragmentos en cualquier posición (MAC parcial, IP, fabricante).
+    op.execute("""
+        CREATE VIRTUAL TABLE device_search USING fts5(
+            mac_hex,
+            ip,
+            vendor,
+            tokenize='trigram'
+        )
+    """)
+
+    new_mac_hex = MAC_HEX_SQL.format(mac='new.mac_address')
+    op.execute(f"""
+        CREATE TRIGGER device_search_ai AFTER INSERT ON device BEGIN
+            INSERT INTO device_search(rowid, mac_hex, ip, vendor)
+            VALUES (new.id, {new_mac_hex}, new.ip_address, coalesce(new.vendor, ''));
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER device_search_ad AFTER DELETE ON device BEGIN
+            DELETE FROM device_search WHERE rowid = old.id;
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER device_search_au AFTER UPDATE OF ip_address, mac_address, vendor ON device
+        WHEN old.ip_address IS NOT new.ip_address
+          OR old.mac_address IS NOT new.mac_address
+          OR old.vendor IS NOT new.vendor
+        BEGIN
+            UPDATE device_search
+            SET mac_hex = {new_mac_hex}, ip = new.ip_address, vendor = coalesce(new.vendor, '')
+            WHERE rowid = new.id;
+        END
+    """)
+
+    # Indexa los dispositivos ya existentes.
+    op.execute(f"""
+        INSERT INTO device_search(rowid, mac_hex, ip, vendor)
+        SELECT id, {MAC_HEX_SQL.format(mac='mac_address')}, ip_address, coalesce(vendor, '') FROM device
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS device_search_au")
+    op.execute("DROP TRIGGER IF EXISTS device_search_ad")
+    op.execute("DROP TRIGGER IF EXISTS device_search_ai")
+    op.execute("DROP TABLE IF EXISTS device_search")
@@ -0,0 +1,42 @@
+"""Add config version
+
+Revision ID: ad79e6678cb6
+Revises: 537473888ced
+Create Date: 2026-10-19 03:12:03.452790
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ad79e6678cb6'
+down_revision = '537473888ced'
+branch_labels = None
+depends_on = None
+
+TRIGGER_EVENTS = {'ai': 'INSERT', 'au': 'UPDATE'}
+
+
+def upgrade():
+    # El worker vigila esta versión para aplicar los cambios de configuración al momento.
+    # Sin SQLite no hay trigger y el worker recarga la configuración periódicamente.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("INSERT INTO data_version (name, version) VALUES ('config', 1)")
+    for suffix, event in TRIGGER_EVENTS.items():
+        op.execute(f"""
+            CREATE TRIGGER data_version_application_config_{suffix} AFTER {event} ON application_config BEGIN
+                UPDATE data_version SET version = version + 1 WHERE name = 'config';
+            END
+        """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for suffix in TRIGGER_EVENTS:
+        op.execute(f"DROP TRIGGER IF EXISTS data_version_application_config_{suffix}")
+    op.execute("DELETE FROM data_version WHERE name = 'config'")
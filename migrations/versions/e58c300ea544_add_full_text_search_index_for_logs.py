@@ -0,0 +1,64 @@
+"""Add full-text search index for logs
+
+Revision ID: e58c300ea544
+Revises: 5560f32b3714
+Create Date: 2026-10-19 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e58c300ea544'
+down_revision = '5560f32b3714'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 solo existe en SQLite. En otros motores la búsqueda de logs recurre a ILIKE.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    # Tabla FTS5 de "contenido externo": no duplica los mensajes, solo guarda el índice.
+    # unicode61 separa por '.', ':' y '-', de modo que IPs y MACs quedan como secuencias
+    # de tokens que se buscan como frases (ver app/search.py).
+    op.execute("""
+        CREATE VIRTUAL TABLE log_entry_fts USING fts5(
+            message,
+            content='log_entry',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+
+    op.execute("""
+        CREATE TRIGGER log_entry_fts_ai AFTER INSERT ON log_entry BEGIN
+            INSERT INTO log_entry_fts(rowid, message) VALUES (new.id, new.message);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER log_entry_fts_ad AFTER DELETE ON log_entry BEGIN
+            INSERT INTO log_entry_fts(log_entry_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER log_entry_fts_au AFTER UPDATE OF message ON log_entry BEGIN
+            INSERT INTO log_entry_fts(log_entry_fts, rowid, message) VALUES ('delete', old.id, old.message);
+            INSERT INTO log_entry_fts(rowid, message) VALUES (new.id, new.message);
+        END
+    """)
+
+    # Indexa los logs ya existentes.
+    op.execute("INSERT INTO log_entry_fts(log_entry_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS log_entry_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS log_entry_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS log_entry_fts_ai")
+    op.execute("DROP TABLE IF EXISTS log_entry_fts")
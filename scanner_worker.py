@@ -2,16 +2,32 @@
 
 import time
 import threading
-from datetime import datetime, timedelta, UTC, date as date_obj
-from sqlalchemy import or_
-from scapy.all import sniff, DHCP, BOOTP
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import or_, update
 
 from app import create_app, db
-from app.models import ApplicationConfig, Device, HistoricalStat
-from app.scanner.core import discover_hosts, sync_devices_db, log_event, perform_dhcp_release, is_host_alive
+from app.models import ApplicationConfig, Device
+from app.scanner import net
+from app.scanner.core import (discover_hosts, sync_devices_db, log_event, perform_dhcp_release, is_host_alive,
+                              parse_dhcp_packet, DHCP_MESSAGE_TYPES, DHCP_LEASE_MESSAGE_TYPES)
+from app.sightings import record_sighting, flush_sightings, compact_sightings
+from app.changes import publish_change, device_summary, prune_changes, prune_tombstones
+from app.counters import get_device_counters, reconcile_device_counters
+from app.stats import record_release, record_new_devices, record_device_counts, record_pool_usage
+from app.pools import get_pool_index, pressure_excess
+from app.release_queue import ReleaseQueue, ReleaseBudget, budget_multiplier, POOL_PRESSURE_BUDGET_TIERS
+from app.conflicts import watch_ip_conflicts, resolve_quiet_conflicts, release_conflict
+from app.scheduler import Job, run_scheduler, wake_jobs, job_metric_families
+from app.config_watch import config_changed
+from app.metrics import (add_collector, start_metrics_server, worker_phase_seconds, release_attempts_total,
+                         sniffer_packets_received_total, sniffer_packets_processed_total, sniffer_packets_dropped_total)
+from app.tracing import init_tracing, span
 
 # --- CONFIGURACIÓN DEL WORKER ---
-INACTIVE_THRESHOLD_MINUTES = 5 # Umbral para considerar un dispositivo inactivo
+COUNTER_RECONCILE_INTERVAL_SECONDS = 15 * 60 # Cada cuánto se corrigen los contadores en vivo
+CONFIG_WATCH_INTERVAL_SECONDS = 1 # Cada cuánto se comprueba si la configuración ha cambiado
+CONFIG_CHECK_INTERVAL_SECONDS = 10 # Cada cuánto se recarga igualmente (y se revisa el sniffer)
+SIGHTINGS_FLUSH_INTERVAL_SECONDS = 60 # Cada cuánto se guarda el historial de presencia
 
 # --- [!] MODO DE DIAGNÓSTICO DEL SNIFFER [!] ---
 # Ponlo en True para imprimir todos los paquetes DHCP que el sniffer capture.
@@ -20,65 +36,39 @@ INACTIVE_THRESHOLD_MINUTES = 5 # Umbral para considerar un dispositivo inactivo
 ENABLE_SNIFFER_DIAGNOSTICS = True
 # ------------------------------------------------
 
-# Diccionario en memoria para mantener las estadísticas del día actual
-daily_stats = {}
-
-# Creamos una instancia de la app separada para que el hilo del sniffer tenga su propio contexto
-app_for_sniffer = create_app()
-
 def packet_handler(packet):
     """Callback para procesar paquetes DHCP capturados por Scapy."""
-    if not packet.haslayer(DHCP):
+    dhcp = parse_dhcp_packet(packet)
+    if dhcp is None:
         return
-
-    dhcp_options = {opt[0]: opt[1] for opt in packet[DHCP].options if isinstance(opt, tuple)}
-    message_type = dhcp_options.get('message-type')
-
-    # --- LÓGICA DE EXTRACCIÓN DE IP MEJORADA PARA DIAGNÓSTICO ---
-    ip_diag = 'N/A'
-    if packet[BOOTP].yiaddr != '0.0.0.0':
-        ip_diag = packet[BOOTP].yiaddr
-    elif packet[BOOTP].ciaddr != '0.0.0.0':
-        ip_diag = packet[BOOTP].ciaddr
-    elif 'requested_addr' in dhcp_options:
-        ip_diag = dhcp_options['requested_addr']
+    message_type = dhcp['message_type']
+    message_type_str = DHCP_MESSAGE_TYPES.get(message_type, f'Unknown ({message_type})')
+    sniffer_packets_received_total.inc(message_type=message_type_str)
 
     # --- INICIO BLOQUE DE DIAGNÓSTICO ---
     if ENABLE_SNIFFER_DIAGNOSTICS:
-        try:
-            client_mac_diag = packet[BOOTP].chaddr[:6].hex(':').upper()
-            type_map = {1: 'DISCOVER', 2: 'OFFER', 3: 'REQUEST', 4: 'DECLINE', 5: 'ACK', 6: 'NAK', 7: 'RELEASE'}
-            message_type_str = type_map.get(message_type, f'Unknown ({message_type})')
-            
-            print(f"--- [Sniffer Diag] Paquete DHCP Capturado: Tipo={message_type_str}, MAC={client_mac_diag}, IP={ip_diag} ---")
-        except Exception as e:
-            print(f"--- [Sniffer Diag] Error al analizar paquete para diagnóstico: {e} ---")
+        ip_diag = dhcp['ip'] if dhcp['ip'] != '0.0.0.0' else 'N/A'
+        print(f"--- [Sniffer Diag] Paquete DHCP Capturado: Tipo={message_type_str}, MAC={dhcp['mac']}, IP={ip_diag} ---")
     # --- FIN BLOQUE DE DIAGNÓSTICO ---
 
-    # Solo nos interesan OFFER(2), REQUEST(3) y ACK(5)
-    if message_type not in [2, 3, 5]: 
+    if message_type not in DHCP_LEASE_MESSAGE_TYPES: 
+        sniffer_packets_dropped_total.inc(message_type=message_type_str, reason='ignored_type')
         return
 
-    client_mac = packet[BOOTP].chaddr[:6].hex(':').upper()
-    
-    # --- LÓGICA DE EXTRACCIÓN DE IP CORREGIDA Y ROBUSTA ---
-    client_ip = '0.0.0.0'
-    if packet[BOOTP].yiaddr != '0.0.0.0':         # Prioridad 1: IP asignada en OFFER/ACK
-        client_ip = packet[BOOTP].yiaddr
-    elif packet[BOOTP].ciaddr != '0.0.0.0':       # Prioridad 2: IP del cliente en RENEW
-        client_ip = packet[BOOTP].ciaddr
-    elif 'requested_addr' in dhcp_options:        # Prioridad 3: IP solicitada en REQUEST inicial
-        client_ip = dhcp_options['requested_addr']
-
-    lease_time_seconds = dhcp_options.get('lease_time')
+    client_mac = dhcp['mac']
+    client_ip = dhcp['ip']
+    lease_time_seconds = dhcp['lease_seconds']
 
     if not client_mac or client_ip == '0.0.0.0':
+        sniffer_packets_dropped_total.inc(message_type=message_type_str, reason='no_ip')
         return
 
-    with app_for_sniffer.app_context():
+    # Cada hilo abre su propio contexto (y su propia sesión) sobre la única app del worker
+    with runtime['app'].app_context():
         try:
             device = Device.query.filter_by(mac_address=client_mac).first()
             current_time = datetime.now(UTC)
+            is_new = device is None
             
             if device:
                 device.ip_address = client_ip
@@ -102,18 +92,24 @@ def packet_handler(packet):
                     device.lease_start_time = current_time
                     device.lease_duration_seconds = lease_time_seconds
                 db.session.add(device)
+                record_new_devices()
                 log_event(f"Nuevo dispositivo descubierto (Sniffer): IP {client_ip}, MAC {client_mac}")
 
+            db.session.flush()
+            publish_change('devices', {'source': 'sniffer', 'new': int(is_new), 'devices': [device_summary(device)]})
             db.session.commit()
+            record_sighting(device.id, current_time)
+            sniffer_packets_processed_total.inc(message_type=message_type_str)
         except Exception as e:
             print(f"[!!!] Error en packet_handler: {e}")
             db.session.rollback()
+            sniffer_packets_dropped_total.inc(message_type=message_type_str, reason='error')
 
 def run_sniffer(interface, stop_event):
     """Inicia el sniffer de Scapy en un hilo."""
     print(f"[*] Iniciando sniffer DHCP en la interfaz '{interface}'...")
     try:
-        sniff(
+        net.sniff(
             filter="udp and (port 67 or 68)", 
             prn=packet_handler, 
             iface=interface, 
@@ -123,98 +119,71 @@ def run_sniffer(interface, stop_event):
         print(f"[*] Sniffer en la interfaz '{interface}' detenido.")
     except Exception as e:
         print(f"[!!!] Error crítico al iniciar el sniffer en '{interface}': {e}")
-        with app_for_sniffer.app_context():
+        with runtime['app'].app_context():
             log_event(f"Error crítico del sniffer en la interfaz '{interface}': {e}. El sniffer se ha detenido.", "ERROR")
             db.session.commit()
 
-def reset_daily_stats():
-    """Inicializa o resetea los contadores de estadísticas para el día actual."""
-    global daily_stats
-    today = date_obj.today()
-    print(f"[*] Reseteando contadores de estadísticas para el día {today.isoformat()}")
-    daily_stats = {
-        "date": today,
-        "releases_inactivity": 0,
-        "releases_mac_list": 0,
-        "active_devices_peak": 0
-    }
-
-def commit_daily_stats():
+@worker_phase_seconds.timed(phase='sweep')
+def update_inactive_devices_status():
     """
-    Guarda las estadísticas acumuladas del día anterior en la base de datos.
+    Marca como 'inactive' los dispositivos activos que llevan más del umbral configurado
+    sin ser vistos. Es una única sentencia UPDATE ... WHERE: no se cargan objetos ORM y
+    solo se escriben las filas que cambian de estado.
     """
-    global daily_stats
-    
-    date_to_commit = daily_stats.get("date")
-    if not date_to_commit:
-        print("[!] No hay estadísticas diarias para guardar.")
-        return
-
+    print("[*] Actualizando estado de dispositivos inactivos...")
     try:
-        print(f"[*] Guardando estadísticas para la fecha {date_to_commit.isoformat()} en la base de datos...")
-        
-        stat_entry = db.session.get(HistoricalStat, date_to_commit)
-        if not stat_entry:
-            stat_entry = HistoricalStat(date=date_to_commit)
-            db.session.add(stat_entry)
-        
-        stat_entry.releases_inactivity = (stat_entry.releases_inactivity or 0) + daily_stats.get("releases_inactivity", 0)
-        stat_entry.releases_mac_list = (stat_entry.releases_mac_list or 0) + daily_stats.get("releases_mac_list", 0)
-        
-        stat_entry.active_devices_peak = max(
-            stat_entry.active_devices_peak or 0,
-            daily_stats.get("active_devices_peak", 0)
-        )
-
-        stat_entry.total_devices_snapshot = Device.query.count()
-
-        db.session.commit()
-        print(f"[OK] Estadísticas para {date_to_commit.isoformat()} guardadas.")
+        threshold = ApplicationConfig.get_settings().inactive_since()
+        stale = (Device.status == 'active', Device.last_seen < threshold)
+        summary_columns = (Device.id, Device.ip_address, Device.mac_address, Device.status, Device.last_seen_by)
 
-    except Exception as e:
-        print(f"[!!!] ERROR al guardar estadísticas diarias para {date_to_commit.isoformat()}: {e}")
-        db.session.rollback()
-        log_event(f"Error al guardar estadísticas diarias para {date_to_commit.isoformat()}: {e}", "ERROR")
-        db.session.commit()
+        statement = update(Device).where(*stale).values(status='inactive')
+        if db.session.get_bind().dialect.update_returning:
+            updated = db.session.execute(statement.returning(*summary_columns)).all()
+        else:
+            # Motores sin UPDATE ... RETURNING: se fijan antes los ids afectados
+            ids = [row.id for row in db.session.query(Device.id).filter(*stale)]
+            db.session.execute(statement.where(Device.id.in_(ids)))
+            updated = db.session.query(*summary_columns).filter(Device.id.in_(ids)).all()
 
-def update_inactive_devices_status():
-    """Actualiza el estado visual de los dispositivos a 'inactive'."""
-    print("[*] Actualizando estado de dispositivos inactivos...")
-    try:
-        threshold = datetime.now(UTC) - timedelta(minutes=INACTIVE_THRESHOLD_MINUTES)
-        devices_to_update = Device.query.filter(
-            Device.status == 'active',
-            Device.last_seen < threshold
-        ).all()
-        if devices_to_update:
-            for device in devices_to_update:
-                device.status = 'inactive'
+        if updated:
+            publish_change('status', {'status': 'inactive', 'devices': [device_summary(row) for row in updated]})
             db.session.commit()
-            print(f"[OK] Se marcaron {len(devices_to_update)} dispositivo(s) como inactivos.")
+            print(f"[OK] Se marcaron {len(updated)} dispositivo(s) como inactivos.")
         else:
+            db.session.rollback()
             print("[*] No se encontraron dispositivos para marcar como inactivos.")
     except Exception as e:
         print(f"[!!!] ERROR al actualizar estados a inactivo: {e}")
         db.session.rollback()
 
-# --- [NUEVA FUNCIÓN] ---
-def update_daily_active_peak():
+def update_hourly_device_counts():
     """
-    Calcula el número de dispositivos activos y actualiza el pico del día.
-    Esta función es independiente del método de descubrimiento.
+    Registra en las estadísticas horarias el número de dispositivos activos (como pico de
+    la hora), el total de dispositivos conocidos y la ocupación de cada pool DHCP.
+    Es independiente del método de descubrimiento.
     """
-    global daily_stats
     try:
-        threshold = datetime.now(UTC) - timedelta(minutes=INACTIVE_THRESHOLD_MINUTES)
-        current_active_count = Device.query.filter(Device.last_seen > threshold).count()
+        counters = get_device_counters()
+        record_device_counts(counters['active_devices'], counters['total_devices'])
+        record_pool_usage(get_pool_index(ApplicationConfig.get_settings()).pools)
+        db.session.commit()
+    except Exception as e:
+        print(f"[!!!] ERROR al actualizar las estadísticas horarias de dispositivos: {e}")
+        db.session.rollback()
 
-        if current_active_count > daily_stats.get("active_devices_peak", 0):
-            old_peak = daily_stats.get("active_devices_peak", 0)
-            daily_stats["active_devices_peak"] = current_active_count
-            print(f"[*] Nuevo pico de dispositivos activos hoy: {current_active_count} (anterior: {old_peak})")
 
+def run_counter_reconciliation():
+    """Corrige la desviación de los contadores en vivo respecto a los valores reales."""
+    try:
+        drift = reconcile_device_counters()
+        if drift:
+            details = ', '.join(f"{name}: {old} -> {new}" for name, (old, new) in drift.items())
+            print(f"[!] Contadores de dispositivos corregidos ({details}).")
+            log_event(f"Contadores de dispositivos reconciliados: {details}.", "WARNING")
+            db.session.commit()
     except Exception as e:
-        print(f"[!!!] ERROR al actualizar el pico de dispositivos activos: {e}")
+        print(f"[!!!] ERROR al reconciliar los contadores de dispositivos: {e}")
+        db.session.rollback()
 
 
 def run_scan_cycle(app_config):
@@ -225,84 +194,182 @@ def run_scan_cycle(app_config):
         print("[!] La subred de escaneo no está configurada. Saltando ciclo de Nmap.")
         return
 
-    discovered_hosts = discover_hosts(app_config.scan_subnet)
+    with span('nmap'), worker_phase_seconds.time(phase='scan'):
+        discovered_hosts = discover_hosts(app_config.scan_subnet)
     
-    # La lógica del pico de activos se ha movido a update_daily_active_peak()
+    # La lógica del pico de activos se ha movido a update_hourly_device_counts()
     # para que funcione con todos los modos de descubrimiento.
     if discovered_hosts is not None:
-        sync_devices_db(discovered_hosts)
+        with span('sync_devices_db'), worker_phase_seconds.time(phase='sync'):
+            sync_devices_db(discovered_hosts)
 
+@worker_phase_seconds.timed(phase='release')
 def run_auto_release_cycle(app_config):
-    """Ejecuta la lógica de liberación automática."""
-    global daily_stats
+    """
+    Ejecuta la lógica de liberación automática. Cada regla propone candidatos y la cola
+    priorizada decide el orden (los más antiguos primero) y cuántos caben en el
+    presupuesto del ciclo y de la interfaz; el resto espera al siguiente ciclo.
+    """
     print("--- [!] Iniciando ciclo de liberación automática ---")
     
     if app_config.dry_run_enabled:
         print("--- [!] MODO DRY RUN ACTIVADO: Solo se simularán las acciones. ---")
+
+    with span('pool_index'):
+        pool_index = get_pool_index(app_config)
+    queue = ReleaseQueue()
+
+    def enqueue(devices, release_type):
+        for device in devices:
+            pool = pool_index.pool_for(device.ip_int)
+            queue.push(device, release_type, budget_multiplier(pool.utilization() * 100) if pool else 1)
     
     threshold_hours = app_config.auto_release_threshold_hours
     if threshold_hours > 0:
         time_threshold = datetime.now(UTC) - timedelta(hours=threshold_hours)
-        inactive_devices = Device.query.filter(
-            Device.is_excluded == False,
-            Device.status != 'released',
-            Device.last_seen < time_threshold
-        ).all()
+        with span('inactivity_query'):
+            inactive_devices = Device.query.filter(
+                Device.is_excluded == False,
+                Device.status != 'released',
+                Device.last_seen < time_threshold
+            ).all()
         if inactive_devices:
             print(f"[*] Encontrados {len(inactive_devices)} dispositivo(s) por inactividad prolongada.")
-            for device in inactive_devices:
-                process_release(device, app_config, release_type='inactivity')
+            enqueue(inactive_devices, 'inactivity')
     
     mac_list_str = app_config.mac_auto_release_list or ""
     mac_prefixes = [mac.strip().upper() for mac in mac_list_str.splitlines() if mac.strip()]
     if mac_prefixes:
         mac_conditions = [Device.mac_address.startswith(prefix) for prefix in mac_prefixes]
-        mac_matched_devices = Device.query.filter(
-            Device.is_excluded == False,
-            Device.status != 'released',
-            or_(*mac_conditions)
-        ).all()
+        with span('mac_list_query'):
+            mac_matched_devices = Device.query.filter(
+                Device.is_excluded == False,
+                Device.status != 'released',
+                or_(*mac_conditions)
+            ).all()
         if mac_matched_devices:
             print(f"[*] Encontrados {len(mac_matched_devices)} dispositivo(s) por coincidencia de MAC.")
-            for device in mac_matched_devices:
-                process_release(device, app_config, release_type='mac_list')
+            enqueue(mac_matched_devices, 'mac_list')
+
+    if app_config.pool_release_threshold_percent:
+        enqueue(pool_pressure_candidates(app_config, pool_index.pools), 'pool_pressure')
+
+    if queue:
+        drain_release_queue(queue, app_config)
+
+def pool_pressure_candidates(app_config, pools):
+    """
+    Para cada pool que supera el umbral de ocupación configurado, devuelve sus dispositivos
+    inactivos (no excluidos) que llevan más tiempo sin verse, tantos como hagan falta para
+    volver a quedar por debajo del umbral.
+    """
+    threshold = app_config.pool_release_threshold_percent
+    candidates = []
+    for pool in pools:
+        excess = pressure_excess(pool, threshold)
+        if not excess:
+            continue
+        with span('pool_pressure_query'):
+            devices = Device.query.filter(
+                Device.ip_int.between(pool.first, pool.last),
+                Device.is_excluded == False,
+                Device.status == 'inactive'
+            ).order_by(Device.last_seen.asc()).limit(excess).all()
+        print(f"[!] Pool {pool.name} al {pool.utilization():.0%} (umbral {threshold} %): "
+              f"{len(devices)} dispositivo(s) inactivo(s) para liberar de {excess} necesarios.")
+        if devices:
+            log_event(f"Pool {pool.name} al {pool.utilization():.0%} de ocupación (umbral {threshold} %): "
+                      f"{len(devices)} dispositivo(s) inactivo(s) en cola para liberar.", 'WARNING')
+            db.session.commit()
+        candidates.extend(devices)
+    return candidates
+
+def drain_release_queue(queue, app_config):
+    """
+    Libera los candidatos de la cola por orden de prioridad mientras quede presupuesto.
+    Los de pools bajo presión pueden seguir cuando el presupuesto normal se ha agotado.
+    """
+    # El índice IP -> MAC debe incluir los últimos avistamientos antes de decidir nada
+    watch_ip_conflicts()
+    budget = ReleaseBudget(app_config.network_interface, app_config.release_budget_per_cycle,
+                           app_config.release_budget_per_interface)
+    total = len(queue)
+    max_multiplier = max(multiplier for _, multiplier in POOL_PRESSURE_BUDGET_TIERS)
+    deferred = {}
+    while queue:
+        if budget.exhausted(max_multiplier):
+            break
+        device, release_type, multiplier = queue.pop()
+        if not budget.allows(multiplier):
+            deferred[release_type] = deferred.get(release_type, 0) + 1
+            continue
+        # Las simulaciones también gastan presupuesto: el Dry Run debe reflejar lo que se haría
+        if process_release(device, app_config, release_type) in ('dry_run', 'released', 'failed'):
+            budget.consume()
+            db.session.commit()
+    while queue:
+        _, release_type, _ = queue.pop()
+        deferred[release_type] = deferred.get(release_type, 0) + 1
+
+    if deferred:
+        for release_type, count in deferred.items():
+            release_attempts_total.inc(count, type=release_type, result='deferred')
+        print(f"[!] Presupuesto de liberaciones agotado: {sum(deferred.values())} de {total} candidato(s) "
+              f"quedan para el siguiente ciclo.")
 
 def process_release(device, app_config, release_type):
-    """Procesa una única liberación, aplicando la política de liberación."""
-    global daily_stats
-    
+    """
+    Procesa una única liberación, aplicando la política de liberación.
+    Devuelve el resultado: 'conflict', 'skipped', 'dry_run', 'released' o 'failed'.
+    """
+    reason = release_conflict(device)
+    if reason:
+        log_event(f"OMITIDA liberación para {device.ip_address} (MAC: {device.mac_address}): {reason}.", 'WARNING')
+        release_attempts_total.inc(type=release_type, result='conflict')
+        publish_change('release', {'type': release_type, 'result': 'conflict', 'device': device_summary(device)})
+        db.session.commit()
+        return 'conflict'
+
     if app_config.release_policy == 'ping_before_release':
         print(f"[*] Comprobando con ping a {device.ip_address} antes de liberar...")
-        if is_host_alive(device.ip_address):
+        with span('ping'):
+            alive = is_host_alive(device.ip_address)
+        if alive:
             log_msg = f"OMITIDA liberación para {device.ip_address} (MAC: {device.mac_address}) porque responde al ping."
             log_event(log_msg, 'INFO')
+            release_attempts_total.inc(type=release_type, result='skipped')
+            publish_change('release', {'type': release_type, 'result': 'skipped', 'device': device_summary(device)})
             db.session.commit()
-            return
+            return 'skipped'
 
     log_msg = f"Candidato para liberación por '{release_type}': MAC {device.mac_address}, IP {device.ip_address}."
     log_event(log_msg, 'INFO')
     db.session.commit()
     
-    success, was_dry_run = perform_dhcp_release(
-        target_ip=device.ip_address, target_mac=device.mac_address,
-        dhcp_server_ip=app_config.dhcp_server_ip, interface=app_config.network_interface,
-        dry_run_enabled=app_config.dry_run_enabled
-    )
+    with span('dhcp_release'):
+        success, was_dry_run = perform_dhcp_release(
+            target_ip=device.ip_address, target_mac=device.mac_address,
+            dhcp_server_ip=app_config.dhcp_server_ip, interface=app_config.network_interface,
+            dry_run_enabled=app_config.dry_run_enabled
+        )
+    result = 'failed' if not success else 'dry_run' if was_dry_run else 'released'
+    release_attempts_total.inc(type=release_type, result=result)
     
     if success and not was_dry_run:
         device.status = 'released'
         log_event(f"IP {device.ip_address} liberada automáticamente por '{release_type}'.", 'INFO')
         
-        if release_type == 'inactivity':
-            daily_stats["releases_inactivity"] += 1
-        elif release_type == 'mac_list':
-            daily_stats["releases_mac_list"] += 1
+        record_release(release_type)
+        publish_change('release', {'type': release_type, 'result': 'released', 'device': device_summary(device)})
             
         db.session.commit()
     elif not success:
         log_event(f"Falló el intento de liberación automática para la IP {device.ip_address}", 'ERROR')
+        publish_change('release', {'type': release_type, 'result': 'failed', 'device': device_summary(device)})
         db.session.commit()
-    time.sleep(1)
+    with span('release_pause'):
+        time.sleep(1)
+    return result
 
 def check_for_config_changes(new_config, old_config):
     """Compara dos diccionarios de configuración y muestra los cambios en consola."""
@@ -319,6 +386,10 @@ def check_for_config_changes(new_config, old_config):
         'dhcp_server_ip': 'IP del servidor DHCP',
         'scan_interval_seconds': 'Intervalo de escaneo',
         'auto_release_threshold_hours': 'Umbral de liberación',
+        'inactive_threshold_minutes': 'Umbral de inactividad',
+        'pool_release_threshold_percent': 'Umbral de ocupación del pool',
+        'release_budget_per_cycle': 'Liberaciones máximas por ciclo',
+        'release_budget_per_interface': 'Liberaciones máximas por minuto e interfaz',
         'dry_run_enabled': 'Modo simulación (Dry Run)'
     }
     
@@ -329,110 +400,182 @@ def check_for_config_changes(new_config, old_config):
     if new_config.get('mac_auto_release_list') != old_config.get('mac_auto_release_list'):
         changes.append("  - Lista de MACs para liberación automática ha sido modificada.")
 
+    if new_config.get('dhcp_pool_ranges') != old_config.get('dhcp_pool_ranges'):
+        changes.append("  - Rangos de los pools DHCP modificados.")
+
     if changes:
         print("\n--- [!] CAMBIO DE CONFIGURACIÓN DETECTADO [!] ---")
         for change in changes:
             print(change)
         print("--------------------------------------------------\n")
 
+# --- TAREAS PERIÓDICAS DEL WORKER ---
+# Estado compartido entre tareas: la app (se crea una sola vez al arrancar), configuración
+# vista por última vez e hilo del sniffer
+runtime = {
+    'app': None,
+    'config': None,
+    'last_supervised': 0.0,
+    'scan_interval_seconds': 60,
+    'sniffer_thread': None,
+    'sniffer_stop_event': threading.Event(),
+}
+
+def supervise_config():
+    """
+    Recarga la configuración, informa de los cambios y arranca o detiene el sniffer.
+    Devuelve el conjunto de claves de configuración que han cambiado.
+    """
+    config = ApplicationConfig.get_settings()
+    current_config_dict = config.to_dict()
+    last_config = runtime['config']
+    runtime['last_supervised'] = time.monotonic()
+
+    check_for_config_changes(current_config_dict, last_config)
+    changed_keys = {key for key, value in current_config_dict.items() if not last_config or last_config.get(key) != value}
+    runtime['scan_interval_seconds'] = config.scan_interval_seconds
+
+    sniffer_thread = runtime['sniffer_thread']
+    sniffer_stop_event = runtime['sniffer_stop_event']
+    sniffer_should_run = config.discovery_method in ['sniffer', 'both']
+
+    # Reiniciar el sniffer si cambia la interfaz o si el hilo muere
+    interface_changed = last_config and last_config['network_interface'] != config.network_interface
+    sniffer_dead = sniffer_thread and not sniffer_thread.is_alive()
+
+    if sniffer_should_run and (not sniffer_thread or sniffer_dead or interface_changed):
+        if sniffer_thread:
+            print("[*] La configuración de red ha cambiado o el hilo del sniffer murió. Reiniciando...")
+            sniffer_stop_event.set()
+            sniffer_thread.join(timeout=2)
+
+        sniffer_stop_event.clear()
+        sniffer_thread = threading.Thread(
+            target=run_sniffer,
+            args=(config.network_interface, sniffer_stop_event),
+            daemon=True
+        )
+        sniffer_thread.start()
+
+    elif not sniffer_should_run and sniffer_thread and sniffer_thread.is_alive():
+        print("[*] El método de descubrimiento ha cambiado. Deteniendo el hilo del sniffer...")
+        sniffer_stop_event.set()
+        sniffer_thread.join(timeout=2)
+        sniffer_thread = None
+
+    runtime['sniffer_thread'] = sniffer_thread
+    runtime['config'] = current_config_dict
+    return changed_keys
+
+# Tareas que dependen de cada parámetro: se adelantan cuando este cambia
+CONFIG_DEPENDENT_JOBS = {
+    'discovery_method': ['nmap_scan'],
+    'scan_subnet': ['nmap_scan'],
+    'scan_interval_seconds': ['nmap_scan', 'auto_release'],
+    'auto_release_threshold_hours': ['auto_release'],
+    'mac_auto_release_list': ['auto_release'],
+    'release_policy': ['auto_release'],
+    'dry_run_enabled': ['auto_release'],
+    'inactive_threshold_minutes': ['inactive_sweep'],
+    'dhcp_pool_ranges': ['hourly_counts', 'auto_release'],
+    'pool_release_threshold_percent': ['auto_release'],
+    'release_budget_per_cycle': ['auto_release'],
+    'release_budget_per_interface': ['auto_release'],
+}
+
+def watch_config():
+    """
+    Comprueba (de forma muy barata) si la configuración ha cambiado. Si es así, la aplica al
+    momento: reconfigura el sniffer y adelanta las tareas afectadas. Además, cada
+    CONFIG_CHECK_INTERVAL_SECONDS se revisa igualmente para reiniciar el sniffer si murió.
+    """
+    changed = config_changed()
+    if not changed and time.monotonic() - runtime['last_supervised'] < CONFIG_CHECK_INTERVAL_SECONDS:
+        return
+
+    first_run = runtime['config'] is None
+    changed_keys = supervise_config()
+    if first_run:
+        return
+
+    jobs_to_wake = {job for key in changed_keys for job in CONFIG_DEPENDENT_JOBS.get(key, [])}
+    if jobs_to_wake:
+        print(f"[*] Aplicando la nueva configuración: adelantando {', '.join(sorted(jobs_to_wake))}.")
+        wake_jobs(*jobs_to_wake)
+
+def stop_sniffer():
+    sniffer_thread = runtime['sniffer_thread']
+    if sniffer_thread:
+        runtime['sniffer_stop_event'].set()
+        sniffer_thread.join(timeout=2)
+        runtime['sniffer_thread'] = None
+
+def run_scan_job():
+    config = ApplicationConfig.get_settings()
+    if config.discovery_method in ['nmap', 'both']:
+        run_scan_cycle(config)
+
+def run_auto_release_job():
+    run_auto_release_cycle(ApplicationConfig.get_settings())
+
+def run_daily_maintenance():
+    """Compacta el historial de presencia y purga los tombstones antiguos."""
+    compact_sightings()
+    prune_tombstones()
+
+def scan_interval():
+    return runtime['scan_interval_seconds']
+
+def build_jobs():
+    """
+    Tareas del worker con su cadencia, plazo y pool de hilos. El escaneo Nmap y las
+    liberaciones tienen pools propios, así que un escaneo lento no retrasa las liberaciones
+    ni una tanda larga de liberaciones retrasa el descubrimiento. La vigilancia de la
+    configuración (cada segundo) no se traza: llenaría el buffer de ciclos.
+    """
+    return [
+        Job('config', watch_config, interval=CONFIG_WATCH_INTERVAL_SECONDS, deadline=30, executor='watch', trace=False),
+        Job('inactive_sweep', update_inactive_devices_status, interval=60, jitter=5, deadline=60, executor='db', initial_delay=1),
+        Job('hourly_counts', update_hourly_device_counts, interval=60, jitter=5, deadline=60, executor='db', initial_delay=1),
+        Job('nmap_scan', run_scan_job, interval=scan_interval, jitter=10, deadline=15 * 60, executor='scan', initial_delay=1),
+        Job('auto_release', run_auto_release_job, interval=scan_interval, jitter=10, deadline=30 * 60, executor='release', initial_delay=1),
+        Job('conflict_watch', watch_ip_conflicts, interval=2, deadline=60, executor='db', initial_delay=1, trace=False),
+        Job('resolve_conflicts', resolve_quiet_conflicts, interval=60, jitter=5, deadline=60, executor='db'),
+        Job('flush_sightings', flush_sightings, interval=SIGHTINGS_FLUSH_INTERVAL_SECONDS, jitter=5, deadline=60, executor='db'),
+        Job('prune_changes', prune_changes, interval=5 * 60, jitter=30, deadline=60, executor='db'),
+        Job('reconcile_counters', run_counter_reconciliation, interval=COUNTER_RECONCILE_INTERVAL_SECONDS, jitter=60, deadline=5 * 60, executor='db'),
+        Job('daily_maintenance', run_daily_maintenance, interval=24 * 3600, jitter=5 * 60, deadline=30 * 60, executor='db'),
+    ]
+
+# Pools de hilos: las tareas cortas de base de datos comparten uno; la vigilancia de la
+# configuración, nmap y las liberaciones (ping, envío de paquetes y pausa entre ellas)
+# tienen el suyo.
+WORKER_EXECUTORS = {'watch': 1, 'db': 2, 'scan': 1, 'release': 1}
+
 if __name__ == '__main__':
-    main_app = create_app()
+    main_app = runtime['app'] = create_app()
     with main_app.app_context():
         log_event("Iniciando el worker de escaneo y automatización.")
         db.session.commit()
 
-        reset_daily_stats()
+    # Trazas de cada ciclo en DIAGNOSTICS_DIR (las lee /api/diagnostics/cycles)
+    init_tracing(main_app.config['DIAGNOSTICS_DIR'])
 
-        sniffer_thread = None
-        sniffer_stop_event = threading.Event()
-        
-        last_config = None # Almacena la configuración del ciclo anterior
-        
-        while True:
-            try:
-                if date_obj.today() != daily_stats["date"]:
-                    commit_daily_stats()
-                    reset_daily_stats()
-
-                config = ApplicationConfig.get_settings()
-                current_config_dict = config.to_dict()
-                
-                check_for_config_changes(current_config_dict, last_config)
-                
-                sniffer_should_run = config.discovery_method in ['sniffer', 'both']
-                
-                # Reiniciar el sniffer si cambia la interfaz o si el hilo muere
-                interface_changed = last_config and last_config['network_interface'] != config.network_interface
-                sniffer_dead = sniffer_thread and not sniffer_thread.is_alive()
-
-                if sniffer_should_run and (not sniffer_thread or sniffer_dead or interface_changed):
-                    if sniffer_thread:
-                        print("[*] La configuración de red ha cambiado o el hilo del sniffer murió. Reiniciando...")
-                        sniffer_stop_event.set()
-                        sniffer_thread.join(timeout=2)
-                    
-                    sniffer_stop_event.clear()
-                    sniffer_thread = threading.Thread(
-                        target=run_sniffer, 
-                        args=(config.network_interface, sniffer_stop_event), 
-                        daemon=True
-                    )
-                    sniffer_thread.start()
-                
-                elif not sniffer_should_run and sniffer_thread and sniffer_thread.is_alive():
-                    print("[*] El método de descubrimiento ha cambiado. Deteniendo el hilo del sniffer...")
-                    sniffer_stop_event.set()
-                    sniffer_thread.join(timeout=2)
-                    sniffer_thread = None
-
-                last_config = current_config_dict
-
-                update_inactive_devices_status()
-                
-                # --- [NUEVA LLAMADA] ---
-                # Ahora actualizamos el pico de activos en cada ciclo, sin importar el modo.
-                update_daily_active_peak()
-
-                if config.discovery_method in ['nmap', 'both']:
-                    run_scan_cycle(config)
-                
-                run_auto_release_cycle(config)
-
-                print(f"--- Ciclo finalizado. Esperando {config.scan_interval_seconds} segundos... ---\n")
-                
-                # Esperar el tiempo configurado
-                wait_interval = config.scan_interval_seconds
-                time.sleep(wait_interval)
-                
-                # --- [CORRECCIÓN] ---
-                # Cierra la sesión de la base de datos para asegurar que la configuración
-                # se recargue desde el archivo .db en el siguiente ciclo.
-                db.session.remove()
-
-            except KeyboardInterrupt:
-                print("\n[*] Deteniendo el worker... Guardando estadísticas finales.")
-                if sniffer_thread:
-                    sniffer_stop_event.set()
-                    sniffer_thread.join(timeout=2)
-                commit_daily_stats()
-                log_event("El worker de escaneo y automatización ha sido detenido.")
-                db.session.commit()
-                break
-            except Exception as e:
-                error_msg = f"Error crítico en el bucle principal del worker: {e}"
-                print(f"[!!!] {error_msg}")
-                try:
-                    # Intenta registrar el error en la base de datos, pero podría fallar si es un error de DB
-                    log_event(error_msg, level='ERROR')
-                    db.session.commit()
-                except:
-                    db.session.rollback() # Si falla el log, deshacer para no dejar la sesión en mal estado.
-                
-                try:
-                    # Intenta leer el intervalo de espera, con un valor por defecto si falla
-                    wait_interval = ApplicationConfig.get_settings().scan_interval_seconds
-                except:
-                    wait_interval = 60
-                
-                time.sleep(wait_interval * 2) # Espera un tiempo prudencial antes de reintentar
-                db.session.remove() # Asegura que la sesión se reinicie incluso después de un error grave
+    jobs = build_jobs()
+    add_collector(lambda: job_metric_families(jobs))
+    metrics_port = main_app.config.get('WORKER_METRICS_PORT')
+    if metrics_port:
+        try:
+            start_metrics_server(main_app.config['WORKER_METRICS_ADDRESS'], metrics_port, main_app.config.get('METRICS_TOKEN'))
+            print(f"[*] Métricas del worker en http://{main_app.config['WORKER_METRICS_ADDRESS']}:{metrics_port}/metrics")
+        except OSError as e:
+            print(f"[!] No se pudo iniciar el exportador de métricas en el puerto {metrics_port}: {e}")
+
+    run_scheduler(main_app, jobs, WORKER_EXECUTORS)
+
+    print("\n[*] Deteniendo el worker... Guardando el historial pendiente.")
+    stop_sniffer()
+    with main_app.app_context():
+        flush_sightings()
+        log_event("El worker de escaneo y automatización ha sido detenido.")
+        db.session.commit()
@@ -0,0 +1,265 @@
+# sensor.py
+
+import os
+import json
+import gzip
+import signal
+import sqlite3
+import threading
+import urllib.request
+import urllib.error
+from datetime import datetime, UTC
+
+from app.scanner import net
+from app.scanner.core import scan_hosts, parse_dhcp_packet, DHCP_LEASE_MESSAGE_TYPES
+from app.sightings import SIGHTING_BUCKET_MINUTES
+
+# --- SENSOR REMOTO ---
+# Versión reducida del worker para segmentos que la instancia central no ve (detrás de
+# un router, sin ARP ni DHCP visibles). Solo descubre dispositivos (Nmap y/o sniffer DHCP):
+# no tiene base de datos de la aplicación, ni dashboard, ni libera IPs. Los avistamientos
+# se guardan en un buffer local en disco y se envían por lotes comprimidos a
+# /api/ingest/sightings; si la central no responde se acumulan y se reenvían después.
+#
+# Se configura con variables de entorno:
+#   SENSOR_CENTRAL_URL   URL de la instancia central (ej: https://sentinel.midominio.lan)
+#   SENSOR_TOKEN         token del sensor (debe figurar en INGEST_TOKENS de la central)
+#   SENSOR_DISCOVERY     'nmap', 'sniffer' o 'both'
+#   SENSOR_SUBNET        subred a escanear con Nmap (ej: 10.20.0.0/24)
+#   SENSOR_INTERFACE     interfaz en la que escuchar DHCP
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+SENSOR_CENTRAL_URL = os.environ.get('SENSOR_CENTRAL_URL', 'http://127.0.0.1:5000').rstrip('/')
+SENSOR_TOKEN = os.environ.get('SENSOR_TOKEN', '')
+SENSOR_DISCOVERY = os.environ.get('SENSOR_DISCOVERY', 'both')
+SENSOR_SUBNET = os.environ.get('SENSOR_SUBNET', '192.168.1.0/24')
+SENSOR_INTERFACE = os.environ.get('SENSOR_INTERFACE', 'eth0')
+SENSOR_OUTBOX_PATH = os.environ.get('SENSOR_OUTBOX_PATH') or os.path.join(basedir, 'sensor_outbox.db')
+
+SCAN_INTERVAL_SECONDS = int(os.environ.get('SENSOR_SCAN_INTERVAL', 60))
+SHIP_INTERVAL_SECONDS = 10 # Cada cuánto se intenta vaciar el buffer
+SHIP_BATCH_SIZE = 2000 # Registros por lote (se reduce a la mitad si supera INGEST_MAX_RECORDS de la central)
+SHIP_TIMEOUT_SECONDS = 30
+MAX_BACKOFF_SECONDS = 300 # Espera máxima entre reintentos si la central no responde
+OUTBOX_MAX_ROWS = 500000 # Si se supera (desconexión muy larga) se descartan los más antiguos
+
+
+class Outbox:
+    """
+    Buffer persistente de avistamientos pendientes de enviar (SQLite local).
+
+    Guarda una fila por MAC e intervalo del historial de presencia: avistamientos
+    repetidos del mismo dispositivo en el mismo intervalo se fusionan (el más reciente
+    gana), así el buffer crece con el número de dispositivos y no con el de paquetes.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sighting (
+                mac TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                ip TEXT NOT NULL,
+                seen_at TEXT NOT NULL,
+                source TEXT NOT NULL,
+                vendor TEXT,
+                lease_seconds INTEGER,
+                PRIMARY KEY (mac, bucket)
+            )
+        """)
+
+    def add(self, mac, ip, source, vendor=None, lease_seconds=None, seen_at=None):
+        seen_at = seen_at or datetime.now(UTC)
+        bucket_minute = seen_at.minute - seen_at.minute % SIGHTING_BUCKET_MINUTES
+        bucket = seen_at.replace(minute=bucket_minute, second=0, microsecond=0).isoformat()
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO sighting (mac, bucket, ip, seen_at, source, vendor, lease_seconds)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (mac, bucket) DO UPDATE SET
+                    ip = excluded.ip,
+                    seen_at = excluded.seen_at,
+                    source = excluded.source,
+                    vendor = coalesce(excluded.vendor, vendor),
+                    lease_seconds = coalesce(excluded.lease_seconds, lease_seconds)
+                WHERE excluded.seen_at >= sighting.seen_at
+            """, (mac, bucket, ip, seen_at.isoformat(), source, vendor, lease_seconds))
+
+    def peek(self, limit):
+        """Devuelve los 'limit' avistamientos pendientes más antiguos."""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT mac, bucket, ip, seen_at, source, vendor, lease_seconds '
+                'FROM sighting ORDER BY seen_at LIMIT ?', (limit,)
+            ).fetchall()
+
+    def ack(self, rows):
+        """
+        Elimina los avistamientos enviados. Si mientras tanto llegó uno más reciente para
+        la misma MAC e intervalo, se conserva para el siguiente lote.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.executemany(
+                'DELETE FROM sighting WHERE mac = ? AND bucket = ? AND seen_at <= ?',
+                [(row[0], row[1], row[3]) for row in rows]
+            )
+            self._conn.execute('COMMIT')
+
+    def trim(self, max_rows):
+        """Descarta los avistamientos más antiguos si el buffer supera max_rows. Devuelve cuántos."""
+        with self._lock:
+            excess = self._conn.execute('SELECT count(*) FROM sighting').fetchone()[0] - max_rows
+            if excess <= 0:
+                return 0
+            self._conn.execute(
+                'DELETE FROM sighting WHERE rowid IN (SELECT rowid FROM sighting ORDER BY seen_at LIMIT ?)',
+                (excess,)
+            )
+            return excess
+
+    def pending(self):
+        with self._lock:
+            return self._conn.execute('SELECT count(*) FROM sighting').fetchone()[0]
+
+
+# --- DESCUBRIMIENTO ---
+
+def sniffer_handler(outbox):
+    """Callback de Scapy: guarda en el buffer los clientes vistos en OFFER/REQUEST/ACK."""
+    def handle(packet):
+        dhcp = parse_dhcp_packet(packet)
+        if dhcp is None or dhcp['message_type'] not in DHCP_LEASE_MESSAGE_TYPES:
+            return
+        if not dhcp['mac'] or dhcp['ip'] == '0.0.0.0':
+            return
+        try:
+            outbox.add(dhcp['mac'], dhcp['ip'], 'sniffer', lease_seconds=dhcp['lease_seconds'])
+        except Exception as e:
+            print(f"[!!!] Error al guardar el avistamiento del sniffer: {e}")
+    return handle
+
+
+def run_sniffer(outbox, stop_event):
+    print(f"[*] Iniciando sniffer DHCP en la interfaz '{SENSOR_INTERFACE}'...")
+    try:
+        net.sniff(
+            filter="udp and (port 67 or 68)",
+            prn=sniffer_handler(outbox),
+            iface=SENSOR_INTERFACE,
+            store=0,
+            stop_filter=lambda p: stop_event.is_set()
+        )
+    except Exception as e:
+        print(f"[!!!] Error crítico del sniffer en '{SENSOR_INTERFACE}': {e}")
+
+
+def run_scans(outbox, stop_event):
+    while not stop_event.is_set():
+        print(f"[*] Iniciando escaneo de red en {SENSOR_SUBNET}...")
+        try:
+            hosts = scan_hosts(SENSOR_SUBNET)
+            seen_at = datetime.now(UTC)
+            for host in hosts:
+                outbox.add(host['mac'], host['ip'], 'nmap', vendor=host['vendor'], seen_at=seen_at)
+            print(f"[OK] Escaneo completado. {len(hosts)} host(s) añadidos al buffer.")
+        except Exception as e:
+            print(f"[!!!] Error durante el escaneo de Nmap: {e}")
+        stop_event.wait(SCAN_INTERVAL_SECONDS)
+
+
+# --- ENVÍO A LA CENTRAL ---
+
+def ship_batch(rows):
+    """Envía un lote a la central. Devuelve la respuesta decodificada; lanza excepción si falla."""
+    records = [{
+        'mac': mac, 'ip': ip, 'seen_at': seen_at, 'source': source,
+        'vendor': vendor, 'lease_seconds': lease_seconds
+    } for mac, bucket, ip, seen_at, source, vendor, lease_seconds in rows]
+    body = gzip.compress(json.dumps({'records': records}, separators=(',', ':')).encode('utf-8'))
+
+    request = urllib.request.Request(
+        f'{SENSOR_CENTRAL_URL}/api/ingest/sightings',
+        data=body,
+        method='POST',
+        headers={
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+            'Authorization': f'Bearer {SENSOR_TOKEN}',
+        }
+    )
+    with urllib.request.urlopen(request, timeout=SHIP_TIMEOUT_SECONDS) as response:
+        return json.loads(response.read())
+
+
+def run_shipper(outbox, stop_event):
+    backoff = SHIP_INTERVAL_SECONDS
+    batch_size = SHIP_BATCH_SIZE
+    while not stop_event.is_set():
+        dropped = outbox.trim(OUTBOX_MAX_ROWS)
+        if dropped:
+            print(f"[!] Buffer lleno: descartados {dropped} avistamiento(s) antiguos.")
+
+        try:
+            sent = 0
+            while not stop_event.is_set():
+                rows = outbox.peek(batch_size)
+                if not rows:
+                    break
+                result = ship_batch(rows)
+                outbox.ack(rows)
+                sent += len(rows)
+                if result.get('rejected'):
+                    print(f"[!] La central rechazó {len(result['rejected'])} registro(s): {result['rejected'][:3]}")
+            if sent:
+                print(f"[OK] Enviados {sent} avistamiento(s) a la central.")
+            backoff = SHIP_INTERVAL_SECONDS
+        except urllib.error.HTTPError as e:
+            # Los avistamientos solo se descartan cuando la central los rechaza uno a uno
+            # ('rejected'); un error del lote entero no dice nada de sus registros.
+            if e.code == 413 and batch_size > 1:
+                # Lote mayor que INGEST_MAX_RECORDS de la central: se reintenta con la mitad
+                batch_size //= 2
+                print(f"[!] La central no admite lotes tan grandes (HTTP 413). Se reintenta con lotes de {batch_size}.")
+                continue
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+            print(f"[!] Error HTTP {e.code} al enviar. Reintento en {backoff} s ({outbox.pending()} pendientes).")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+            print(f"[!] Central no disponible ({e}). Reintento en {backoff} s ({outbox.pending()} pendientes).")
+
+        stop_event.wait(backoff)
+
+
+if __name__ == '__main__':
+    if not SENSOR_TOKEN:
+        raise SystemExit('[!!!] Falta SENSOR_TOKEN: el sensor no puede autenticarse en la central.')
+
+    stop_event = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop_event.set())
+
+    outbox = Outbox(SENSOR_OUTBOX_PATH)
+    print(f"[*] Sensor iniciado. Central: {SENSOR_CENTRAL_URL}. Pendientes en el buffer: {outbox.pending()}.")
+
+    threads = [threading.Thread(target=run_shipper, args=(outbox, stop_event), name='shipper')]
+    if SENSOR_DISCOVERY in ('nmap', 'both'):
+        threads.append(threading.Thread(target=run_scans, args=(outbox, stop_event), name='scanner'))
+    if SENSOR_DISCOVERY in ('sniffer', 'both'):
+        # El sniffer solo comprueba la señal de parada al recibir paquetes: hilo daemon
+        threads.append(threading.Thread(target=run_sniffer, args=(outbox, stop_event), name='sniffer', daemon=True))
+    for thread in threads:
+        thread.start()
+
+    while not stop_event.is_set():
+        stop_event.wait(1)
+
+    print("[*] Deteniendo el sensor...")
+    for thread in threads:
+        if not thread.daemon:
+            thread.join()
+    print(f"[OK] Sensor detenido. Quedan {outbox.pending()} avistamiento(s) en el buffer.")